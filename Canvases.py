@@ -8,6 +8,8 @@ if TYPE_CHECKING:
     from Program import App
 
 from customtkinter import CTkFrame, CTkLabel
+from display import CanvasDisplay
+from constants import *
 
 class Canvases(CTkFrame):
     """
@@ -30,4 +32,25 @@ class Canvases(CTkFrame):
         self.original_canvas.grid(padx=20, pady=10, row=0, column=0, sticky="nsew")
 
         self.result_canvas: CTkLabel = CTkLabel(self, text="")
-        self.result_canvas.grid(padx=(0, 20), pady=10, row=0, column=1, sticky="nsew")
\ No newline at end of file
+        self.result_canvas.grid(padx=(0, 20), pady=10, row=0, column=1, sticky="nsew")
+
+        # Both canvases keep one image each whose pixels are replaced on every frame
+        self.original_display: CanvasDisplay = CanvasDisplay(self.original_canvas, DEFAULT_CANVAS_SIZE, master.instruments)
+        self.result_display: CanvasDisplay = CanvasDisplay(self.result_canvas, DEFAULT_CANVAS_SIZE, master.instruments)
+
+        # Frame rate and stage timings over the corner of the result, only shown while the app is instrumented
+        self.overlay: CTkLabel = CTkLabel(self, text="", justify="left", anchor="nw", font=("Courier", 12), fg_color="gray10", text_color="white", corner_radius=6)
+        self.show_overlay(master.instruments.enabled)
+
+    def show_overlay(self, visible: bool) -> None:
+        """
+        Shows or hides the performance overlay.
+
+        Arguments:
+            visible (bool): Whether the overlay is shown.
+        """
+        if visible:
+            self.overlay.place(in_=self.result_canvas, x=8, y=8)
+            self.overlay.lift()
+        else:
+            self.overlay.place_forget()
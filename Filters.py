@@ -1,15 +1,37 @@
-from cv2 import cvtColor, COLOR_BGR2GRAY, blur, Sobel, CV_64F, magnitude, normalize, NORM_MINMAX, Canny, threshold, COLOR_GRAY2BGR, TERM_CRITERIA_EPS, TERM_CRITERIA_MAX_ITER, kmeans, KMEANS_RANDOM_CENTERS, COLOR_BGR2RGB
-from numpy import ndarray, float32, uint8, clip
-from typing import Literal, Tuple
+from cv2 import LUT, blur, minMaxLoc, CV_16S, CV_32F, CV_64F, Canny, threshold
+from numpy import ndarray, uint8, int16, float32, float64, concatenate, random
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Type
 from cv2.typing import MatLike
+from kmeans_engine import KMeansEngine
+from buffers import BufferPool
+from color_spaces import BGR, RGB, GRAY, ColorPlan, convert, plan
+from Filters_functions import gray_level_table, sobel_gradients, unnormalized_magnitude, gradient_magnitude
+from threading import Lock
 from abc import ABC
 
 class PropertyTypeManager(ABC):
     """
     Abstract class that manages the properties and their types
     """
+    # The formats apply() accepts, channel order does not matter to filters that never look at a single channel
+    accepted_formats: Tuple[str, ...] = (BGR, RGB)
+    # Whether apply() computes a single channel result, which is only expanded to three channels if expand is set
+    single_channel: bool = False
+    # Whether a pixel's result depends on statistics of the whole image, which tiled processing gathers in a first pass
+    global_statistics: bool = False
+
     def __init__(self) -> None:
         self.property_data = {}
+        self.listeners: List[Callable[['PropertyTypeManager'], None]] = []
+        # Arrays reused across frames by apply(), see BufferPool for when outputs are reused
+        self.buffers: BufferPool = BufferPool()
+        # The format of the images given to apply(), callers that have the frame in several formats pick one with color_spaces.plan()
+        self.input_format: str = BGR
+        self.expand: bool = False
+        # The size of the images given to apply() relative to the full resolution, below 1 for previews
+        self.resolution_scale: float = 1.0
+        # Statistics of the whole image from merge_statistics(), used by apply() instead of the statistics of its input when set
+        self.statistics: Any = None
 
     def add_property(self, name: str, data_type: str, min: int|float = 0, max: int|float = 200) -> None:
         """
@@ -28,19 +50,196 @@ class PropertyTypeManager(ABC):
             "max": max
         }
 
+    def snapshot(self) -> Tuple[Tuple[str, Any], ...]:
+        """
+        Returns the current value of every declared property.
+
+        Returns:
+        --------
+            Tuple[Tuple[str, Any], ...]: Pairs of property name and value, hashable so they can be used as a key.
+        """
+        return tuple((name, getattr(self, name)) for name in self.property_data)
+
+    def copy(self) -> 'PropertyTypeManager':
+        """
+        Creates a new filter of the same class with the same property values
+
+        Returns:
+        --------
+            PropertyTypeManager: The new filter, sharing no buffers or state with this one
+        """
+        return create_filter(type(self).__name__, dict(self.snapshot()))
+
+    def add_listener(self, listener: Callable[['PropertyTypeManager'], None]) -> None:
+        """
+        Registers a callback that is called with the filter whenever one of its properties is set
+
+        Arguments:
+        ----------
+            listener (Callable[[PropertyTypeManager], None]): The callback
+        """
+        self.listeners.append(listener)
+
+    def property_changed(self) -> None:
+        """
+        Notifies every listener that a property was set, called at the end of each setter
+        """
+        for listener in self.listeners:
+            listener(self)
+
+    def scaled_size(self, size: int, odd: bool = False) -> int:
+        """
+        Scales a size measured in full resolution pixels to the resolution apply() is given
+
+        Arguments:
+        ----------
+            size (int): The size at full resolution
+            odd (bool): Rounds up to an odd size, as kernel apertures need
+
+        Returns:
+        --------
+            int: The scaled size, at least 1
+        """
+        scaled: int = max(1, round(size * self.resolution_scale))
+        return scaled | 1 if odd else scaled
+
+    def halo(self) -> int:
+        """
+        The distance in pixels a result pixel can look at, tiles are grown by this much on every side
+
+        Returns:
+        --------
+            int: 0 for filters that work on every pixel on its own
+        """
+        return 0
+
+    def collect_statistics(self, tile: MatLike, core: Tuple[slice, slice]) -> Any:
+        """
+        Gathers the statistics of one tile, only called on filters with global_statistics
+
+        Arguments:
+        ----------
+            tile (MatLike): The tile including its halo, in input_format
+            core (Tuple[slice, slice]): The part of the tile that is not halo
+
+        Returns:
+        --------
+            Any: Whatever merge_statistics() combines
+        """
+        return None
+
+    def merge_statistics(self, partials: List[Any]) -> Any:
+        """
+        Combines the statistics of every tile into the statistics of the whole image
+
+        Arguments:
+        ----------
+            partials (List[Any]): The results of collect_statistics()
+
+        Returns:
+        --------
+            Any: The value apply() uses through self.statistics
+        """
+        return None
+
+    def output_format_for(self, input_format: str) -> str:
+        """
+        The format apply() returns for an input format
+
+        Arguments:
+        ----------
+            input_format (str): One of accepted_formats
+
+        Returns:
+        --------
+            str: BGR, RGB or GRAY
+        """
+        if not self.single_channel:
+            return input_format
+
+        if not self.expand:
+            return GRAY
+
+        # An expanded gray image looks the same in either channel order
+        return input_format if input_format != GRAY else BGR
+
+    @property
+    def output_format(self) -> str:
+        """
+        output_format (str): The format apply() returns for the current input_format
+        """
+        return self.output_format_for(self.input_format)
+
+    def gray_input(self, image: MatLike) -> MatLike:
+        """
+        Converts the input of apply() to a single channel, returning gray inputs as they are
+
+        Arguments:
+        ----------
+            image (MatLike): The image in input_format
+
+        Returns:
+        --------
+            MatLike: The single channel image, which must not be written to since it may be the input
+        """
+        if self.input_format == GRAY:
+            return image
+
+        return convert(image, self.input_format, GRAY, self.buffers.get("gray", image.shape[:2], image.dtype))
+
+    def gray_result(self, gray: MatLike) -> MatLike:
+        """
+        The array a single channel result is written into, the output itself unless it is expanded afterwards
+
+        Arguments:
+        ----------
+            gray (MatLike): A single channel image shaped like the result
+
+        Returns:
+        --------
+            MatLike: The array to use as dst
+        """
+        if self.expand:
+            return self.buffers.get("result", gray.shape, gray.dtype)
+
+        return self.buffers.output(gray.shape, gray.dtype)
+
+    def expand_gray(self, gray: MatLike) -> MatLike:
+        """
+        Finishes a single channel result, expanding it to three channels if expand is set
+
+        Arguments:
+        ----------
+            gray (MatLike): The result, written into the array from gray_result()
+
+        Returns:
+        --------
+            MatLike: The result in output_format
+        """
+        if not self.expand:
+            return gray
+
+        return convert(gray, GRAY, self.output_format, self.buffers.output((*gray.shape, 3), gray.dtype))
+
 class GrayscaleConverter(PropertyTypeManager):
     """
     Class representing a greyscale converter
     """
-    def __init__(self, level: float = 1.0):
+    accepted_formats: Tuple[str, ...] = (BGR, RGB, GRAY)
+    single_channel: bool = True
+
+    def __init__(self, level: float = 1.0, expand: bool = True):
         """
         Initializes the greyscale converter class.
 
         level (float): Level of greyness. A value of 1.0 maintains the original grayscale conversion,
                         while values less than 1.0 result in a darker grayscale image.
+        expand (bool): Expands the result back to three channels, False returns a single channel image.
         """
         super().__init__()
-        self.__level: float = level
+        self.__level: float = float(level)
+        self.__level_table: ndarray = gray_level_table(self.__level)
+        self.expand: bool = expand
         self.add_property("level", float.__name__, 0.0, 1.0)
 
     @property
@@ -58,6 +257,9 @@ class GrayscaleConverter(PropertyTypeManager):
             new_level (float): The new level of greyness value.
         """
         self.__level = float(new_level)
+        # The only place the table is rebuilt, apply just looks values up
+        self.__level_table = gray_level_table(self.__level)
+        self.property_changed()
 
     def apply(self, image: ndarray) -> MatLike:
         """
@@ -65,16 +267,14 @@ class GrayscaleConverter(PropertyTypeManager):
 
         Arguments:
         ----------
-            image (numpy.ndarray): The input image in BGR color format.
+            image (numpy.ndarray): The input image in input_format.
 
         Returns:
         --------
             MatLike: The grayscaled image.
         """
-        gray_image: MatLike = cvtColor(image, COLOR_BGR2GRAY)
-        adjusted_gray: ndarray = gray_image.astype(float) * self.__level
-        adjusted_gray: ndarray = clip(adjusted_gray, 0, 255).astype(uint8)  # Clip values and convert back to uint8
-        return cvtColor(adjusted_gray, COLOR_GRAY2BGR)
+        gray: MatLike = self.gray_input(image)
+        return self.expand_gray(LUT(gray, self.__level_table, self.gray_result(gray)))
 
 class BoxBlurFilter(PropertyTypeManager):
     """
@@ -84,6 +284,9 @@ class BoxBlurFilter(PropertyTypeManager):
         matrix_x (int): The matrix x size of the blur filter.
         matrix_y (int): The matrix y size of the blur filter.
     """
+    # Every channel is blurred the same way, so gray images are blurred as they are
+    accepted_formats: Tuple[str, ...] = (BGR, RGB, GRAY)
+
     def __init__(self, matrix_x: int = 50, matrix_y: int = 50):
         """
         Initializes the BoxBlurFilter class.
@@ -112,6 +315,7 @@ class BoxBlurFilter(PropertyTypeManager):
             matrix_x (int): The new matrix_x of the kluster matrix (x, y).
         """
         self.__matrix_x = int(matrix_x)
+        self.property_changed()
 
     @property
     def matrix_y(self):
@@ -128,6 +332,19 @@ class BoxBlurFilter(PropertyTypeManager):
             matrix_y (int): The new matrix_y of the kluster matrix (x, y).
         """
         self.__matrix_y = int(matrix_y)
+        self.property_changed()
+
+    def halo(self) -> int:
+        """
+        The blur reaches half the kernel size in each direction.
+        """
+        return max(self.__kernel_size()) // 2
+
+    def __kernel_size(self) -> Tuple[int, int]:
+        """
+        The kernel size at the resolution apply() is given.
+        """
+        return self.scaled_size(self.matrix_x), self.scaled_size(self.matrix_y)
 
     def apply(self, image: ndarray) -> MatLike:
         """
@@ -139,10 +356,15 @@ class BoxBlurFilter(PropertyTypeManager):
         Returns:
             MatLike: The image with box blur applied.
         """
-        image_rgb: MatLike = cvtColor(image, COLOR_BGR2RGB)
-        blurred_image: MatLike = blur(image_rgb, (self.matrix_x, self.matrix_y))
+        # Blurs every channel the same way, so the result keeps the channel order of the input
+        kernel_size: Tuple[int, int] = self.__kernel_size()
+        blurred_image: MatLike = blur(image, kernel_size, self.buffers.output(image.shape, image.dtype))
         return blurred_image
 
+# The derivative depth of each SobelEdgeDetector precision, from fastest to most precise
+SOBEL_PRECISIONS: Tuple[int, ...] = (CV_16S, CV_32F, CV_64F)
+SOBEL_DERIVATIVE_TYPES: Dict[int, type] = {CV_16S: int16, CV_32F: float32, CV_64F: float64}
+
 class SobelEdgeDetector(PropertyTypeManager):
     """
     Class for applying Sobel edge detection to images.
@@ -150,21 +372,31 @@ class SobelEdgeDetector(PropertyTypeManager):
     Attributes:
         k_size (int): Aperture size for the Sobel kernel.
         scale (int): Optional scale factor for the computed derivative values.
+        precision (int): Index into SOBEL_PRECISIONS, 0 uses 16 bit derivatives and the approximate |x| + |y| magnitude.
         delta (int): Optional delta value that is added to the results prior to storing them.
     """
-    def __init__(self, k_size: int = 3, scale: int = 1):
+    accepted_formats: Tuple[str, ...] = (BGR, RGB, GRAY)
+    single_channel: bool = True
+    global_statistics: bool = True
+
+    def __init__(self, k_size: int = 3, scale: int = 1, precision: int = 1, expand: bool = True):
         """
         Initializes the SobelEdgeDetector class.
 
         Args:
             k_size (int, optional): Aperture size for the Sobel kernel. Defaults to 3.
             scale (int, optional): Optional scale factor for the computed derivative values. Defaults to 1.
+            precision (int, optional): 0 for CV_16S with the L1 magnitude, 1 for CV_32F and 2 for CV_64F with the exact magnitude. Defaults to 1.
+            expand (bool, optional): Expands the edges to three channels, False returns a single channel image. Defaults to True.
         """
         super().__init__()
+        self.expand: bool = expand
         self.__k_size: int = k_size
         self.__scale: int = scale
+        self.__precision: int = int(precision)
         self.add_property("k_size", int.__name__, 1, 3)
         self.add_property("scale", int.__name__, 1, 3)
+        self.add_property("precision", int.__name__, 0, len(SOBEL_PRECISIONS) - 1)
 
     @property
     def k_size(self) -> int:
@@ -181,6 +413,7 @@ class SobelEdgeDetector(PropertyTypeManager):
             new_k_size (int): The new apperture size for the Sobel kernel.
         """
         self.__k_size = int(new_k_size)
+        self.property_changed()
 
     @property
     def scale(self) -> int:
@@ -197,6 +430,44 @@ class SobelEdgeDetector(PropertyTypeManager):
             new_scale (int): The new scale value.
         """
         self.__scale = int(new_scale)
+        self.property_changed()
+
+    @property
+    def precision(self) -> int:
+        """
+        precision (int): Index into SOBEL_PRECISIONS of the derivative depth.
+        """
+        return self.__precision
+
+    @precision.setter
+    def precision(self, new_precision: int) -> None:
+        """
+        Arguments:
+        ----------
+            new_precision (int): The new precision, clamped to the available depths.
+        """
+        self.__precision = min(max(int(new_precision), 0), len(SOBEL_PRECISIONS) - 1)
+        self.property_changed()
+
+    def halo(self) -> int:
+        """
+        The kernel reaches half its aperture in each direction.
+        """
+        return self.__aperture() // 2
+
+    def collect_statistics(self, tile: MatLike, core: Tuple[slice, slice]) -> Tuple[float, float]:
+        """
+        The smallest and largest magnitude of the tile, which the whole image is normalized by.
+        """
+        magnitude_image: ndarray = unnormalized_magnitude(*self.__gradients(self.gray_input(tile)), overwrite=True)
+        low, high, _, _ = minMaxLoc(magnitude_image[core])
+        return low, high
+
+    def merge_statistics(self, partials: List[Tuple[float, float]]) -> Tuple[float, float]:
+        """
+        The magnitude range over every tile.
+        """
+        return min(low for low, _ in partials), max(high for _, high in partials)
 
     def apply(self, image: ndarray) -> MatLike:
         """
@@ -208,12 +479,27 @@ class SobelEdgeDetector(PropertyTypeManager):
         Returns:
             MatLike: The image with Sobel edge detection applied.
         """
-        gray: ndarray = cvtColor(image, COLOR_BGR2GRAY)
-        sobel_x: ndarray = Sobel(gray, CV_64F, 1, 0, ksize=self.k_size, scale=self.scale, delta=0) # type: ignore
-        sobel_y: ndarray = Sobel(gray, CV_64F, 0, 1, ksize=self.k_size, scale=self.scale, delta=0) # type: ignore
-        magnitude_image: ndarray = magnitude(sobel_x, sobel_y).astype('uint8')
-        magnitude_image = normalize(magnitude_image, None, 0, 255, NORM_MINMAX).astype('uint8') # type: ignore
-        return cvtColor(magnitude_image, COLOR_GRAY2BGR)
+        gray: MatLike = self.gray_input(image)
+        sobel_x, sobel_y = self.__gradients(gray)
+
+        # The derivatives are only needed for this frame, so they also hold the magnitude
+        magnitude_image: ndarray = gradient_magnitude(sobel_x, sobel_y, self.gray_result(gray), overwrite=True, value_range=self.statistics)
+        return self.expand_gray(magnitude_image)
+
+    def __aperture(self) -> int:
+        """
+        The aperture at the resolution apply() is given, Sobel only supports odd apertures up to 7.
+        """
+        return min(self.scaled_size(self.k_size, odd=True), 7)
+
+    def __gradients(self, gray: MatLike) -> Tuple[ndarray, ndarray]:
+        """
+        Computes both derivatives into the reused derivative buffers.
+        """
+        depth: int = SOBEL_PRECISIONS[self.precision]
+        derivative_type: type = SOBEL_DERIVATIVE_TYPES[depth]
+        derivatives: Tuple[ndarray, ndarray] = (self.buffers.get("sobel_x", gray.shape, derivative_type), self.buffers.get("sobel_y", gray.shape, derivative_type))
+        return sobel_gradients(gray, self.__aperture(), self.scale, 0, depth, derivatives)
 
 class CannyEdgeDetector(PropertyTypeManager):
     """
@@ -223,6 +509,9 @@ class CannyEdgeDetector(PropertyTypeManager):
         threshold_one (int): The first threshold for the hysteresis procedure in Canny.
         threshold_two (int): The second threshold for the hysteresis procedure in Canny.
     """
+    accepted_formats: Tuple[str, ...] = (BGR, RGB, GRAY)
+    single_channel: bool = True
+
     def __init__(self, threshold_one: int = 50, threshold_two: int = 150):
         """
         Initializes the CannyEdgeDetector class.
@@ -252,6 +541,7 @@ class CannyEdgeDetector(PropertyTypeManager):
             new_threshold_one (int): A new value for the first threshold for the hysteresis procedure in Canny.
         """
         self.__threshold_one = int(new_threshold_one)
+        self.property_changed()
 
     @property
     def threshold_two(self) -> int:
@@ -268,6 +558,14 @@ class CannyEdgeDetector(PropertyTypeManager):
             new_threshold_two (int): A new value for the second threshold for the hysteresis procedure in Canny.
         """
         self.__threshold_two = int(new_threshold_two)
+        self.property_changed()
+
+    def halo(self) -> int:
+        """
+        The gradients and non-maximum suppression only reach 2 pixels, but hysteresis follows weak
+        edges arbitrarily far, so a wider halo keeps tiled results close to the untiled ones.
+        """
+        return 16
 
     def apply(self, image: ndarray) -> MatLike:
         """
@@ -279,8 +577,8 @@ class CannyEdgeDetector(PropertyTypeManager):
         Returns:
             MatLike: The image with Canny edge detection applied.
         """
-        gray: MatLike = cvtColor(image, COLOR_BGR2GRAY)
-        return Canny(gray, self.__threshold_one, self.__threshold_two)
+        gray: MatLike = self.gray_input(image)
+        return self.expand_gray(Canny(gray, self.__threshold_one, self.__threshold_two, self.gray_result(gray)))
 
 class GlobalSegmentation(PropertyTypeManager):
     """
@@ -289,14 +587,19 @@ class GlobalSegmentation(PropertyTypeManager):
     Attributes:
         thresh (int): The threshold value for segmentation.
     """
-    def __init__(self, thresh: int = 127):
+    accepted_formats: Tuple[str, ...] = (BGR, RGB, GRAY)
+    single_channel: bool = True
+
+    def __init__(self, thresh: int = 127, expand: bool = True):
         """
         Initializes the GlobalSegmentation class.
 
         Args:
             thresh (int, optional): The threshold value for segmentation. Defaults to 127.
+            expand (bool, optional): Expands the segments to three channels, False returns a single channel image. Defaults to True.
         """
         super().__init__()
+        self.expand: bool = expand
         self.__thresh = thresh
         self.add_property("thresh", int.__name__, 0, 150)
 
@@ -315,6 +618,7 @@ class GlobalSegmentation(PropertyTypeManager):
             new_threshold (int): The new threshold value for segmentation.
         """
         self.__thresh = int(new_threshold)
+        self.property_changed()
 
     def apply(self, image: ndarray) -> MatLike:
         """
@@ -326,9 +630,9 @@ class GlobalSegmentation(PropertyTypeManager):
         Returns:
             MatLike: The segmented image.
         """
-        gray: MatLike = cvtColor(image, COLOR_BGR2GRAY)
-        _, segmented_image = threshold(gray, self.__thresh, 255, 0)
-        return cvtColor(segmented_image, COLOR_GRAY2BGR)
+        gray: MatLike = self.gray_input(image)
+        _, segmented_image = threshold(gray, self.__thresh, 255, 0, self.gray_result(gray))
+        return self.expand_gray(segmented_image)
 
 class KMeansSegmentation(PropertyTypeManager):
     """
@@ -336,17 +640,24 @@ class KMeansSegmentation(PropertyTypeManager):
 
     Attributes:
         kluster_count (int): The number of clusters for K-means clustering.
+        time_budget (int): Milliseconds per frame spent fitting the clusters, 0 fits until converged.
     """
-    def __init__(self, kluster_count: int = 2):
+    global_statistics: bool = True
+
+    def __init__(self, kluster_count: int = 2, time_budget: int = 0):
         """
         Initializes the KMeansSegmentation class.
 
         Args:
             kluster_count (int, optional): The number of clusters for K-means clustering. Defaults to 2.
+            time_budget (int, optional): Milliseconds per frame spent fitting the clusters, 0 fits until converged. Defaults to 0.
         """
         super().__init__()
         self.__kluster_count: int = kluster_count
-        self.add_property("kluster_count", int.__name__, 0, 10)
+        self.__time_budget: int = time_budget
+        self.__engine: KMeansEngine = KMeansEngine(kluster_count, time_budget=time_budget / 1000, buffers=self.buffers)
+        self.add_property("kluster_count", int.__name__, 1, 16)
+        self.add_property("time_budget", int.__name__, 0, 50)
 
     @property
     def kluster_count(self) -> int:
@@ -363,21 +674,355 @@ class KMeansSegmentation(PropertyTypeManager):
             new_kluster_count (int): The new number of clusters for K-means clustering.
         """
         self.__kluster_count = int(new_kluster_count)
+        self.property_changed()
+
+    @property
+    def time_budget(self) -> int:
+        """
+        time_budget (int): Milliseconds per frame spent fitting the clusters, 0 fits until converged.
+        """
+        return self.__time_budget
+
+    @time_budget.setter
+    def time_budget(self, new_time_budget: int) -> None:
+        """
+        Arguments:
+        ----------
+            new_time_budget (int): The new milliseconds per frame spent fitting the clusters.
+        """
+        self.__time_budget = int(new_time_budget)
+        self.property_changed()
+
+    def collect_statistics(self, tile: MatLike, core: Tuple[slice, slice]) -> ndarray:
+        """
+        A random sample of the tile's pixels, the centers are fitted on the samples of every tile.
+        """
+        pixels: ndarray = tile[core].reshape(-1, tile.shape[2] if tile.ndim == 3 else 1)
+        return pixels[random.default_rng(0).integers(0, len(pixels), min(len(pixels), self.__engine.sample_size))]
+
+    def merge_statistics(self, partials: List[ndarray]) -> ndarray:
+        """
+        Fits the centers of the whole image from the samples of every tile.
+        """
+        return KMeansEngine(self.__kluster_count, self.__engine.sample_size).update(concatenate(partials))
 
     def apply(self, image: ndarray) -> ndarray:
         """
         Performs segmentation using K-means clustering on the given image.
 
+        Centers are fitted on a subsample of the pixels and warm-started from the previous
+        frame, with mini-batch updates capped by time_budget when it is set, see KMeansEngine.
+
         Args:
             image (numpy.ndarray): The input image.
 
         Returns:
-            numpy.ndarray: The segmented image.
+            numpy.ndarray: The segmented image, colored by the centers in self.statistics when they are set.
+        """
+        if self.statistics is not None:
+            return self.__engine.paint(image, self.statistics, self.buffers.output(image.shape, uint8))
+
+        self.__engine.cluster_count = self.__kluster_count
+        self.__engine.time_budget = self.__time_budget / 1000
+        return self.__engine.segment(image, self.buffers.output(image.shape, uint8))
+
+FILTER_CLASSES: Dict[str, Type[PropertyTypeManager]] = {
+    image_filter.__name__: image_filter
+    for image_filter in (GrayscaleConverter, BoxBlurFilter, SobelEdgeDetector, CannyEdgeDetector, GlobalSegmentation, KMeansSegmentation)
+}
+
+def create_filter(name: str, properties: Optional[Dict[str, Any]] = None) -> PropertyTypeManager:
+    """
+    Creates a filter from its class name and sets its properties through their setters.
+
+    Several class names joined by commas create a FilterChain, whose properties are set as
+    described in FilterChain.set_property().
+
+    Arguments:
+    ----------
+        name (str): The class name of the filter, case insensitive, or several joined by commas.
+        properties (Optional[Dict[str, Any]]): The property values to set. Defaults to None.
+
+    Returns:
+    --------
+        PropertyTypeManager: The configured filter instance.
+
+    Raises:
+    -------
+        ValueError: If the filter or one of the properties does not exist.
+    """
+    stage_names: List[str] = [stage_name.strip() for stage_name in name.split(",")]
+
+    if len(stage_names) > 1:
+        chain: FilterChain = FilterChain(*(create_filter(stage_name) for stage_name in stage_names))
+
+        for property_name, value in (properties or {}).items():
+            chain.set_property(property_name, value)
+
+        return chain
+
+    matches: List[Type[PropertyTypeManager]] = [image_filter for class_name, image_filter in FILTER_CLASSES.items() if class_name.lower() == name.lower()]
+
+    if not matches:
+        raise ValueError(f"Unknown filter {name}, expected one of {', '.join(FILTER_CLASSES)}")
+
+    image_filter: PropertyTypeManager = matches[0]()
+
+    for property_name, value in (properties or {}).items():
+        if property_name not in image_filter.property_data:
+            raise ValueError(f"{matches[0].__name__} has no property {property_name}, expected one of {', '.join(image_filter.property_data)}")
+
+        setattr(image_filter, property_name, value)
+
+    return image_filter
+
+class FilterChain(PropertyTypeManager):
+    """
+    Class applying several filters one after the other as a single filter.
+
+    Each stage receives the previous result in a format it accepts, and single channel results
+    stay single channel between stages, so nothing is expanded only to be converted back. With
+    cache_stages on, a copy of the result of every stage is kept for read-only inputs, so setting
+    a property of a later stage only runs the stages from that one on.
+
+    Attributes:
+        stages (Tuple[PropertyTypeManager, ...]): The filters in the order they are applied.
+        cache_stages (bool): Whether stage results are kept, only worth it for inputs that repeat such as loaded stills.
+    """
+    def __init__(self, *stages: PropertyTypeManager, expand: bool = False):
+        """
+        Initializes the FilterChain class.
+
+        Args:
+            *stages (PropertyTypeManager): The filters in the order they are applied, at least one.
+            expand (bool, optional): Expands a single channel result of the last stage to three channels. Defaults to False.
+
+        Raises:
+            ValueError: If no stage is given.
+        """
+        if not stages:
+            raise ValueError("A filter chain needs at least one stage")
+
+        # Set before the base class initializer, which sets expand through the property below
+        self.stages: Tuple[PropertyTypeManager, ...] = stages
+        super().__init__()
+        self.expand: bool = expand
+        self.accepted_formats: Tuple[str, ...] = stages[0].accepted_formats
+        self.global_statistics: bool = any(stage.global_statistics for stage in stages)
+        # The last result of each stage, with the input of the chain and the settings of every stage up to it
+        self.__results: List[Optional[Tuple[MatLike, Tuple, MatLike]]] = [None] * len(stages)
+        self.__lock: Lock = Lock()
+        self.__cache_stages: bool = False
+
+        for stage in stages[:-1]:
+            stage.expand = False
+
+        for stage in stages:
+            stage.add_listener(lambda _: self.property_changed())
+
+    @property
+    def expand(self) -> bool:
+        """
+        expand (bool): Whether a single channel result of the last stage is expanded to three channels.
+        """
+        return self.stages[-1].expand
+
+    @expand.setter
+    def expand(self, expand: bool) -> None:
+        """
+        Arguments:
+        ----------
+            expand (bool): The new expand value of the last stage.
+        """
+        self.stages[-1].expand = expand
+
+    @property
+    def cache_stages(self) -> bool:
+        """
+        cache_stages (bool): Whether the result of every stage is kept for read-only inputs.
+        """
+        return self.__cache_stages
+
+    @cache_stages.setter
+    def cache_stages(self, cache_stages: bool) -> None:
+        """
+        Arguments:
+        ----------
+            cache_stages (bool): Whether stage results are kept, turning it off drops the kept ones.
+        """
+        self.__cache_stages = cache_stages
+
+        if not cache_stages:
+            with self.__lock:
+                self.__results = [None] * len(self.stages)
+
+    def snapshot(self) -> Tuple[Tuple[str, Any], ...]:
+        """
+        Returns the property values of every stage, each name prefixed with the index of its stage.
+
+        Returns:
+        --------
+            Tuple[Tuple[str, Any], ...]: Pairs of property name and value, such as ("2.threshold_one", 50).
+        """
+        return tuple((f"{index}.{name}", value) for index, stage in enumerate(self.stages) for name, value in stage.snapshot())
+
+    def copy(self) -> 'FilterChain':
+        """
+        Creates a new chain of copies of the stages.
+
+        Returns:
+        --------
+            FilterChain: The new chain, sharing no buffers or cached results with this one.
+        """
+        return FilterChain(*(stage.copy() for stage in self.stages), expand=self.expand)
+
+    def set_property(self, name: str, value: Any) -> None:
+        """
+        Sets a property of some stages through its setter.
+
+        Arguments:
+        ----------
+            name (str): The property, prefixed by the index or class name of a stage and a dot such as 2.threshold_one
+                        or CannyEdgeDetector.threshold_one, without a prefix every stage having it is set.
+            value (Any): The new value.
+
+        Raises:
+        -------
+            ValueError: If no stage has the property.
+        """
+        prefix, _, property_name = name.rpartition(".")
+        matched: bool = False
+
+        for index, stage in enumerate(self.stages):
+            if prefix and prefix != str(index) and prefix.lower() != type(stage).__name__.lower():
+                continue
+
+            if property_name in stage.property_data:
+                setattr(stage, property_name, value)
+                matched = True
+
+        if not matched:
+            raise ValueError(f"No stage of {', '.join(type(stage).__name__ for stage in self.stages)} has the property {name}")
+
+    def stage_formats(self, input_format: str) -> List[Tuple[str, str]]:
+        """
+        Plans the formats of every stage, each one picks the input format closest to the previous result.
+
+        Arguments:
+        ----------
+            input_format (str): The format of the chain's input.
+
+        Returns:
+        --------
+            List[Tuple[str, str]]: The input and output format of each stage.
+        """
+        formats: List[Tuple[str, str]] = []
+        current_format: str = input_format
+
+        for index, stage in enumerate(self.stages):
+            # Prefers outputs the next stage takes as they are
+            target_formats: Tuple[str, ...] = self.stages[index + 1].accepted_formats if index + 1 < len(self.stages) else (current_format,)
+            stage_plan: ColorPlan = plan(stage, (current_format,), target_formats)
+            formats.append((stage_plan.input_format, stage_plan.output_format))
+            current_format = stage_plan.output_format
+
+        return formats
+
+    def output_format_for(self, input_format: str) -> str:
+        """
+        The format of the last stage's result.
+        """
+        return self.stage_formats(input_format)[-1][1]
+
+    def halo(self) -> int:
+        """
+        Every stage looks around the result of the previous one, so the halos add up.
+        """
+        self.__configure()
+        return sum(stage.halo() for stage in self.stages)
+
+    def collect_statistics(self, tile: MatLike, core: Tuple[slice, slice]) -> List[Any]:
+        """
+        The statistics of every stage with global_statistics, each collected on its own input.
+
+        The stages before one with global statistics run on the tile alone, so a second stage with
+        global statistics collects them from an input that used the tile's statistics of the first.
+        """
+        self.__configure()
+        last_global: int = max(index for index, stage in enumerate(self.stages) if stage.global_statistics)
+        partials: List[Any] = []
+        current, current_format = tile, self.input_format
+
+        for index, (stage, (input_format, output_format)) in enumerate(zip(self.stages[:last_global + 1], self.stage_formats(self.input_format))):
+            stage_input: MatLike = self.__stage_input(index, current, current_format, input_format)
+            stage.input_format, stage.statistics = input_format, None
+            partials.append(stage.collect_statistics(stage_input, core) if stage.global_statistics else None)
+
+            if index < last_global:
+                current, current_format = stage.apply(stage_input), output_format
+
+        return partials
+
+    def merge_statistics(self, partials: List[List[Any]]) -> List[Any]:
+        """
+        Merges the statistics of every stage with global_statistics separately.
+        """
+        return [stage.merge_statistics([tile_partials[index] for tile_partials in partials]) if stage.global_statistics else None for index, stage in enumerate(self.stages)]
+
+    def apply(self, image: ndarray) -> MatLike:
+        """
+        Applies every stage to the image in order.
+
+        Args:
+            image (numpy.ndarray): The input image in input_format.
+
+        Returns:
+            MatLike: The result of the last stage.
+        """
+        self.__configure()
+        # Writable inputs can change without being new arrays, so only read-only ones are cached.
+        # Frames that never repeat, such as read-only views of a recording, would only pay for the copies
+        cacheable: bool = self.__cache_stages and not image.flags.writeable and self.statistics is None
+        settings: Tuple = (self.resolution_scale,)
+        current, current_format = image, self.input_format
+
+        for index, (stage, (input_format, output_format)) in enumerate(zip(self.stages, self.stage_formats(self.input_format))):
+            snapshot: Tuple[Tuple[str, Any], ...] = stage.snapshot()
+            settings = (settings, type(stage), snapshot, input_format, output_format)
+
+            with self.__lock:
+                cached: Optional[Tuple[MatLike, Tuple, MatLike]] = self.__results[index]
+
+            if cacheable and cached is not None and cached[0] is image and cached[1] == settings:
+                current, current_format = cached[2], output_format
+                continue
+
+            stage.input_format = input_format
+            stage.statistics = None if self.statistics is None else self.statistics[index]
+            current, current_format = stage.apply(self.__stage_input(index, current, current_format, input_format)), output_format
+
+            # A result computed while a slider moved may mix old and new values, so it is not kept.
+            # The stage wrote into its output ring, which later frames overwrite, so a copy is kept
+            if cacheable and stage.snapshot() == snapshot:
+                with self.__lock:
+                    self.__results[index] = (image, settings, current.copy())
+
+        return current
+
+    def __configure(self) -> None:
+        """
+        Passes the resolution and buffer settings of the chain on to every stage.
+        """
+        for stage in self.stages:
+            stage.resolution_scale = self.resolution_scale
+            stage.buffers.reuse_outputs = self.buffers.reuse_outputs
+
+    def __stage_input(self, index: int, image: MatLike, source_format: str, target_format: str) -> MatLike:
+        """
+        Converts the previous result to the input format of a stage, into a buffer kept for that stage.
         """
-        z: ndarray = image.reshape((-1, 3)).astype(float32)
-        criteria: Tuple[float, int, float] = (TERM_CRITERIA_EPS + TERM_CRITERIA_MAX_ITER, 10, 1.0)
-        _, labels, (centers) = kmeans(z, 2 if self.__kluster_count > 5 else self.__kluster_count, None, criteria, 10, KMEANS_RANDOM_CENTERS) # type: ignore
+        if source_format == target_format:
+            return image
 
-        centers = uint8(centers)
-        segmented_image = centers[labels.flatten()] # type: ignore
-        return segmented_image.reshape((image.shape))
+        shape: Tuple[int, ...] = image.shape[:2] if target_format == GRAY else (*image.shape[:2], 3)
+        return convert(image, source_format, target_format, self.buffers.get(f"stage_{index}", shape, image.dtype))
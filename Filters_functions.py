@@ -1,9 +1,134 @@
-from cv2 import cvtColor, COLOR_BGR2GRAY, blur, Sobel, CV_64F, magnitude, normalize, NORM_MINMAX, Canny, threshold, COLOR_GRAY2BGR, TERM_CRITERIA_EPS, TERM_CRITERIA_MAX_ITER, kmeans, KMEANS_RANDOM_CENTERS, COLOR_BGR2RGB
-from numpy import ndarray, float32, uint8, clip
+from cv2 import LUT, convertScaleAbs, cvtColor, COLOR_BGR2GRAY, blur, Sobel, CV_8U, CV_64F, magnitude, absdiff, add, normalize, NORM_MINMAX, Canny, threshold, COLOR_GRAY2BGR
+from numpy import ndarray, uint8, clip, arange
+from functools import lru_cache
 from cv2.typing import MatLike
-from typing import Tuple
+from typing import Optional, Tuple
 
-def grayscale(image: ndarray, level: float = 1.0) -> MatLike:
+from kmeans_engine import KMeansEngine
+
+@lru_cache(maxsize=16)
+def gray_level_table(level: float = 1.0) -> ndarray:
+    """
+    Builds the 256 entry lookup table that scales gray values by a level.
+
+    Tables are cached per level, so a table is only built again when the level changes.
+
+    Arguments:
+    ----------
+        level (float): Level of greyness. Values less than 1.0 result in a darker image.
+
+    Returns:
+    --------
+        numpy.ndarray: The read-only uint8 table for cv2.LUT.
+    """
+    table: ndarray = clip(arange(256) * level, 0, 255).astype(uint8)  # Clip values and convert back to uint8
+    table.flags.writeable = False
+    return table
+
+def adjust_gray_level(gray: ndarray, level: float = 1.0) -> ndarray:
+    """
+    Scales the intensity of a single channel grayscale image.
+
+    Arguments:
+    ----------
+        gray (numpy.ndarray): The input grayscale image.
+        level (float): Level of greyness. Values less than 1.0 result in a darker image.
+
+    Returns:
+    --------
+        numpy.ndarray: The adjusted grayscale image.
+    """
+    return LUT(gray, gray_level_table(float(level)))
+
+def sobel_gradients(gray: ndarray, ksize: int = 3, scale: int = 1, delta: int = 0, depth: int = CV_64F, out: Optional[Tuple[ndarray, ndarray]] = None) -> Tuple[ndarray, ndarray]:
+    """
+    Computes the horizontal and vertical Sobel derivatives of a grayscale image.
+
+    Arguments:
+    ----------
+        gray (numpy.ndarray): The input grayscale image.
+        ksize (int): Aperture size for the Sobel kernel. Default is 3.
+        scale (int): Optional scale factor for the computed derivative values. Default is 1.
+        delta (int): Optional delta value that is added to the results prior to storing them. Default is 0.
+        depth (int): The depth of the derivatives, CV_16S and CV_32F take a quarter and half the memory of CV_64F. Default is CV_64F.
+        out (Optional[Tuple[numpy.ndarray, numpy.ndarray]]): Arrays the derivatives are written into. Default is None.
+
+    Returns:
+    --------
+        Tuple[numpy.ndarray, numpy.ndarray]: The x and y derivatives.
+    """
+    dst_x, dst_y = out or (None, None)
+    sobel_x: ndarray = Sobel(gray, depth, 1, 0, dst_x, ksize=ksize, scale=scale, delta=delta) # type: ignore
+    sobel_y: ndarray = Sobel(gray, depth, 0, 1, dst_y, ksize=ksize, scale=scale, delta=delta) # type: ignore
+    return sobel_x, sobel_y
+
+def unnormalized_magnitude(sobel_x: ndarray, sobel_y: ndarray, overwrite: bool = False) -> ndarray:
+    """
+    Combines both derivatives into their magnitude, in the type of the derivatives.
+
+    Floating point derivatives use the exact magnitude, CV_16S derivatives the cheaper
+    |x| + |y| approximation, which stays in 16 bit integers.
+
+    Arguments:
+    ----------
+        sobel_x (numpy.ndarray): The horizontal derivative.
+        sobel_y (numpy.ndarray): The vertical derivative.
+        overwrite (bool): Keeps the intermediate results in the derivative arrays instead of new ones, changing their contents. Default is False.
+
+    Returns:
+    --------
+        numpy.ndarray: The edge magnitude.
+    """
+    if sobel_x.dtype.kind == "f":
+        return magnitude(sobel_x, sobel_y, sobel_x if overwrite else None) # type: ignore
+
+    magnitude_image: ndarray = absdiff(sobel_x, 0, sobel_x if overwrite else None) # type: ignore
+    return add(magnitude_image, absdiff(sobel_y, 0, sobel_y if overwrite else None), magnitude_image) # type: ignore
+
+def gradient_magnitude(sobel_x: ndarray, sobel_y: ndarray, dst: Optional[ndarray] = None, overwrite: bool = False, value_range: Optional[Tuple[float, float]] = None) -> ndarray:
+    """
+    Combines both derivatives into a normalized single channel edge image.
+
+    Arguments:
+    ----------
+        sobel_x (numpy.ndarray): The horizontal derivative.
+        sobel_y (numpy.ndarray): The vertical derivative.
+        dst (Optional[numpy.ndarray]): A uint8 array the result is written into. Default is None.
+        overwrite (bool): Keeps the intermediate results in the derivative arrays instead of new ones, changing their contents. Default is False.
+        value_range (Optional[Tuple[float, float]]): The magnitudes mapped to 0 and 255, the minimum and maximum of this image by default.
+
+    Returns:
+    --------
+        numpy.ndarray: The edge magnitude scaled to 0 - 255.
+    """
+    magnitude_image: ndarray = unnormalized_magnitude(sobel_x, sobel_y, overwrite)
+
+    if value_range is None:
+        # Normalizes and converts to uint8 in one step, so nothing is clipped beforehand
+        return normalize(magnitude_image, dst, 0, 255, NORM_MINMAX, CV_8U) # type: ignore
+
+    # The same mapping as NORM_MINMAX with a range measured elsewhere, such as over every tile of an image
+    low, high = value_range
+    alpha: float = 255 / (high - low) if high > low else 0.0
+    return convertScaleAbs(magnitude_image, dst, alpha, -low * alpha) # type: ignore
+
+def threshold_gray(gray: ndarray, thresh: int = 127) -> MatLike:
+    """
+    Segments a grayscale image with a single global threshold.
+
+    Arguments:
+    ----------
+        gray (numpy.ndarray): The input grayscale image.
+        thresh (int): The threshold value for segmentation. Default is 127.
+
+    Returns:
+    --------
+        numpy.ndarray: The single channel segmented image.
+    """
+    _, segmented_image = threshold(gray, thresh, 255, 0)
+    return segmented_image
+
+def grayscale(image: ndarray, level: float = 1.0, expand: bool = True) -> MatLike:
     """
     Converts the given image to grayscale.
 
@@ -12,15 +137,14 @@ def grayscale(image: ndarray, level: float = 1.0) -> MatLike:
         image (numpy.ndarray): The input image in BGR color format.
         level (float): Level of greyness. A value of 1.0 maintains the original grayscale conversion,
                        while values less than 1.0 result in a darker grayscale image.
+        expand (bool): Expands the result back to three BGR channels. Default is True.
 
     Returns:
     --------
         numpy.ndarray: The grayscaled image.
     """
-    gray_image: MatLike = cvtColor(image, COLOR_BGR2GRAY)
-    adjusted_gray: ndarray = gray_image.astype(float) * level
-    adjusted_gray: ndarray = clip(adjusted_gray, 0, 255).astype(uint8)  # Clip values and convert back to uint8
-    return cvtColor(adjusted_gray, COLOR_GRAY2BGR)
+    gray_image: MatLike = adjust_gray_level(cvtColor(image, COLOR_BGR2GRAY), level)
+    return cvtColor(gray_image, COLOR_GRAY2BGR) if expand else gray_image
 
 def box_blur(image: ndarray, kluster_matrix: Tuple[int, int] = (50, 50)) -> MatLike:
     """
@@ -34,8 +158,8 @@ def box_blur(image: ndarray, kluster_matrix: Tuple[int, int] = (50, 50)) -> MatL
     --------
         numpy.ndarray: The image with box blur applied.
     """
-    image_rgb: MatLike = cvtColor(image, COLOR_BGR2RGB)
-    blurred_image: MatLike = blur(image_rgb, kluster_matrix)
+    # Every channel is blurred the same way, so the channel order of the input is kept
+    blurred_image: MatLike = blur(image, kluster_matrix)
 
     return blurred_image
 
@@ -55,11 +179,8 @@ def sobel_edge_detection(image: ndarray, ksize: int = 3, scale: int = 1, delta:
         numpy.ndarray: The image with Sobel edge detection applied.
     """
     gray: ndarray = cvtColor(image, COLOR_BGR2GRAY)
-    sobel_x: ndarray = Sobel(gray, CV_64F, 1, 0, ksize=ksize, scale=scale, delta=delta)
-    sobel_y: ndarray = Sobel(gray, CV_64F, 0, 1, ksize=ksize, scale=scale, delta=delta)
-    magnitude_image: ndarray = magnitude(sobel_x, sobel_y)
-    magnitude_image = normalize(magnitude_image, None, 0, 255, NORM_MINMAX).astype('uint8') # type: ignore
-    return cvtColor(magnitude_image, COLOR_GRAY2BGR)
+    sobel_x, sobel_y = sobel_gradients(gray, ksize, scale, delta)
+    return cvtColor(gradient_magnitude(sobel_x, sobel_y), COLOR_GRAY2BGR)
 
 def canny_edge_detection(image: ndarray, threshold_one: int = 50, threshold_two: int = 150) -> ndarray:
     """
@@ -91,25 +212,21 @@ def global_segmentation(image: ndarray, thresh: int = 127) -> MatLike:
         numpy.ndarray: The segmented image.
     """
     gray: MatLike = cvtColor(image, COLOR_BGR2GRAY)
-    _, segmented_image = threshold(gray, thresh, 255, 0)
-    return cvtColor(segmented_image, COLOR_GRAY2BGR)
+    return cvtColor(threshold_gray(gray, thresh), COLOR_GRAY2BGR)
 
 def kmeans_segmentation(image: ndarray, kluster_count: int = 2) -> ndarray:
     """
     Performs segmentation using K-means clustering on the given image.
 
+    Uses the same KMeansEngine as KMeansSegmentation, started cold on every call.
+
     Arguments:
     ----------
         image (numpy.ndarray): The input image.
+        kluster_count (int): The number of clusters. Default is 2.
 
     Returns:
     --------
         numpy.ndarray: The segmented image.
     """
-    z: ndarray = image.reshape((-1, 3)).astype(float32)
-    criteria: Tuple[float, int, float] = (TERM_CRITERIA_EPS + TERM_CRITERIA_MAX_ITER, 10, 1.0)
-    _, labels, (centers) = kmeans(z, 2 if kluster_count > 5 else kluster_count, None, criteria, 10, KMEANS_RANDOM_CENTERS) # type: ignore
-
-    centers = uint8(centers)
-    segmented_image = centers[labels.flatten()] # type: ignore
-    return segmented_image.reshape((image.shape))
+    return KMeansEngine(kluster_count).segment(image)
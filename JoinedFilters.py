@@ -1,18 +1,30 @@
-from filters_functions import grayscale, box_blur, sobel_edge_detection, canny_edge_detection, global_segmentation, kmeans_segmentation
-from customtkinter import CTk, CTkLabel, CTkImage, CTkFrame
-from cv2 import VideoCapture, cvtColor, COLOR_BGR2RGB
-from typing import List, Callable, Tuple, Optional
+from frame_graph import FrameGraph, FrameValues, joined_filters_graph
+from customtkinter import CTk, CTkLabel, CTkFrame
+from typing import List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from scheduler import RedrawScheduler
+from capture import FrameGrabber
 from cv2.typing import MatLike
+from queue import Queue, Empty
+from metrics import FrameRate, Instrumentation
+from time import perf_counter
+from display import CanvasDisplay, preview_scale, downsample
+from color_spaces import RGB, GRAY
+from os import cpu_count
 from constants import *
-from PIL import Image
 
 class JoinedFilters(CTk):
     """
     A window containing canvases for each image filter
     """
-    def __init__(self) -> None:
+    def __init__(self, source: int|str = 0, instruments: Optional[Instrumentation] = None, stats_path: Optional[str] = None) -> None:
         """
         Initializes the JoinedFilters object.
+
+        Arguments:
+            source (int|str): The camera index, video file or image sequence shown by every canvas. Defaults to 0.
+            instruments (Optional[Instrumentation]): Times the stages of every frame, its overlay is shown while enabled. Defaults to None.
+            stats_path (Optional[str]): Where the stage timings are exported on exit, as JSON or CSV. Defaults to None.
         """
         super().__init__()
         window_width: int = 600
@@ -27,19 +39,37 @@ class JoinedFilters(CTk):
         self.title("Edge Detection and Image Segmentation All Options by: Sam Adrian P. Sabalo")
         self.iconbitmap(ICON_PATH)
 
-        operations: List[Tuple[str, Optional[Callable]]] = [
-            ("Main Camera", None),
-            ("Grayscale", grayscale),
-            ("Box Blur", box_blur),
-            ("Sobel Edge Detection", sobel_edge_detection),
-            ("Canny Edge Detection", canny_edge_detection),
-            ("Global Segmentation", global_segmentation),
-            ("K-Means Segmentation", kmeans_segmentation)
+        # Each canvas shows one output of the graph, which shares the gray, gradient and RGB frames between them
+        operations: List[Tuple[str, str]] = [
+            ("Main Camera", "rgb"),
+            ("Grayscale", "grayscale"),
+            ("Box Blur", "box_blur"),
+            ("Sobel Edge Detection", "sobel"),
+            ("Canny Edge Detection", "canny"),
+            ("Global Segmentation", "global_segmentation"),
+            ("K-Means Segmentation", "kmeans")
         ]
 
-        self.capture: VideoCapture = VideoCapture(0)
+        # Timings of the window that opened this one are not mixed in
+        self.instruments: Instrumentation = instruments or Instrumentation(enabled=stats_path is not None)
+        self.instruments.clear()
+        self.stats_path: Optional[str] = stats_path
+        self.overlay_updated_at: float = 0.0
+
+        self.graph: FrameGraph = joined_filters_graph()
+        self.graph.instruments = self.instruments
+        self.resolution_scale: float = 1.0
+
+        self.scheduler: RedrawScheduler = RedrawScheduler(self, self.update_frames)
+        self.grabber: FrameGrabber = FrameGrabber(source, on_frame=self.scheduler.mark_dirty, instruments=self.instruments).start()
+        self.frame_id: int = 0
         self.canvas_list = []
 
+        # OpenCV releases the GIL, so threads are enough to spread the tiles over every core
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=cpu_count() or 1, thread_name_prefix="JoinedFilters")
+        self.results: Queue[Tuple[int, Optional[MatLike], Optional[BaseException]]] = Queue()
+        self.busy_tiles: Set[int] = set()
+
         self.top_container: CTkFrame = CTkFrame(self)
         self.top_container.grid(row=0, column=0)
 
@@ -47,7 +77,7 @@ class JoinedFilters(CTk):
         self.bottom_container.configure(fg_color="transparent")
         self.bottom_container.grid(row=1, column=0, sticky="nsew")
 
-        for index, (text, filter) in enumerate(operations):
+        for index, (text, output) in enumerate(operations):
 
             canvas_card: CTkFrame = CTkFrame(self.top_container if index == 0 else self.bottom_container)
 
@@ -62,28 +92,104 @@ class JoinedFilters(CTk):
             else:
                 canvas_card.grid(padx=5, pady=5, row=0 if index - 1 < 3 else 1, column=index % 3, sticky="nsew")
 
-            self.canvas_list.append([canvas, filter])
+            # The main camera is bigger than the tiles below it
+            display: CanvasDisplay = CanvasDisplay(canvas, MAIN_TILE_SIZE if index == 0 else TILE_SIZE, self.instruments)
+            self.canvas_list.append([display, output, canvas_title, text, FrameRate()])
+
+        # Frame rate and stage timings, only shown while instrumented
+        self.overlay: CTkLabel = CTkLabel(self, text="", justify="left", anchor="nw", font=("Courier", 12))
+
+        if self.instruments.enabled:
+            self.overlay.grid(row=2, column=0, padx=5, pady=5, sticky="nsew")
+
+        self.scheduler.start()
 
-        self.after_id: str = self.after(1, self.update_frames)
+    def destroy(self) -> None:
+        """
+        Stops the capture and filter threads before destroying the window.
+        """
+        self.scheduler.stop()
+        self.grabber.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+        if self.stats_path is not None:
+            self.instruments.export(self.stats_path)
+
+        super().destroy()
 
     def update_frames(self):
         """
-        Updates each frame on the canvas to make it look like a camera
+        Updates each frame on the canvas to make it look like a camera, called by the scheduler whenever a new frame or tile arrives.
+
+        Every tile is evaluated on the pool and shown as soon as it is done, a tile that is still
+        busy skips new frames so slow filters never hold back the fast ones.
         """
-        frame_returned, frame = self.capture.read()
+        with self.instruments.measure("update_frames"):
+            self.__update_frames()
 
-        if frame_returned:
-            for canvas, filter in self.canvas_list:
-                frame: MatLike = cvtColor(frame, COLOR_BGR2RGB)
+        if self.instruments.enabled and perf_counter() - self.overlay_updated_at >= OVERLAY_REFRESH_INTERVAL / 1000:
+            self.overlay_updated_at = perf_counter()
+            self.overlay.configure(text=self.instruments.overlay_text())
 
-                if filter is None:
-                    image: CTkImage = CTkImage(light_image=Image.fromarray(frame), size=(365, 280))
-                    canvas.configure(image=image)
-                    continue
+    def __update_frames(self) -> None:
+        """
+        The body of update_frames().
+        """
+        while True:
+            try:
+                index, processed_image, error = self.results.get_nowait()
+            except Empty:
+                break
 
-                processed_image = filter(frame)
-                processed_image: MatLike = cvtColor(processed_image, COLOR_BGR2RGB)
-                image: CTkImage = CTkImage(light_image=Image.fromarray(processed_image), size=(180, 140))
-                canvas.configure(image=image)
+            self.busy_tiles.discard(index)
 
-        self.after_id = self.after(1, self.update_frames)
+            if error is not None:
+                raise error
+
+            display, _, canvas_title, text, frame_rate = self.canvas_list[index]
+            frame_rate.tick()
+
+            # Outputs are either RGB or single channel, both of which are shown as is
+            display.show(processed_image, GRAY if processed_image.ndim == 2 else RGB) # type: ignore
+            canvas_title.configure(text=f"{text}\n{frame_rate.fps:.1f} fps")
+
+        frame_id, frame = self.grabber.read()
+
+        if frame is None or frame_id == self.frame_id:
+            return
+
+        self.frame_id = frame_id
+        self.instruments.tick()
+        scale: float = preview_scale(frame.shape, MAIN_TILE_SIZE)
+
+        # Every tile works on a frame just big enough for the biggest tile, the graph is rebuilt for a new camera size
+        if scale != self.resolution_scale:
+            self.graph, self.resolution_scale = joined_filters_graph(scale), scale
+            self.graph.instruments = self.instruments
+
+        with self.instruments.measure("downsample"):
+            values: FrameValues = self.graph.bind(downsample(frame, scale))
+
+        for index, (_, output, _, _, _) in enumerate(self.canvas_list):
+            if index in self.busy_tiles:
+                continue
+
+            self.busy_tiles.add(index)
+            self.executor.submit(self.evaluate_tile, index, values, output)
+
+    def evaluate_tile(self, index: int, values: FrameValues, output: str) -> None:
+        """
+        Computes one tile on a worker thread and hands it back to the Tk thread.
+
+        Arguments:
+        ----------
+            index (int): The index of the tile in self.canvas_list.
+            values (FrameValues): The shared node values of the frame.
+            output (str): The graph output shown by the tile.
+        """
+        try:
+            self.results.put((index, values.get(output), None))
+        except BaseException as error:
+            self.results.put((index, None, error))
+        finally:
+            self.scheduler.mark_dirty()
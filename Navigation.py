@@ -2,22 +2,19 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, List, Optional
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 if TYPE_CHECKING:
     from Program import App
 
-from filters import GrayscaleConverter, BoxBlurFilter, SobelEdgeDetector, CannyEdgeDetector, GlobalSegmentation, KMeansSegmentation
+from Filters import GrayscaleConverter, BoxBlurFilter, SobelEdgeDetector, CannyEdgeDetector, GlobalSegmentation, KMeansSegmentation, FilterChain
 from save import open_file_dialog, save_file_dialog
 from custom_types import IMAGE_FILTER_TYPES
 from JoinedFilters import JoinedFilters
 from CTkToast import CTkToast
 from constants import *
 
-from customtkinter import CTkFrame, CTkButton, CTkImage
-from cv2 import COLOR_RGB2BGR, cvtColor, imwrite
-from cv2.typing import MatLike
-from numpy import array
+from customtkinter import CTkFrame, CTkButton
 
 class Navigation(CTkFrame):
 
@@ -34,14 +31,18 @@ class Navigation(CTkFrame):
         """
         super().__init__(parent, **kwargs)
         self.parent: App = parent
+        # While set, choosing a filter appends it to the current one instead of replacing it
+        self.chaining: bool = False
         self.create_filter_buttons()
 
         def open_joined_canvas() -> None:
             """
             Stops the app and opens a new window containing all canvas and options
             """
+            source: int|str = self.parent.grabber.source
+            instruments, stats_path = self.parent.instruments, self.parent.stats_path
             self.parent.destroy()
-            JoinedFilters().mainloop()
+            JoinedFilters(source, instruments, stats_path).mainloop()
 
         def load_image() -> None:
             """
@@ -49,6 +50,7 @@ class Navigation(CTkFrame):
             """
             image_path: Optional[str] = open_file_dialog()
             self.parent.loaded_image = image_path
+            self.parent.scheduler.mark_dirty()
 
         def clear_loaded_image() -> None:
             """
@@ -57,35 +59,40 @@ class Navigation(CTkFrame):
             self.parent.image_filter_reference = None
             self.parent.current_image_filter = None
             self.parent.loaded_image = None
+            self.parent.scheduler.mark_dirty()
 
             for widget in self.parent.filter_properties.winfo_children():
                 widget.destroy()
 
         def save_image() -> None:
             """
-            Save the image displayed on self.canvases.result_canvas using cv2.imwrite()
+            Save the image displayed on self.canvases.result_canvas using cv2.imwrite(), rendered again at full resolution in the background
             """
-            ctk_image_instance: CTkImage = self.parent.canvases.result_canvas.cget("image")
             file_path: Optional[str] = save_file_dialog()
 
             if file_path is None:
                 CTkToast.toast("No path given")
                 return
 
-            if ctk_image_instance is None:
-                CTkToast.toast("No image to save")
-                return
+            self.parent.save_full_resolution(file_path)
+
+        def toggle_chaining() -> None:
+            """
+            Switches between replacing the filter and chaining the chosen filters after it
+            """
+            self.chaining = not self.chaining
+            chain_button.configure(text="Chain: On" if self.chaining else "Chain")
 
-            # Convert the image to OpenCV format (RGB)
-            img_data: MatLike = ctk_image_instance.cget("light_image").convert("RGB")
-            img_data = cvtColor(array(img_data), COLOR_RGB2BGR)
-            imwrite(file_path, img_data)
+        chain_button: CTkButton = CTkButton(self, width=50, command=toggle_chaining)
 
         buttons: List[Tuple[CTkButton, str]] = [
             (CTkButton(self, width=50, command=clear_loaded_image), "Camera"),
             (CTkButton(self, width=50, command=open_joined_canvas), "All"),
             (CTkButton(self, width=50, command=load_image), "Load"),
-            (CTkButton(self, width=50, command=save_image), "Save")
+            (CTkButton(self, width=50, command=save_image), "Save"),
+            (chain_button, "Chain"),
+            (CTkButton(self, width=50, command=self.parent.toggle_instrumentation), "Stats"),
+            (CTkButton(self, width=50, command=self.parent.start_profile), "Profile")
         ]
 
         if len(buttons) >= 0:
@@ -99,9 +106,18 @@ class Navigation(CTkFrame):
         """
         def set_operation(operation: IMAGE_FILTER_TYPES) -> None:
             """
-            Sets the program image operation to be used
+            Sets the program image operation to be used, or appends it to the current one while chaining
             """
+            current_image_filter = self.parent.current_image_filter
+
+            if self.chaining and current_image_filter is not None:
+                # Copies keep the slider values while leaving the replaced filter's listeners behind
+                stages = current_image_filter.stages if isinstance(current_image_filter, FilterChain) else (current_image_filter,)
+                self.parent.use_filter(FilterChain(*(stage.copy() for stage in stages), operation())) # type: ignore
+                return
+
             self.parent.image_filter_reference = operation
+            self.parent.scheduler.mark_dirty()
 
         operations: List[Tuple[str, IMAGE_FILTER_TYPES]] = [
             ("Grayscale", GrayscaleConverter),
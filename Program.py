@@ -1,23 +1,74 @@
-from cv2 import VideoCapture, cvtColor, COLOR_BGR2RGB, imread
-from customtkinter import CTk, CTkImage
+from argparse import ArgumentParser, Namespace
+from cv2 import COLOR_BGR2RGB, imwrite
+from customtkinter import CTk
 from cv2.typing import MatLike
-from typing import Optional
-from PIL import Image
+from typing import Any, Dict, Optional, Tuple
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor, Future
 
 from custom_types import IMAGE_FILTER_TYPES, IMAGE_FILTERS
 from Properties import FilterProperties
 from Navigation import Navigation
+from processing import ProcessingEngine, ProcessedFrame
+from capture import FrameGrabber, parse_source
+from cache import ImageCache, FilterResultCache, file_key
+from scheduler import RedrawScheduler
+from metrics import Instrumentation
+from profiling import Profiler, default_profile_path
+from color_spaces import BGR, RGB, GRAY, ColorPlan, convert, plan
+from display import preview_scale, downsample, pyramid_down
+from Filters import PropertyTypeManager, FilterChain, FILTER_CLASSES
+from command_line import filter_from_arguments
+from tiling import TiledEngine
 from Canvases import Canvases
 from CTkToast import CTkToast
 from constants import *
 
+def render_and_write(file_path: str, image: MatLike, image_format: str, image_filter: Optional[PropertyTypeManager]) -> str:
+    """
+    Filters a full resolution image in tiles and writes it, which Save runs on a worker.
+
+    The color conversions happen tile by tile inside TiledEngine, so no full size copy of the
+    input is made and the result is produced in OpenCV's BGR, or gray, as it is written.
+
+    Arguments:
+    ----------
+        file_path (str): Where the image is written.
+        image (MatLike): The full resolution source.
+        image_format (str): The format of the source.
+        image_filter (Optional[PropertyTypeManager]): A filter used by nothing else, None writes the source as it is.
+
+    Returns:
+    --------
+        str: The path written.
+
+    Raises:
+    -------
+        ValueError: If OpenCV could not write the file.
+    """
+    if image_filter is None:
+        result: MatLike = image if image_format == GRAY else convert(image, image_format, BGR)
+    else:
+        image_filter.input_format = plan(image_filter, (image_format,), (BGR, GRAY)).input_format
+        result = TiledEngine(image_filter).apply(image, source_format=image_format, target_format=GRAY if image_filter.output_format == GRAY else BGR)
+
+    if not imwrite(file_path, result):
+        raise ValueError(f"OpenCV could not write {file_path}")
+
+    return file_path
+
 class App(CTk):
     """
     The main process of the app.
     """
-    def __init__(self) -> None:
+    def __init__(self, source: int|str = 0, record_path: Optional[str] = None, stats_path: Optional[str] = None) -> None:
         """
         Initializes the App object.
+
+        Arguments:
+            source (int|str): The camera index, video file, image sequence or frame store shown by the app. Defaults to 0.
+            record_path (Optional[str]): A frame store the captured frames are recorded into. Defaults to None.
+            stats_path (Optional[str]): Shows the performance overlay from the start and exports the stage timings here on exit, as JSON or CSV. Defaults to None.
         """
         super().__init__()
         window_width: int = 1280
@@ -28,6 +79,12 @@ class App(CTk):
         x_position: float = (screen_width - window_width) // 2
         y_position: float = (screen_height - window_height) // 2
 
+        # Created before the widgets, the displays time themselves with it
+        self.instruments: Instrumentation = Instrumentation(enabled=stats_path is not None)
+        self.stats_path: Optional[str] = stats_path
+        self.profiler: Profiler = Profiler()
+        self.overlay_updated_at: float = 0.0
+
         self.image_filter_reference: Optional[IMAGE_FILTER_TYPES] = None
         self.current_image_filter: Optional[IMAGE_FILTERS] = None
         self.loaded_image: Optional[str] = None
@@ -51,76 +108,334 @@ class App(CTk):
         self.grid_rowconfigure(1, weight=0)
         self.grid_rowconfigure(2, weight=1)
 
-        self.capture: VideoCapture = VideoCapture(0)
-        self.after_id: str = self.after(10, self.update_frames)
+        self.source_image: Optional[MatLike] = None
+        self.source_formats: Dict[str, MatLike] = {}
+        self.coarse_formats: Dict[str, MatLike] = {}
+        self.property_changed_at: float = 0.0
+        self.source_key: Optional[Tuple] = None
+        self.preview_scale: float = 1.0
+        self.full_image: Optional[MatLike] = None
+        self.full_format: str = RGB
+        self.submitted_key: Optional[Tuple] = None
+
+        self.scheduler: RedrawScheduler = RedrawScheduler(self, self.update_frames)
+        self.grabber: FrameGrabber = FrameGrabber(source, on_frame=self.scheduler.mark_dirty, record_path=record_path, instruments=self.instruments).start()
+        self.processing: ProcessingEngine = ProcessingEngine(result_cache=FilterResultCache(), on_finished=self.scheduler.mark_dirty, instruments=self.instruments, profiler=self.profiler)
+        self.image_cache: ImageCache = ImageCache()
+        self.save_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Save")
+        self.saving: Optional[Future] = None
+        self.scheduler.start()
 
         CTkToast(master=self)
 
-    def update_frames(self):
+    def destroy(self) -> None:
+        """
+        Stops the capture and processing threads before destroying the window.
+        """
+        self.scheduler.stop()
+        self.grabber.stop()
+        self.processing.shutdown()
+        # A save in progress still finishes, the interpreter waits for it before exiting
+        self.save_executor.shutdown(wait=False)
+
+        # A profile cut short by closing the window is still written
+        if self.profiler.active:
+            self.finish_profile()
+
+        if self.stats_path is not None:
+            self.instruments.export(self.stats_path)
+
+        super().destroy()
+
+    def start_profile(self, seconds: float = PROFILE_DURATION, output_path: Optional[str] = None) -> None:
         """
-        Updates each frame on the canvas to make it look like a camera
+        Profiles the frame loop and every apply() for a while, tagged with the filter and its property values.
+
+        Arguments:
+        ----------
+            seconds (float): How long to profile. Defaults to PROFILE_DURATION.
+            output_path (Optional[str]): A .pstats or .prof file, or a .collapsed, .folded or .txt file of sampled stacks for flame graphs. Defaults to a new file in PROFILE_DIRECTORY.
         """
-        frame_returned, frame = self.capture.read()
+        if self.profiler.active:
+            CTkToast.toast("Already profiling")
+            return
+
+        tags: Dict[str, Any] = self.profile_tags()
+
+        try:
+            self.profiler.start(output_path or default_profile_path(PROFILE_DIRECTORY, tags["filter"]), tags)
+        except ValueError as error:
+            CTkToast.toast(str(error))
+            return
 
-        if not frame_returned:
-            self.after_id = self.after(10, self.update_frames)
+        self.after(int(seconds * 1000), self.finish_profile)
+        CTkToast.toast(f"Profiling for {seconds:g} s")
+
+    def finish_profile(self) -> None:
+        """
+        Writes the profile started by start_profile().
+        """
+        if not self.profiler.active:
             return
 
-        frame: MatLike = cvtColor(frame, COLOR_BGR2RGB)
-        image: CTkImage = CTkImage(light_image=Image.fromarray(frame), size=DEFAULT_CANVAS_SIZE)
+        # The image is often only known once the first frames arrived
+        self.profiler.tags.update(self.profile_tags())
+
+        try:
+            CTkToast.toast(f"Profile saved to {self.profiler.stop()}")
+        except ValueError as error:
+            CTkToast.toast(str(error))
+
+    def profile_tags(self) -> Dict[str, Any]:
+        """
+        Describes what is running, so a profile can be reproduced.
+
+        Returns:
+        --------
+            Dict[str, Any]: The filter class and property values, the source and the image sizes.
+        """
+        image_filter: Optional[PropertyTypeManager] = self.current_image_filter
+
+        return {
+            "filter": type(image_filter).__name__ if image_filter is not None else None,
+            "properties": dict(image_filter.snapshot()) if image_filter is not None else {},
+            "source": self.loaded_image or self.grabber.source,
+            "image_shape": self.full_image.shape if self.full_image is not None else None,
+            "preview_scale": self.preview_scale
+        }
+
+    def toggle_instrumentation(self) -> None:
+        """
+        Starts timing every stage from scratch and shows the overlay, or stops timing and hides it.
+        """
+        self.instruments.clear()
+        self.instruments.enabled = not self.instruments.enabled
+        self.canvases.show_overlay(self.instruments.enabled)
+
+    def property_changed(self, _: PropertyTypeManager) -> None:
+        """
+        Redraws with a coarse result right away and schedules the detailed one for when the property settles.
+
+        Arguments:
+        ----------
+            _ (PropertyTypeManager): The filter whose property was set.
+        """
+        self.property_changed_at = perf_counter()
+        self.scheduler.mark_dirty()
+        self.after(REFINE_DELAY, self.scheduler.mark_dirty)
+
+    def use_filter(self, image_filter: PropertyTypeManager) -> None:
+        """
+        Makes a filter instance, such as a FilterChain, the one applied to the source and shows its sliders.
+
+        Arguments:
+        ----------
+            image_filter (PropertyTypeManager): The new filter.
+        """
+        self.image_filter_reference = type(image_filter) # type: ignore
+        self.current_image_filter = image_filter # type: ignore
+        image_filter.add_listener(self.property_changed)
+        # Results are converted for display as soon as they are polled, so outputs can be reused
+        image_filter.buffers.reuse_outputs = True
+        # PIL shows single channel results as they are
+        image_filter.expand = False
+
+        for widget in self.filter_properties.winfo_children():
+            widget.destroy()
+
+        self.filter_properties.generate()
+        self.scheduler.mark_dirty()
+
+    def coarse_source_formats(self) -> Dict[str, MatLike]:
+        """
+        The source in every format it exists in, shrunk by COARSE_PYRAMID_LEVELS, built once per source.
+
+        Returns:
+        --------
+            Dict[str, MatLike]: The coarse image of each format.
+        """
+        if not self.coarse_formats:
+            self.coarse_formats = {image_format: pyramid_down(image, COARSE_PYRAMID_LEVELS) for image_format, image in self.source_formats.items()}
+
+            if self.loaded_image is not None:
+                for image in self.coarse_formats.values():
+                    image.setflags(write=False)
+
+        return self.coarse_formats
+
+    def save_full_resolution(self, file_path: str) -> None:
+        """
+        Renders the current filter on the full resolution source and writes it, on a worker so the UI keeps running.
+
+        A separate filter with the same property values is used, so the previews keep running
+        on the current one while this renders. finish_save() reports the outcome with a toast.
+
+        Arguments:
+        ----------
+            file_path (str): Where the image is written, its extension picks the encoder.
+        """
+        if self.full_image is None:
+            CTkToast.toast("No image to save")
+            return
+
+        if self.saving is not None:
+            CTkToast.toast("Still saving the previous image")
+            return
+
+        image_filter: Optional[PropertyTypeManager] = self.current_image_filter.copy() if self.current_image_filter is not None else None
+        self.saving = self.save_executor.submit(render_and_write, file_path, self.full_image, self.full_format, image_filter)
+        # Wakes the scheduler, whose next redraw calls finish_save()
+        self.saving.add_done_callback(self.scheduler.mark_dirty)
+        CTkToast.toast(f"Saving {file_path}")
+
+    def finish_save(self) -> None:
+        """
+        Shows whether the save started by save_full_resolution() succeeded, once it finished.
+        """
+        if self.saving is None or not self.saving.done():
+            return
+
+        saving, self.saving = self.saving, None
+
+        try:
+            CTkToast.toast(f"Saved {saving.result()}")
+        except Exception as error:
+            CTkToast.toast(f"Could not save: {str(error).strip()}")
+
+    def update_frames(self):
+        """
+        Updates each frame on the canvas to make it look like a camera.
+
+        Called by the scheduler only after a new frame, a finished result or a property change.
+        """
+        with self.instruments.measure("update_frames"), self.profiler.profile():
+            self.__update_frames()
+
+        self.finish_save()
+
+        # The overlay is refreshed a few times per second, refreshing it every frame would cost more than it measures
+        if self.instruments.enabled and perf_counter() - self.overlay_updated_at >= OVERLAY_REFRESH_INTERVAL / 1000:
+            self.overlay_updated_at = perf_counter()
+            self.canvases.overlay.configure(text=self.instruments.overlay_text())
+
+    def __update_frames(self) -> None:
+        """
+        The body of update_frames().
+        """
+        frame_id, frame = self.grabber.read()
+        full_image: Optional[MatLike] = None
+        full_format: str = RGB
+        source_key: Optional[Tuple] = None
 
         if self.loaded_image is not None:
-            image = CTkImage(light_image=Image.open(self.loaded_image), size=DEFAULT_CANVAS_SIZE)
+            # Decoded once per file and shared by the preview and the filter input
+            full_image = self.image_cache.load(self.loaded_image, COLOR_BGR2RGB)
+            # Keyed by the file's version rather than the array, so an image that is decoded again is still the same source
+            source_key = ("file", file_key(self.loaded_image))
+
+            if full_image is None:
+                CTkToast.toast("Could not read the loaded image")
+                self.loaded_image = None
+
+        elif frame is not None:
+            full_image, full_format = frame, BGR
+            source_key = ("camera", frame_id)
+
+        if full_image is None:
+            return
+
+        source_changed: bool = source_key != self.source_key
+
+        if source_changed:
+            # Filters run on a preview no bigger than the canvas needs, the full resolution is only rendered on save
+            self.preview_scale = preview_scale(full_image.shape, DEFAULT_CANVAS_SIZE)
+            with self.instruments.measure("downsample"):
+                preview: MatLike = downsample(full_image, self.preview_scale)
+
+            self.source_formats = {full_format: preview}
 
-        # Shows the unfiltered camera to the original_canvas
-        self.canvases.original_canvas.configure(image=image)
+            # Every format the preview exists in is offered to the filter, so the same frame is only converted once
+            if full_format != RGB:
+                with self.instruments.measure("color conversion"):
+                    self.source_formats[RGB] = convert(preview, full_format, RGB)
+
+            # Read-only previews of files let the result cache skip work on unchanged images
+            if self.loaded_image is not None:
+                for image in self.source_formats.values():
+                    image.setflags(write=False)
+
+            self.full_image, self.full_format = full_image, full_format
+            self.coarse_formats = {}
+            self.source_image, self.source_key = self.source_formats[RGB], source_key
+
+            # Shows the unfiltered camera to the original_canvas
+            self.canvases.original_display.show(self.source_image, RGB)
 
         # Shows the unfiltered camera to the result canvas too if no filters was selected
         if self.image_filter_reference is None:
-            self.canvases.result_canvas.configure(image=image)
-            self.after_id = self.after(10, self.update_frames)
+            if source_changed or self.submitted_key is not None:
+                self.canvases.result_display.copy_from(self.canvases.original_display)
+                self.instruments.tick()
+                self.submitted_key = None
+
             return
 
-        # Image filter option not used yet
-        if self.current_image_filter is None:
+        # Image filter option not used yet, or the camera filter used has been replaced
+        if self.current_image_filter is None or self.image_filter_reference.__name__ != self.current_image_filter.__class__.__name__:
             # Sets the filter to the instance of the filter the user had chosen
-            self.current_image_filter = self.image_filter_reference()
-            self.filter_properties.generate()
+            self.use_filter(self.image_filter_reference())
 
-        # If the camera filter used has been replaced
-        if self.current_image_filter and self.image_filter_reference.__name__ != self.current_image_filter.__class__.__name__:
-            # Sets the filter to the instance of the filter the user had chosen
-            self.current_image_filter = self.image_filter_reference()
+        # While a slider moves the filter runs on a coarse pyramid level, once it settles the same frame is filtered again in full detail
+        levels: int = COARSE_PYRAMID_LEVELS if perf_counter() - self.property_changed_at < REFINE_DELAY / 1000 else 0
+        source_formats: Dict[str, MatLike] = self.coarse_source_formats() if levels else self.source_formats
+        submission_key: Tuple = (source_key, self.current_image_filter, self.current_image_filter.snapshot(), levels)
 
-            for widget in self.filter_properties.winfo_children():
-                widget.destroy()
+        # The frame is skipped if every worker is still busy, the next finished frame marks the view dirty again
+        if submission_key != self.submitted_key and not self.processing.busy:
+            color_plan: ColorPlan = plan(self.current_image_filter, tuple(source_formats))
+            filter_input: Optional[MatLike] = source_formats.get(color_plan.input_format)
 
-            self.filter_properties.generate()
+            if filter_input is None:
+                with self.instruments.measure("color conversion"):
+                    filter_input = convert(source_formats[RGB], RGB, color_plan.input_format)
 
-        def process_image(image_data: MatLike) -> None:
-            """
-            Loads the image data to the canvas
-            """
-            loaded_image_data: MatLike = cvtColor(image_data, COLOR_BGR2RGB) # type: ignore
+            # Stage results of a chain are only kept for loaded stills, the only inputs that repeat
+            if isinstance(self.current_image_filter, FilterChain):
+                self.current_image_filter.cache_stages = self.loaded_image is not None
 
-            if self.current_image_filter is None:
-                return
+            # The filter may still be applied to the previous frame, so the format and scale are handed over with the frame instead of set on it
+            # Frames of a recording are read-only views too, but only loaded stills ever repeat, so only they go through the result cache
+            if self.processing.submit(self.current_image_filter, filter_input, color_plan.input_format, self.preview_scale / 2 ** levels, self.loaded_image is not None):
+                self.submitted_key = submission_key
 
-            processed_image: MatLike = self.current_image_filter.apply(loaded_image_data)
-            processed_image = cvtColor(processed_image, COLOR_BGR2RGB)
+        processed_frame: Optional[ProcessedFrame] = self.processing.poll(self.current_image_filter)
 
-            image: Image.Image = Image.fromarray(processed_image)
-            ctk_image: CTkImage = CTkImage(light_image=image, size=DEFAULT_CANVAS_SIZE)
-            self.canvases.result_canvas.configure(image=ctk_image)
+        if processed_frame is not None:
+            self.canvases.result_display.show(processed_frame.image, processed_frame.image_format or BGR) # type: ignore
+            self.instruments.tick()
 
-        if self.loaded_image is not None:
-            image_data: MatLike = imread(self.loaded_image)
-            process_image(image_data)
-        else:
-            image_data: MatLike = self.current_image_filter.apply(frame)
-            process_image(image_data)
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description="Edge Detection and Image Segmentation")
+    parser.add_argument("--source", default="0", help="camera index, video file, image sequence such as frames/%%04d.png or .frames recording")
+    parser.add_argument("--record", metavar="PATH", help="also records every captured frame into a .frames file for replaying later")
+    parser.add_argument("--stats", metavar="PATH", help="shows the performance overlay and writes the stage timings to a .json or .csv file on exit")
+    parser.add_argument("-f", "--filter", help=f"starts with one of {', '.join(FILTER_CLASSES)}, or several joined by commas to chain them")
+    parser.add_argument("-s", "--set", action="append", default=[], metavar="NAME=VALUE", help="sets a property of --filter, can be repeated")
+    parser.add_argument("--profile", type=float, metavar="SECONDS", help="profiles the first seconds after starting")
+    parser.add_argument("--profile-output", metavar="PATH", help=f"a .pstats or .prof file, or .collapsed, .folded or .txt for sampled flame graph stacks, defaults to a new file in {PROFILE_DIRECTORY}/")
+    arguments: Namespace = parser.parse_args()
 
-        self.after_id = self.after(10, self.update_frames)
+    if arguments.set and not arguments.filter:
+        parser.error("--set needs a --filter")
 
-if __name__ == '__main__':
-    App().mainloop()
+    # Created before the window opens, so a bad filter or property is a usage error
+    initial_filter: Optional[PropertyTypeManager] = filter_from_arguments(parser, arguments.filter, arguments.set) if arguments.filter else None
+    app: App = App(parse_source(arguments.source), arguments.record, arguments.stats)
+
+    if initial_filter is not None:
+        app.use_filter(initial_filter)
+
+    if arguments.profile:
+        app.start_profile(arguments.profile, arguments.profile_output)
+
+    app.mainloop()
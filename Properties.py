@@ -9,7 +9,8 @@ if TYPE_CHECKING:
 
 from customtkinter import CTkFrame, CTkLabel, CTkSlider
 from class_methods import get_instance_properties
-from typing import Any, Dict, Optional, Callable
+from typing import Any, Dict, List, Optional, Callable, Tuple
+from Filters import FilterChain
 from constants import *
 
 class FilterProperties(CTkFrame):
@@ -35,34 +36,49 @@ class FilterProperties(CTkFrame):
         if self.parent.current_image_filter is None:
             return
 
-        filter_properties: Dict[str, Dict[str, Callable]] = get_instance_properties(self.parent.image_filter_reference)
-        filter_properties_data = self.parent.current_image_filter.property_data
+        # A chain shows the sliders of every stage, numbered by stage index like the names in its snapshot()
+        image_filters: List[Tuple[Optional[int], Any]] = [(None, self.parent.current_image_filter)]
 
-        for index, property_name in enumerate(filter_properties):
-            getters_setters: Dict[str, Callable] = filter_properties[property_name]
+        if isinstance(self.parent.current_image_filter, FilterChain):
+            image_filters = list(enumerate(self.parent.current_image_filter.stages))
 
-            properties_data: Optional[Any] = filter_properties_data.get(property_name, None)
-            getter: Optional[Callable] = getters_setters.get("getter", None)
-            setter: Optional[Callable] = getters_setters.get("setter", None)
+        index: int = 0
 
-            min: int = properties_data.get("min") if properties_data else 0
-            max: int = properties_data.get("max") if properties_data else 200
+        for stage_number, image_filter in image_filters:
+            filter_properties: Dict[str, Dict[str, Callable]] = get_instance_properties(type(image_filter))
+            filter_properties_data = image_filter.property_data
 
-            property_card: CTkFrame = CTkFrame(self)
-            property_card.grid_columnconfigure(0, weight=1)
-            property_card.grid_rowconfigure(0, weight=1)
-            property_card.grid(row=index, sticky="nsew", pady=BOTTOM_PADDING_ONLY)
+            for property_name in filter_properties:
+                properties_data: Optional[Any] = filter_properties_data.get(property_name, None)
 
-            label: CTkLabel = CTkLabel(property_card, text=property_name.capitalize())
-            label.grid(row=0, column=0, padx=(25,0), pady=(10,5), sticky="nsw")
+                # Properties like output_format are not settings
+                if properties_data is None:
+                    continue
 
-            def slider_event(value):
-                if setter:
-                    setter(self.parent.current_image_filter, value)
+                getters_setters: Dict[str, Callable] = filter_properties[property_name]
+                getter: Optional[Callable] = getters_setters.get("getter", None)
+                setter: Optional[Callable] = getters_setters.get("setter", None)
 
-            slider: CTkSlider = CTkSlider(property_card, from_=min, to=max, command=slider_event)
-            slider.grid(row=1, column=0, sticky="nsew", pady=(0,20), padx=20)
+                min: int = properties_data.get("min")
+                max: int = properties_data.get("max")
 
-            if getter:
-                current_property_value = getter(self.parent.current_image_filter)
-                slider.set(current_property_value)
+                property_card: CTkFrame = CTkFrame(self)
+                property_card.grid_columnconfigure(0, weight=1)
+                property_card.grid_rowconfigure(0, weight=1)
+                property_card.grid(row=index, sticky="nsew", pady=BOTTOM_PADDING_ONLY)
+                index += 1
+
+                label_text: str = property_name.capitalize() if stage_number is None else f"{stage_number}. {type(image_filter).__name__} {property_name}"
+                label: CTkLabel = CTkLabel(property_card, text=label_text)
+                label.grid(row=0, column=0, padx=(25,0), pady=(10,5), sticky="nsw")
+
+                def slider_event(value, image_filter=image_filter, setter=setter):
+                    if setter:
+                        setter(image_filter, value)
+
+                slider: CTkSlider = CTkSlider(property_card, from_=min, to=max, command=slider_event)
+                slider.grid(row=1, column=0, sticky="nsew", pady=(0,20), padx=20)
+
+                if getter:
+                    current_property_value = getter(image_filter)
+                    slider.set(current_property_value)
@@ -0,0 +1,220 @@
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from argparse import ArgumentParser, Namespace
+from cv2 import imread, imwrite, haveImageWriter
+from cv2.typing import MatLike
+from time import perf_counter
+from os import path, cpu_count, makedirs, listdir
+from json import load
+from sys import stderr
+from glob import glob
+
+from Filters import PropertyTypeManager, FILTER_CLASSES, create_filter
+from command_line import parse_properties
+
+IMAGE_EXTENSIONS: Tuple[str, ...] = (".bmp", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp")
+
+# The filter name and properties of each worker process, set once by initialize_worker
+worker_settings: Optional[Tuple[str, Dict[str, Any]]] = None
+
+def initialize_worker(filter_name: str, properties: Dict[str, Any]) -> None:
+    """
+    Stores the filter a worker process creates for every image it is given.
+
+    Arguments:
+    ----------
+        filter_name (str): The class name of the filter.
+        properties (Dict[str, Any]): The property values of the filter.
+    """
+    global worker_settings
+    worker_settings = (filter_name, properties)
+
+def process_file(input_path: str, output_path: str) -> Tuple[str, Optional[str], float]:
+    """
+    Reads, filters and writes a single image inside a worker process.
+
+    Arguments:
+    ----------
+        input_path (str): The image to read.
+        output_path (str): Where the filtered image is written.
+
+    Returns:
+    --------
+        Tuple[str, Optional[str], float]: The input path, an error message or None, and the seconds it took.
+    """
+    started: float = perf_counter()
+    image: Optional[MatLike] = imread(input_path)
+
+    if image is None:
+        return input_path, "could not be read", perf_counter() - started
+
+    try:
+        # A new filter per image, so state such as warm-started K-Means centers never carries over
+        # from whichever image this worker happened to process before
+        image_filter: PropertyTypeManager = create_filter(*worker_settings) # type: ignore
+        processed_image: MatLike = image_filter.apply(image)
+    except Exception as error:
+        return input_path, f"could not be filtered: {error}", perf_counter() - started
+
+    # A bad extension or an unwritable directory fails this image only, not the whole run
+    try:
+        makedirs(path.dirname(output_path) or ".", exist_ok=True)
+
+        if not imwrite(output_path, processed_image):
+            return input_path, f"could not be written to {output_path}", perf_counter() - started
+    except Exception as error:
+        return input_path, f"could not be written to {output_path}: {str(error).strip()}", perf_counter() - started
+
+    return input_path, None, perf_counter() - started
+
+def find_images(inputs: List[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Expands directories and glob patterns into image paths, lazily so huge folders start processing at once.
+
+    Arguments:
+    ----------
+        inputs (List[str]): Files, directories or glob patterns.
+
+    Returns:
+    --------
+        Iterator[Tuple[str, str]]: Each image path together with its path relative to the input it came from.
+    """
+    for input_path in inputs:
+        if path.isdir(input_path):
+            for name in sorted(listdir(input_path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield path.join(input_path, name), name
+
+        elif path.isfile(input_path):
+            yield input_path, path.basename(input_path)
+
+        else:
+            root: str = path.dirname(input_path.split("*")[0])
+
+            for match in sorted(glob(input_path, recursive=True)):
+                if path.isfile(match) and match.lower().endswith(IMAGE_EXTENSIONS):
+                    yield match, path.relpath(match, root) if root else match
+
+def output_path_for(relative_path: str, output_directory: str, extension: Optional[str]) -> str:
+    """
+    Maps an input image to the file its result is written to.
+
+    Arguments:
+    ----------
+        relative_path (str): The path of the image relative to its input.
+        output_directory (str): The directory results are written to.
+        extension (Optional[str]): Replaces the extension of the input when given.
+
+    Returns:
+    --------
+        str: The output path, whose directory is created by the worker writing it.
+    """
+    output_path: str = path.join(output_directory, relative_path)
+
+    if extension:
+        output_path = path.splitext(output_path)[0] + "." + extension.lstrip(".")
+
+    return output_path
+
+def run(inputs: List[str], output_directory: str, filter_name: str, properties: Dict[str, Any], workers: int, max_in_flight: int, extension: Optional[str] = None) -> int:
+    """
+    Streams every image through a process pool, keeping at most max_in_flight images queued at a time.
+
+    Arguments:
+    ----------
+        inputs (List[str]): Files, directories or glob patterns.
+        output_directory (str): The directory results are written to.
+        filter_name (str): The class name of the filter.
+        properties (Dict[str, Any]): The property values of the filter.
+        workers (int): The number of worker processes.
+        max_in_flight (int): The maximum number of images submitted but not finished.
+        extension (Optional[str]): Replaces the extension of the outputs when given.
+
+    Returns:
+    --------
+        int: The number of images that failed.
+    """
+    processed: int = 0
+    failed: int = 0
+    started: float = perf_counter()
+    pending: Set[Future] = set()
+
+    def collect(done: Set[Future]) -> None:
+        nonlocal processed, failed
+
+        for future in done:
+            input_path, error, _ = future.result()
+            processed += 1
+
+            if error is not None:
+                failed += 1
+                print(f"{input_path}: {error}", file=stderr)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker, initargs=(filter_name, properties)) as executor:
+        for input_path, relative_path in find_images(inputs):
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+
+            pending.add(executor.submit(process_file, input_path, output_path_for(relative_path, output_directory, extension)))
+
+        collect(wait(pending).done)
+
+    elapsed: float = perf_counter() - started
+    print(f"{processed} images, {failed} failed, {elapsed:.1f} s, {processed / elapsed if elapsed else 0:.1f} images/s")
+    return failed
+
+def parse_arguments(arguments: Optional[List[str]] = None) -> Namespace:
+    """
+    Parses the command line, values from --config are used wherever a flag was not given.
+
+    Arguments:
+    ----------
+        arguments (Optional[List[str]]): The arguments to parse. Defaults to sys.argv.
+
+    Returns:
+    --------
+        Namespace: The parsed arguments with the merged properties.
+    """
+    parser: ArgumentParser = ArgumentParser(description="Applies an image filter to directories or glob patterns of images without a display.")
+    parser.add_argument("inputs", nargs="+", help="image files, directories or glob patterns such as 'images/**/*.png'")
+    parser.add_argument("-o", "--output", help="directory the filtered images are written to")
+    parser.add_argument("-f", "--filter", help=f"one of {', '.join(FILTER_CLASSES)}, or several joined by commas to chain them")
+    parser.add_argument("-s", "--set", action="append", default=[], metavar="NAME=VALUE", help="sets a filter property, can be repeated")
+    parser.add_argument("-c", "--config", help="JSON file with filter, properties, output, workers, max_in_flight and extension keys")
+    parser.add_argument("-w", "--workers", type=int, help="number of worker processes, defaults to the CPU count")
+    parser.add_argument("--max-in-flight", type=int, help="images queued at most at once, defaults to four per worker")
+    parser.add_argument("--extension", help="writes the outputs with this extension instead of the input's")
+    parsed: Namespace = parser.parse_args(arguments)
+
+    config: Dict[str, Any] = {}
+
+    if parsed.config:
+        with open(parsed.config) as config_file:
+            config = load(config_file)
+
+    parsed.filter = parsed.filter or config.get("filter")
+    parsed.output = parsed.output or config.get("output")
+    parsed.workers = parsed.workers or config.get("workers") or cpu_count() or 1
+    parsed.max_in_flight = parsed.max_in_flight or config.get("max_in_flight") or parsed.workers * 4
+    parsed.extension = parsed.extension or config.get("extension")
+
+    if not parsed.filter or not parsed.output:
+        parser.error("a filter and an output directory are required, through flags or --config")
+
+    # Otherwise every image would fail to be written one at a time
+    if parsed.extension and not haveImageWriter("x." + parsed.extension.lstrip(".")):
+        parser.error(f"no image writer for the extension {parsed.extension}")
+
+    try:
+        parsed.properties = {**config.get("properties", {}), **parse_properties(parsed.set)}
+        # A bad filter, property or value is reported as a usage error before any worker starts
+        create_filter(parsed.filter, parsed.properties)
+    except (ValueError, TypeError) as error:
+        parser.error(str(error))
+
+    return parsed
+
+if __name__ == '__main__':
+    arguments: Namespace = parse_arguments()
+    raise SystemExit(1 if run(arguments.inputs, arguments.output, arguments.filter, arguments.properties, arguments.workers, arguments.max_in_flight, arguments.extension) else 0)
@@ -0,0 +1,448 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from cv2 import GaussianBlur, circle, rectangle, Sobel, cvtColor, COLOR_BGR2GRAY, CV_64F
+from inspect import getmembers, isfunction, signature, Parameter
+from argparse import ArgumentParser, Namespace
+from numpy import ndarray, uint8, linspace, percentile, median, indices, random
+from datetime import datetime, timezone
+from time import perf_counter
+from platform import platform, processor, python_version
+from os import cpu_count
+from json import dump, load
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from Filters import PropertyTypeManager, FILTER_CLASSES, create_filter
+import Filters_functions
+import numpy
+import cv2
+
+IMAGE_SIZES: Dict[str, Tuple[int, int]] = {
+    "VGA": (640, 480),
+    "HD": (1280, 720),
+    "FHD": (1920, 1080),
+    "4K": (3840, 2160),
+    "12MP": (4000, 3000),
+    "24MP": (6000, 4000)
+}
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> ndarray:
+    """
+    Creates a deterministic BGR test image with gradients, hard edges and sensor-like noise.
+
+    Arguments:
+    ----------
+        width (int): The width of the image.
+        height (int): The height of the image.
+        seed (int): The seed of the shapes and noise. Defaults to 0.
+
+    Returns:
+    --------
+        numpy.ndarray: The image, identical for the same arguments on every run.
+    """
+    generator = random.default_rng(seed)
+    rows, columns = indices((height, width))
+
+    image: ndarray = numpy.empty((height, width, 3), uint8)
+    image[..., 0] = (columns * 255 // max(width - 1, 1)).astype(uint8)
+    image[..., 1] = (rows * 255 // max(height - 1, 1)).astype(uint8)
+    image[..., 2] = ((rows + columns) * 255 // max(width + height - 2, 1)).astype(uint8)
+
+    scale: int = max(min(width, height) // 10, 1)
+
+    for _ in range(24):
+        color: Tuple[int, ...] = tuple(int(channel) for channel in generator.integers(0, 256, 3))
+        x, y = int(generator.integers(0, width)), int(generator.integers(0, height))
+
+        if generator.random() < 0.5:
+            circle(image, (x, y), int(generator.integers(1, scale + 1)), color, -1)
+        else:
+            rectangle(image, (x, y), (x + int(generator.integers(1, scale * 2)), y + int(generator.integers(1, scale * 2))), color, -1)
+
+    noise: ndarray = generator.integers(-12, 13, image.shape, dtype=numpy.int16)
+    return GaussianBlur(numpy.clip(image + noise, 0, 255).astype(uint8), (3, 3), 0)
+
+def sweep_values(minimum: float, maximum: float, data_type: str, steps: int) -> List[Any]:
+    """
+    Spreads values evenly over a property's declared range.
+
+    Arguments:
+    ----------
+        minimum (float): The minimum from property_data.
+        maximum (float): The maximum from property_data.
+        data_type (str): The declared data type, int values are rounded and deduplicated.
+        steps (int): The number of values.
+
+    Returns:
+    --------
+        List[Any]: The values to benchmark.
+    """
+    values: List[Any] = [float(value) for value in linspace(minimum, maximum, steps)]
+
+    if data_type == int.__name__:
+        values = sorted({int(round(value)) for value in values})
+
+    return values
+
+def class_cases(steps: int) -> Iterator[Tuple[str, Dict[str, Any], Callable[[Dict[str, ndarray]], Any]]]:
+    """
+    Lists every filter class with its defaults, then with one property at a time swept over its range.
+
+    Arguments:
+    ----------
+        steps (int): The number of values per property.
+
+    Returns:
+    --------
+        Iterator[Tuple[str, Dict[str, Any], Callable]]: The name, parameters and a callable taking the inputs of each case.
+    """
+    for name in FILTER_CLASSES:
+        default_filter: PropertyTypeManager = create_filter(name)
+        yield name, dict(default_filter.snapshot()), lambda inputs, image_filter=default_filter: image_filter.apply(inputs["image"]) # type: ignore
+
+        # Cases are matched by their parameters in compare(), so a sweep value equal to the defaults,
+        # or one a setter rounds onto an earlier value, is only benchmarked once
+        seen: Set[Tuple[Tuple[str, Any], ...]] = {default_filter.snapshot()}
+
+        for property_name, data in default_filter.property_data.items():
+            for value in sweep_values(data["min"], data["max"], data["data_type"], steps):
+                image_filter: PropertyTypeManager = create_filter(name, {property_name: value})
+
+                if image_filter.snapshot() in seen:
+                    continue
+
+                seen.add(image_filter.snapshot())
+                yield name, dict(image_filter.snapshot()), lambda inputs, image_filter=image_filter: image_filter.apply(inputs["image"]) # type: ignore
+
+def function_cases() -> Iterator[Tuple[str, Dict[str, Any], Callable[[Dict[str, ndarray]], Any]]]:
+    """
+    Lists every public function of Filters_functions with its default arguments.
+
+    Required arguments are filled from the benchmark inputs by name (image, gray, sobel_x, sobel_y).
+
+    Returns:
+    --------
+        Iterator[Tuple[str, Dict[str, Any], Callable]]: The name, parameters and a callable taking the inputs of each case.
+    """
+    for name, function in getmembers(Filters_functions, isfunction):
+        if function.__module__ != Filters_functions.__name__ or name.startswith("_"):
+            continue
+
+        defaults: Dict[str, Any] = {parameter.name: parameter.default for parameter in signature(function).parameters.values() if parameter.default is not Parameter.empty}
+        yield f"Filters_functions.{name}", defaults, build_case(f"Filters_functions.{name}", defaults)
+
+def build_case(name: str, parameters: Dict[str, Any]) -> Callable[[Dict[str, ndarray]], Any]:
+    """
+    Recreates the callable of a case from its name and parameters, such as inside another process.
+
+    Arguments:
+    ----------
+        name (str): A filter class name, or a Filters_functions function prefixed with "Filters_functions.".
+        parameters (Dict[str, Any]): The property values of the filter or the keyword arguments of the function.
+
+    Returns:
+    --------
+        Callable: A callable taking the benchmark inputs.
+    """
+    if name.startswith("Filters_functions."):
+        function: Callable = getattr(Filters_functions, name.split(".", 1)[1])
+        required: List[str] = [parameter.name for parameter in signature(function).parameters.values() if parameter.default is Parameter.empty]
+        return lambda inputs: function(*(inputs[argument] for argument in required), **parameters)
+
+    image_filter: PropertyTypeManager = create_filter(name, parameters)
+    return lambda inputs: image_filter.apply(inputs["image"])
+
+def build_inputs(width: int, height: int, seed: int) -> Dict[str, ndarray]:
+    """
+    Creates every input a benchmark case may ask for by name.
+
+    Arguments:
+    ----------
+        width (int): The width of the synthetic image.
+        height (int): The height of the synthetic image.
+        seed (int): The seed of the synthetic image.
+
+    Returns:
+    --------
+        Dict[str, ndarray]: The BGR image, its grayscale version and both Sobel derivatives.
+    """
+    image: ndarray = synthetic_image(width, height, seed)
+    gray: ndarray = cvtColor(image, COLOR_BGR2GRAY)
+
+    return {
+        "image": image,
+        "gray": gray,
+        "sobel_x": Sobel(gray, CV_64F, 1, 0),
+        "sobel_y": Sobel(gray, CV_64F, 0, 1)
+    }
+
+def status_bytes(field: str) -> int:
+    """
+    Reads a memory field of /proc/self/status, such as VmRSS or VmHWM.
+
+    Arguments:
+    ----------
+        field (str): The name of the field.
+
+    Returns:
+    --------
+        int: Its value in bytes.
+    """
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+
+    raise ValueError(f"/proc/self/status has no {field}")
+
+def case_memory(name: str, parameters: Dict[str, Any], width: int, height: int, seed: int) -> Optional[int]:
+    """
+    Runs a case once in a fresh process and returns how far its resident set rose above where it started.
+
+    Arguments:
+    ----------
+        name (str): The name of the case.
+        parameters (Dict[str, Any]): The parameters of the case.
+        width (int): The width of the synthetic image.
+        height (int): The height of the synthetic image.
+        seed (int): The seed of the synthetic image.
+
+    Returns:
+    --------
+        Optional[int]: The peak growth in bytes, None where the peak resident size cannot be reset.
+    """
+    inputs: Dict[str, ndarray] = build_inputs(width, height, seed)
+    case: Callable[[Dict[str, ndarray]], Any] = build_case(name, parameters)
+
+    try:
+        # Writing 5 resets VmHWM to the current resident size, so building the inputs is not counted
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return None
+
+    before: int = status_bytes("VmRSS")
+    case(inputs)
+    return status_bytes("VmHWM") - before
+
+def measure_memory(name: str, parameters: Dict[str, Any], width: int, height: int, seed: int) -> Optional[float]:
+    """
+    Measures the peak memory of a single call of a case, in megabytes.
+
+    The call runs in a freshly spawned process, so nothing the allocator kept from earlier calls
+    hides the memory it needs, and the peak resident size the kernel tracks catches allocations
+    too short-lived for sampling. It counts the cv::Mat buffers OpenCV allocates as well as the
+    buffers a filter keeps for later frames. Only Linux can reset that peak, elsewhere this is None.
+
+    Arguments:
+    ----------
+        name (str): The name of the case.
+        parameters (Dict[str, Any]): The parameters of the case.
+        width (int): The width of the synthetic image.
+        height (int): The height of the synthetic image.
+        seed (int): The seed of the synthetic image.
+
+    Returns:
+    --------
+        Optional[float]: The peak growth of the resident set in megabytes, None where it cannot be measured.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        peak_bytes: Optional[int] = executor.submit(case_memory, name, parameters, width, height, seed).result()
+
+    return peak_bytes / (1024 * 1024) if peak_bytes is not None else None
+
+def measure(case: Callable[[Dict[str, ndarray]], Any], inputs: Dict[str, ndarray], repeats: int, warmup: int) -> Dict[str, Any]:
+    """
+    Times a case.
+
+    Arguments:
+    ----------
+        case (Callable): The callable to benchmark.
+        inputs (Dict[str, ndarray]): The inputs it receives.
+        repeats (int): The number of timed runs.
+        warmup (int): The number of untimed runs done first.
+
+    Returns:
+    --------
+        Dict[str, Any]: The median and p95 latency and calls per second.
+    """
+    for _ in range(warmup):
+        case(inputs)
+
+    timings: List[float] = []
+
+    for _ in range(repeats):
+        started: float = perf_counter()
+        case(inputs)
+        timings.append(perf_counter() - started)
+
+    median_seconds: float = float(median(timings))
+
+    return {
+        "median_ms": median_seconds * 1000,
+        "p95_ms": float(percentile(timings, 95)) * 1000,
+        "calls_per_second": 1 / median_seconds if median_seconds else None
+    }
+
+def run(sizes: List[str], include: Optional[List[str]], steps: int, repeats: int, warmup: int, seed: int) -> Dict[str, Any]:
+    """
+    Benchmarks every selected case at every selected size.
+
+    Arguments:
+    ----------
+        sizes (List[str]): Keys of IMAGE_SIZES.
+        include (Optional[List[str]]): Only cases whose name contains one of these, case insensitive. Defaults to every case.
+        steps (int): The number of values per swept property.
+        repeats (int): The number of timed runs per case.
+        warmup (int): The number of untimed runs per case.
+        seed (int): The seed of the synthetic images.
+
+    Returns:
+    --------
+        Dict[str, Any]: The metadata of the run and one result per case and size.
+    """
+    results: List[Dict[str, Any]] = []
+    cases = [case for case in [*class_cases(steps), *function_cases()] if not include or any(name.lower() in case[0].lower() for name in include)]
+
+    for size in sizes:
+        width, height = IMAGE_SIZES[size]
+        inputs: Dict[str, ndarray] = build_inputs(width, height, seed)
+
+        for name, parameters, case in cases:
+            result: Dict[str, Any] = {"name": name, "size": size, "width": width, "height": height, "parameters": parameters}
+
+            try:
+                result.update(measure(case, inputs, repeats, warmup))
+                result["peak_memory_mb"] = measure_memory(name, parameters, width, height, seed)
+                result["megapixels_per_second"] = width * height / 1e6 * result["calls_per_second"] if result["calls_per_second"] else None
+            except Exception as error:
+                # Values inside the declared range can still be rejected by OpenCV, which is worth knowing too
+                result["error"] = f"{type(error).__name__}: {error}"
+
+            print(f"{name} {size} {parameters}: " + (result["error"] if "error" in result else f"{result['median_ms']:.2f} ms median, {result['p95_ms']:.2f} ms p95"), flush=True)
+            results.append(result)
+
+    return {
+        "metadata": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "platform": platform(),
+            "processor": processor(),
+            "cpu_count": cpu_count(),
+            "python": python_version(),
+            "numpy": numpy.__version__,
+            "opencv": cv2.__version__,
+            "repeats": repeats,
+            "warmup": warmup,
+            "seed": seed
+        },
+        "results": results
+    }
+
+def case_key(result: Dict[str, Any]) -> Tuple[str, str, str]:
+    """
+    Identifies the same case across two runs.
+
+    Arguments:
+    ----------
+        result (Dict[str, Any]): A result of either run.
+
+    Returns:
+    --------
+        Tuple[str, str, str]: The name, size and parameters of the case.
+    """
+    return result["name"], result["size"], repr(sorted(result["parameters"].items()))
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Finds cases whose median latency grew by more than the threshold, or that started failing.
+
+    Arguments:
+    ----------
+        baseline (Dict[str, Any]): The earlier run.
+        current (Dict[str, Any]): The run being checked.
+        threshold (float): The allowed relative slowdown, 0.1 allows 10 percent.
+
+    Returns:
+    --------
+        List[Dict[str, Any]]: One entry per regression with both medians and the ratio between them.
+    """
+    baseline_results: Dict[Tuple[str, str, str], Dict[str, Any]] = {case_key(result): result for result in baseline["results"]}
+    regressions: List[Dict[str, Any]] = []
+
+    for result in current["results"]:
+        before: Optional[Dict[str, Any]] = baseline_results.get(case_key(result))
+
+        if before is None or "error" in before:
+            continue
+
+        if "error" in result:
+            regressions.append({"name": result["name"], "size": result["size"], "parameters": result["parameters"], "error": result["error"]})
+            continue
+
+        ratio: float = result["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+
+        if ratio > 1 + threshold:
+            regressions.append({
+                "name": result["name"],
+                "size": result["size"],
+                "parameters": result["parameters"],
+                "baseline_median_ms": before["median_ms"],
+                "current_median_ms": result["median_ms"],
+                "ratio": ratio
+            })
+
+    return regressions
+
+def parse_arguments(arguments: Optional[List[str]] = None) -> Namespace:
+    """
+    Parses the run and compare subcommands.
+
+    Arguments:
+    ----------
+        arguments (Optional[List[str]]): The arguments to parse. Defaults to sys.argv.
+
+    Returns:
+    --------
+        Namespace: The parsed arguments.
+    """
+    parser: ArgumentParser = ArgumentParser(description="Benchmarks every filter across image sizes and property ranges.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser: ArgumentParser = commands.add_parser("run", help="benchmarks the filters and writes the results as JSON")
+    run_parser.add_argument("-o", "--output", default="benchmark.json", help="where the JSON results are written")
+    run_parser.add_argument("--sizes", nargs="+", default=list(IMAGE_SIZES), choices=list(IMAGE_SIZES), help="image sizes to benchmark")
+    run_parser.add_argument("--include", nargs="+", help="only benchmarks cases whose name contains one of these")
+    run_parser.add_argument("--steps", type=int, default=3, help="values per property between its min and max")
+    run_parser.add_argument("--repeats", type=int, default=7, help="timed runs per case")
+    run_parser.add_argument("--warmup", type=int, default=1, help="untimed runs per case")
+    run_parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic images")
+
+    compare_parser: ArgumentParser = commands.add_parser("compare", help="flags cases that got slower between two runs")
+    compare_parser.add_argument("baseline", help="JSON results of the earlier run")
+    compare_parser.add_argument("current", help="JSON results of the run being checked")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative slowdown of the median, 0.1 is 10 percent")
+
+    return parser.parse_args(arguments)
+
+if __name__ == '__main__':
+    arguments: Namespace = parse_arguments()
+
+    if arguments.command == "run":
+        report: Dict[str, Any] = run(arguments.sizes, arguments.include, arguments.steps, arguments.repeats, arguments.warmup, arguments.seed)
+
+        with open(arguments.output, "w") as output_file:
+            dump(report, output_file, indent=2)
+
+        print(f"{len(report['results'])} results written to {arguments.output}")
+
+    else:
+        with open(arguments.baseline) as baseline_file, open(arguments.current) as current_file:
+            regressions: List[Dict[str, Any]] = compare(load(baseline_file), load(current_file), arguments.threshold)
+
+        for regression in regressions:
+            if "error" in regression:
+                print(f"FAILS {regression['name']} {regression['size']} {regression['parameters']}: {regression['error']}")
+            else:
+                print(f"SLOWER {regression['name']} {regression['size']} {regression['parameters']}: {regression['baseline_median_ms']:.2f} -> {regression['current_median_ms']:.2f} ms ({regression['ratio']:.2f}x)")
+
+        print(f"{len(regressions)} regressions")
+        raise SystemExit(1 if regressions else 0)
@@ -0,0 +1,106 @@
+from typing import Dict, List, Optional, Tuple
+from numpy import ndarray, dtype, empty
+from threading import local
+
+class BufferPool:
+    """
+    Reusable arrays for a filter's intermediate and output images, handed to OpenCV calls as dst.
+
+    Frame sizes do not change in live mode, so after the first frame every call gets back the
+    arrays of the previous frame instead of allocating new ones. An array is only reallocated
+    when the shape or dtype it is asked for changes. Every thread has its own arrays, so the
+    same filter can run on several workers at once.
+
+    Output buffers are only reused when reuse_outputs is set, since a reused output is
+    overwritten once the filter produced output_count more frames on the same thread. Callers
+    that keep results around, like a queue of frames to encode, leave it off.
+    """
+    def __init__(self, reuse_outputs: bool = False, output_count: int = 3) -> None:
+        """
+        Initializes the BufferPool object.
+
+        Arguments:
+        ----------
+            reuse_outputs (bool): Whether output() hands out reused arrays instead of new ones. Defaults to False.
+            output_count (int): The number of output arrays each thread cycles through. Defaults to 3.
+        """
+        self.reuse_outputs: bool = reuse_outputs
+        self.output_count: int = output_count
+        self.allocations: int = 0
+        self.__local: local = local()
+
+    def get(self, name: str, shape: Tuple[int, ...], data_type: type|dtype) -> ndarray:
+        """
+        Returns the calling thread's intermediate array with the given name, reallocated only if its shape or dtype changed.
+
+        Arguments:
+        ----------
+            name (str): What the array is used for, each name has its own array.
+            shape (Tuple[int, ...]): The shape the array needs.
+            data_type (type|numpy.dtype): The dtype the array needs.
+
+        Returns:
+        --------
+            numpy.ndarray: The array, whose contents are left over from the previous frame.
+        """
+        buffers: Dict[str, ndarray] = self.__buffers()
+        buffer: Optional[ndarray] = buffers.get(name)
+
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != data_type:
+            buffer = buffers[name] = empty(shape, data_type)
+            self.allocations += 1
+
+        return buffer
+
+    def output(self, shape: Tuple[int, ...], data_type: type|dtype) -> ndarray:
+        """
+        Returns an array for the result of apply().
+
+        Arguments:
+        ----------
+            shape (Tuple[int, ...]): The shape of the result.
+            data_type (type|numpy.dtype): The dtype of the result.
+
+        Returns:
+        --------
+            numpy.ndarray: The next array of the calling thread's output ring, or a new array if outputs are not reused.
+        """
+        if not self.reuse_outputs:
+            return empty(shape, data_type)
+
+        outputs: List[ndarray] = self.__outputs()
+        index: int = getattr(self.__local, "output_index", 0) % self.output_count
+        self.__local.output_index = index + 1
+
+        if index >= len(outputs):
+            outputs.append(empty(0, data_type))
+
+        if outputs[index].shape != tuple(shape) or outputs[index].dtype != data_type:
+            outputs[index] = empty(shape, data_type)
+            self.allocations += 1
+
+        return outputs[index]
+
+    def clear(self) -> None:
+        """
+        Frees the arrays of every thread, they are allocated again on the next frame.
+        """
+        self.__local = local()
+
+    def __buffers(self) -> Dict[str, ndarray]:
+        """
+        The calling thread's named intermediate arrays.
+        """
+        if not hasattr(self.__local, "buffers"):
+            self.__local.buffers = {}
+
+        return self.__local.buffers
+
+    def __outputs(self) -> List[ndarray]:
+        """
+        The calling thread's ring of output arrays.
+        """
+        if not hasattr(self.__local, "outputs"):
+            self.__local.outputs = []
+
+        return self.__local.outputs
@@ -0,0 +1,236 @@
+# for type checking purposes.
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from custom_types import IMAGE_FILTERS
+
+from typing import Any, Dict, Hashable, Optional, Tuple
+from collections import OrderedDict
+from cv2 import imread, cvtColor
+from cv2.typing import MatLike
+from hashlib import blake2b
+from threading import Lock
+from weakref import ref
+from os import stat
+
+def file_key(image_path: str) -> Optional[Tuple[str, int, int]]:
+    """
+    Identifies a version of a file on disk, which changes whenever the file is edited.
+
+    Arguments:
+    ----------
+        image_path (str): The path of the file.
+
+    Returns:
+    --------
+        Optional[Tuple[str, int, int]]: The path, modification time and size, or None if the file is missing.
+    """
+    try:
+        file_stat = stat(image_path)
+    except OSError:
+        return None
+
+    return image_path, file_stat.st_mtime_ns, file_stat.st_size
+
+class ImageCache:
+    """
+    A least recently used cache of decoded images limited by the total bytes it holds.
+
+    Entries are keyed by the path together with its modification time and size, so editing
+    the file on disk makes the next load decode it again.
+    """
+    def __init__(self, byte_budget: int = 512 * 1024 * 1024) -> None:
+        """
+        Initializes the ImageCache object.
+
+        Arguments:
+        ----------
+            byte_budget (int): The maximum number of bytes of pixel data kept. Defaults to 512 MB.
+        """
+        self.byte_budget: int = byte_budget
+        self.__entries: OrderedDict[Hashable, MatLike] = OrderedDict()
+        self.__bytes: int = 0
+        self.__lock: Lock = Lock()
+
+    @property
+    def bytes(self) -> int:
+        """
+        bytes (int): The number of bytes of pixel data currently cached.
+        """
+        return self.__bytes
+
+    def load(self, image_path: str, conversion: Optional[int] = None) -> Optional[MatLike]:
+        """
+        Returns the decoded image, reading it from disk only if it is not cached yet.
+
+        The returned array is shared with every other caller and is therefore read-only.
+
+        Arguments:
+        ----------
+            image_path (str): The path of the image.
+            conversion (Optional[int]): A cv2 color conversion code applied once after decoding. Defaults to None.
+
+        Returns:
+        --------
+            Optional[MatLike]: The decoded image, or None if the file is missing or cannot be decoded.
+        """
+        version: Optional[Tuple[str, int, int]] = file_key(image_path)
+
+        if version is None:
+            return None
+
+        key: Tuple[str, int, int, Optional[int]] = (*version, conversion)
+
+        with self.__lock:
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                return self.__entries[key]
+
+        image: Optional[MatLike] = imread(image_path)
+
+        if image is None:
+            return None
+
+        if conversion is not None:
+            image = cvtColor(image, conversion)
+
+        image.setflags(write=False)
+        self.__store(key, image)
+        return image
+
+    def clear(self) -> None:
+        """
+        Removes every cached image.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__bytes = 0
+
+    def __store(self, key: Hashable, image: MatLike) -> None:
+        """
+        Adds an image and evicts the least recently used ones until the budget is met.
+        """
+        with self.__lock:
+            if key in self.__entries:
+                return
+
+            self.__entries[key] = image
+            self.__bytes += image.nbytes
+
+            # The newest image is always kept, even one bigger than the whole budget, so a still is decoded once
+            while self.__bytes > self.byte_budget and len(self.__entries) > 1:
+                _, evicted = self.__entries.popitem(last=False)
+                self.__bytes -= evicted.nbytes
+
+class FilterResultCache:
+    """
+    A least recently used cache of filter outputs keyed by a content hash of the input, the filter's
+    property values and the input format and resolution scale it runs at.
+
+    Only read-only inputs, such as the shared arrays returned by ImageCache, are cached. Their
+    content cannot change, so the hash is computed once per array and reused on every tick.
+    Writable inputs like live camera frames are always processed directly.
+    """
+    def __init__(self, max_entries: int = 16) -> None:
+        """
+        Initializes the FilterResultCache object.
+
+        Arguments:
+        ----------
+            max_entries (int): The maximum number of results kept. Defaults to 16.
+        """
+        self.max_entries: int = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self.__entries: OrderedDict[Tuple[Any, ...], MatLike] = OrderedDict()
+        self.__digests: Dict[int, Tuple[ref, bytes]] = {}
+        self.__watched: Dict[int, ref] = {}
+        self.__lock: Lock = Lock()
+
+    def apply(self, image_filter: IMAGE_FILTERS, image: MatLike) -> MatLike:
+        """
+        Returns image_filter.apply(image), reusing an earlier result when neither the input nor the properties changed.
+
+        Arguments:
+        ----------
+            image_filter (IMAGE_FILTERS): The filter instance to apply.
+            image (MatLike): The input image.
+
+        Returns:
+        --------
+            MatLike: The filtered image, read-only when it comes from the cache.
+        """
+        if image.flags.writeable:
+            return image_filter.apply(image)
+
+        self.__watch(image_filter)
+        key: Tuple[Any, ...] = (image_filter, image_filter.snapshot(), image_filter.input_format, image_filter.resolution_scale, self.__digest(image))
+
+        with self.__lock:
+            if key in self.__entries:
+                self.hits += 1
+                self.__entries.move_to_end(key)
+                return self.__entries[key]
+
+        self.misses += 1
+        result: MatLike = image_filter.apply(image)
+
+        # A reused output is overwritten by later frames, so the cache keeps its own copy
+        if image_filter.buffers.reuse_outputs:
+            result = result.copy()
+
+        result.setflags(write=False)
+
+        with self.__lock:
+            self.__entries[key] = result
+
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+
+        return result
+
+    def invalidate(self, image_filter: Any) -> None:
+        """
+        Removes every result produced by the filter, called whenever one of its setters fires.
+
+        Arguments:
+        ----------
+            image_filter (IMAGE_FILTERS): The filter whose results are outdated.
+        """
+        with self.__lock:
+            for key in [key for key in self.__entries if key[0] is image_filter]:
+                del self.__entries[key]
+
+    def __watch(self, image_filter: IMAGE_FILTERS) -> None:
+        """
+        Subscribes to the filter's setters the first time it is seen.
+        """
+        watched: Optional[ref] = self.__watched.get(id(image_filter))
+
+        if watched is not None and watched() is image_filter:
+            return
+
+        self.__watched[id(image_filter)] = ref(image_filter)
+        image_filter.add_listener(self.invalidate)
+
+    def __digest(self, image: MatLike) -> bytes:
+        """
+        Hashes the contents of a read-only image once and remembers it for as long as the array lives.
+        """
+        remembered: Optional[Tuple[ref, bytes]] = self.__digests.get(id(image))
+
+        if remembered is not None and remembered[0]() is image:
+            return remembered[1]
+
+        hasher = blake2b(digest_size=16)
+        hasher.update(str((image.shape, image.dtype.str)).encode())
+        hasher.update(image.tobytes() if not image.flags.c_contiguous else memoryview(image))
+        digest: bytes = hasher.digest()
+
+        # Drops the remembered hashes of arrays that were already garbage collected
+        self.__digests = {key: value for key, value in self.__digests.items() if value[0]() is not None}
+        self.__digests[id(image)] = (ref(image), digest)
+        return digest
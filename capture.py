@@ -0,0 +1,244 @@
+from cv2 import VideoCapture, CAP_PROP_FPS, CAP_PROP_POS_FRAMES
+from threading import Thread, Lock, Event
+from typing import Callable, Optional, Tuple
+from cv2.typing import MatLike
+from time import perf_counter
+
+from frame_store import FrameStoreCapture, FrameStoreWriter, is_frame_store
+from metrics import Instrumentation
+
+def parse_source(source: str) -> int|str:
+    """
+    Converts a command line source into what cv2.VideoCapture expects.
+
+    Arguments:
+    ----------
+        source (str): A camera index, a video file, an image sequence pattern such as frames/%04d.png or a frame store.
+
+    Returns:
+    --------
+        int|str: The camera index as an int, anything else unchanged.
+    """
+    return int(source) if source.isdigit() else source
+
+def open_capture(source: int|str) -> VideoCapture|FrameStoreCapture:
+    """
+    Opens a source for reading frames.
+
+    Arguments:
+    ----------
+        source (int|str): A camera index, video file, image sequence or frame store.
+
+    Returns:
+    --------
+        VideoCapture|FrameStoreCapture: A cv2.VideoCapture, or a FrameStoreCapture playing a frame store without decoding.
+    """
+    return FrameStoreCapture(source) if is_frame_store(source) else VideoCapture(source) # type: ignore
+
+class LatestFrame:
+    """
+    A single slot buffer that only keeps the newest frame published into it.
+
+    Publishing a frame replaces the previous one whether it was read or not, so a slow
+    consumer always receives the newest frame instead of a backlog of stale ones.
+    """
+    def __init__(self) -> None:
+        """
+        Initializes the LatestFrame object.
+        """
+        self.__lock: Lock = Lock()
+        self.__frame: Optional[MatLike] = None
+        self.__frame_id: int = 0
+        self.__last_read_id: int = 0
+        self.__dropped: int = 0
+
+    @property
+    def dropped(self) -> int:
+        """
+        dropped (int): The number of frames that were replaced before anyone read them.
+        """
+        return self.__dropped
+
+    def publish(self, frame: MatLike) -> int:
+        """
+        Replaces the frame in the slot.
+
+        Arguments:
+        ----------
+            frame (MatLike): The new frame.
+
+        Returns:
+        --------
+            int: The id given to the published frame.
+        """
+        with self.__lock:
+            if self.__frame is not None and self.__last_read_id != self.__frame_id:
+                self.__dropped += 1
+
+            self.__frame = frame
+            self.__frame_id += 1
+            return self.__frame_id
+
+    def read(self) -> Tuple[int, Optional[MatLike]]:
+        """
+        Returns the newest frame without removing it from the slot.
+
+        Returns:
+        --------
+            Tuple[int, Optional[MatLike]]: The id of the frame and the frame itself, (0, None) if nothing was published yet.
+        """
+        with self.__lock:
+            self.__last_read_id = self.__frame_id
+            return self.__frame_id, self.__frame
+
+class FrameGrabber:
+    """
+    Reads frames from a VideoCapture on a dedicated thread and publishes them into a LatestFrame slot.
+
+    Video files, image sequences and frame stores are played back at their own frame rate and
+    start over once they end, cameras are read as fast as they deliver frames. With a record_path
+    the frames are recorded too, a file only up to where it starts over, and a frame that does not
+    match the recording ends it with the error kept in recording_error.
+    """
+    def __init__(self, source: int|str = 0, on_frame: Optional[Callable[[], None]] = None, record_path: Optional[str] = None, instruments: Optional[Instrumentation] = None) -> None:
+        """
+        Initializes the FrameGrabber object.
+
+        Arguments:
+        ----------
+            source (int|str): The camera index, video file, image sequence or frame store to read. Defaults to 0.
+            on_frame (Optional[Callable[[], None]]): Called from the grabber thread after each new frame. Defaults to None.
+            record_path (Optional[str]): A frame store every captured frame is also recorded into, files only once through. Defaults to None.
+            instruments (Optional[Instrumentation]): Times every read of the capture as "capture read". Defaults to None.
+        """
+        self.source: int|str = source
+        self.on_frame: Optional[Callable[[], None]] = on_frame
+        self.record_path: Optional[str] = record_path
+        self.instruments: Instrumentation = instruments or Instrumentation()
+        self.latest: LatestFrame = LatestFrame()
+        self.__capture: Optional[VideoCapture|FrameStoreCapture] = None
+        self.__recorder: Optional[FrameStoreWriter] = None
+        self.__recording: bool = False
+        self.recording_error: Optional[ValueError] = None
+        self.__stop_event: Event = Event()
+        self.__thread: Optional[Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """
+        running (bool): Whether the grabber thread is alive.
+        """
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self) -> 'FrameGrabber':
+        """
+        Opens the capture and starts the grabber thread.
+
+        Returns:
+        --------
+            FrameGrabber: The grabber itself so it can be chained on construction.
+        """
+        if self.running:
+            return self
+
+        self.__stop_event.clear()
+        self.__thread = Thread(target=self.__run, name="FrameGrabber", daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self, timeout: float = 1.0) -> None:
+        """
+        Stops the grabber thread and releases the capture.
+
+        Arguments:
+        ----------
+            timeout (float): Seconds to wait for the thread to finish. Defaults to 1.0.
+        """
+        self.__stop_event.set()
+
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            self.__thread = None
+
+    def read(self) -> Tuple[int, Optional[MatLike]]:
+        """
+        Returns the newest captured frame.
+
+        Returns:
+        --------
+            Tuple[int, Optional[MatLike]]: The id of the frame and the frame itself.
+        """
+        return self.latest.read()
+
+    def __run(self) -> None:
+        """
+        The body of the grabber thread.
+        """
+        # VideoCapture is opened here so a slow camera does not block whoever started the grabber
+        self.__capture = open_capture(self.source)
+        is_file: bool = isinstance(self.source, str)
+        frame_interval: float = 0.0
+
+        if is_file:
+            file_fps: float = self.__capture.get(CAP_PROP_FPS)
+            frame_interval = 1 / file_fps if file_fps > 0 else 1 / 30
+
+        next_frame_time: float = perf_counter()
+        self.__recording = self.record_path is not None
+
+        try:
+            while not self.__stop_event.is_set():
+                with self.instruments.measure("capture read"):
+                    frame_returned, frame = self.__capture.read()
+
+                if not frame_returned and is_file and self.__capture.get(CAP_PROP_POS_FRAMES) > 0:
+                    # Starts the file over once it ended, the recording already holds every frame of it
+                    self.__capture.set(CAP_PROP_POS_FRAMES, 0)
+                    self.__stop_recording()
+                    continue
+
+                if not frame_returned:
+                    # Avoids spinning while the device is unavailable
+                    self.__stop_event.wait(0.01)
+                    continue
+
+                if is_file:
+                    next_frame_time = max(next_frame_time + frame_interval, perf_counter())
+                    self.__stop_event.wait(max(0.0, next_frame_time - perf_counter()))
+
+                self.latest.publish(frame)
+
+                if self.__recording:
+                    self.__record(frame)
+
+                if self.on_frame is not None:
+                    self.on_frame()
+        finally:
+            self.__capture.release()
+            self.__stop_recording()
+
+    def __record(self, frame: MatLike) -> None:
+        """
+        Appends a frame to the recording, which takes the shape of the first frame.
+
+        A frame of another shape, such as after a camera changed its resolution, ends the recording
+        and is kept in recording_error instead of stopping the grabber.
+        """
+        if self.__recorder is None:
+            self.__recorder = FrameStoreWriter(self.record_path, frame.shape, frame.dtype, self.__capture.get(CAP_PROP_FPS) or 30.0) # type: ignore
+
+        try:
+            self.__recorder.append(frame)
+        except ValueError as error:
+            self.recording_error = error
+            self.__stop_recording()
+
+    def __stop_recording(self) -> None:
+        """
+        Closes the recording, no frame is recorded after this.
+        """
+        self.__recording = False
+
+        if self.__recorder is not None:
+            self.__recorder.close()
+            self.__recorder = None
@@ -0,0 +1,83 @@
+# for type checking purposes.
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from Filters import PropertyTypeManager
+
+from cv2 import cvtColor, COLOR_BGR2RGB, COLOR_RGB2BGR, COLOR_BGR2GRAY, COLOR_RGB2GRAY, COLOR_GRAY2BGR, COLOR_GRAY2RGB
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+from cv2.typing import MatLike
+
+BGR: str = "BGR"
+RGB: str = "RGB"
+GRAY: str = "GRAY"
+
+# PIL shows both without converting, so the display never needs a BGR image
+DISPLAY_FORMATS: Tuple[str, ...] = (RGB, GRAY)
+
+CONVERSION_CODES: Dict[Tuple[str, str], int] = {
+    (BGR, RGB): COLOR_BGR2RGB,
+    (RGB, BGR): COLOR_RGB2BGR,
+    (BGR, GRAY): COLOR_BGR2GRAY,
+    (RGB, GRAY): COLOR_RGB2GRAY,
+    (GRAY, BGR): COLOR_GRAY2BGR,
+    (GRAY, RGB): COLOR_GRAY2RGB
+}
+
+class ColorPlan(NamedTuple):
+    """
+    The formats a filter is run with and the number of full frame conversions that costs.
+    """
+    input_format: str
+    output_format: str
+    conversions: int
+
+def convert(image: MatLike, source_format: str, target_format: str, dst: Optional[MatLike] = None) -> MatLike:
+    """
+    Converts an image between two formats, without touching it when they are the same.
+
+    Arguments:
+    ----------
+        image (MatLike): The image to convert.
+        source_format (str): The format of the image, BGR, RGB or GRAY.
+        target_format (str): The format wanted.
+        dst (Optional[MatLike]): An array the conversion is written into. Defaults to None.
+
+    Returns:
+    --------
+        MatLike: The converted image, or the image itself if no conversion was needed.
+    """
+    if source_format == target_format:
+        return image
+
+    return cvtColor(image, CONVERSION_CODES[(source_format, target_format)], dst) # type: ignore
+
+def plan(image_filter: PropertyTypeManager, available_formats: Sequence[str], target_formats: Sequence[str] = DISPLAY_FORMATS) -> ColorPlan:
+    """
+    Picks the input format of a filter that needs the fewest conversions before and after it.
+
+    Ties go to the format the filter lists first in accepted_formats.
+
+    Arguments:
+    ----------
+        image_filter (PropertyTypeManager): The filter, which declares the formats it accepts and produces.
+        available_formats (Sequence[str]): The formats the frame already exists in.
+        target_formats (Sequence[str]): The formats the result may be used in as is. Defaults to DISPLAY_FORMATS.
+
+    Returns:
+    --------
+        ColorPlan: The chosen input format, the output format it produces and the conversions needed.
+    """
+    best: Optional[ColorPlan] = None
+
+    for input_format in image_filter.accepted_formats:
+        output_format: str = image_filter.output_format_for(input_format)
+        conversions: int = (input_format not in available_formats) + (output_format not in target_formats)
+
+        if best is None or conversions < best.conversions:
+            best = ColorPlan(input_format, output_format, conversions)
+
+    return best # type: ignore
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List, Optional
+from argparse import ArgumentParser
+
+from Filters import PropertyTypeManager, create_filter
+
+def parse_properties(assignments: List[str]) -> Dict[str, str]:
+    """
+    Parses name=value pairs given through --set.
+
+    Arguments:
+    ----------
+        assignments (List[str]): The name=value pairs.
+
+    Returns:
+    --------
+        Dict[str, str]: The value of each property, converted later by its setter.
+
+    Raises:
+    -------
+        ValueError: If an assignment has no equals sign.
+    """
+    properties: Dict[str, str] = {}
+
+    for assignment in assignments:
+        if "=" not in assignment:
+            raise ValueError(f"Expected name=value, got {assignment}")
+
+        name, value = assignment.split("=", 1)
+        properties[name.strip()] = value.strip()
+
+    return properties
+
+def filter_from_arguments(parser: ArgumentParser, filter_name: str, assignments: List[str], properties: Optional[Dict[str, Any]] = None) -> PropertyTypeManager:
+    """
+    Creates the filter named on a command line, reporting a bad name, property or value as a usage error.
+
+    Arguments:
+    ----------
+        parser (ArgumentParser): The parser whose usage is printed on errors.
+        filter_name (str): The value of --filter.
+        assignments (List[str]): The name=value pairs of --set.
+        properties (Optional[Dict[str, Any]]): Property values that --set overrides, such as the ones of a config file. Defaults to None.
+
+    Returns:
+    --------
+        PropertyTypeManager: The configured filter instance, the program exits if it cannot be created.
+    """
+    try:
+        return create_filter(filter_name, {**(properties or {}), **parse_properties(assignments)})
+    except (ValueError, TypeError) as error:
+        parser.error(str(error))
@@ -17,4 +17,22 @@ RIGHT_PADDING_ONLY: Tuple[Literal[0], int] = (0, DEFAULT_PADDING)
 
 TOP_PADDING_ONLY: Tuple[int, Literal[0]] = (DEFAULT_PADDING, 0)
 LEFT_PADDING_ONLY: Tuple[int, Literal[0]] = (DEFAULT_PADDING, 0)
-DEFAULT_CANVAS_SIZE: Tuple[Literal[637], Literal[480]] = (637, 480)
\ No newline at end of file
+DEFAULT_CANVAS_SIZE: Tuple[Literal[637], Literal[480]] = (637, 480)
+MAIN_TILE_SIZE: Tuple[int, int] = (365, 280)
+TILE_SIZE: Tuple[int, int] = (180, 140)
+
+# Milliseconds between redraws, 16 ms matches a 60 Hz display
+DISPLAY_REFRESH_INTERVAL: int = 16
+IDLE_REFRESH_INTERVAL: int = 100
+
+# Milliseconds a property has to stay unchanged before the preview is rendered at full detail
+REFINE_DELAY: int = 150
+# Halvings of the preview while a property is changing, 2 is a quarter of the size
+COARSE_PYRAMID_LEVELS: int = 2
+
+# Milliseconds between refreshes of the performance overlay
+OVERLAY_REFRESH_INTERVAL: int = 500
+
+# Seconds profiled by the Profile button, and where profiles are written
+PROFILE_DURATION: float = 5.0
+PROFILE_DIRECTORY: str = "profiles"
@@ -0,0 +1,132 @@
+from cv2 import resize, pyrDown, INTER_AREA, INTER_LINEAR
+from customtkinter import CTkLabel
+from typing import Optional, Sequence, Tuple
+from PIL import Image, ImageTk
+from cv2.typing import MatLike
+
+from color_spaces import RGB, GRAY, convert
+from metrics import Instrumentation
+from buffers import BufferPool
+
+def preview_scale(shape: Sequence[int], size: Tuple[int, int]) -> float:
+    """
+    Finds how much an image can be shrunk while still covering a canvas at full detail.
+
+    Arguments:
+    ----------
+        shape (Sequence[int]): The shape of the image.
+        size (Tuple[int, int]): The width and height of the canvas.
+
+    Returns:
+    --------
+        float: The scale of the preview, 1.0 when the image is not bigger than the canvas.
+    """
+    return min(1.0, max(size[0] / shape[1], size[1] / shape[0]))
+
+def downsample(image: MatLike, scale: float) -> MatLike:
+    """
+    Shrinks an image by a scale from preview_scale().
+
+    Arguments:
+    ----------
+        image (MatLike): The full size image.
+        scale (float): The scale of the result.
+
+    Returns:
+    --------
+        MatLike: A new shrunk image, or the image itself if the scale is 1.0 or more.
+    """
+    if scale >= 1.0:
+        return image
+
+    size: Tuple[int, int] = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+    return resize(image, size, interpolation=INTER_AREA)
+
+def pyramid_down(image: MatLike, levels: int) -> MatLike:
+    """
+    Halves an image a number of times with Gaussian pyramid steps.
+
+    Arguments:
+    ----------
+        image (MatLike): The image to shrink.
+        levels (int): The number of halvings.
+
+    Returns:
+    --------
+        MatLike: The pyramid level, or the image itself for 0 levels.
+    """
+    for _ in range(levels):
+        image = pyrDown(image)
+
+    return image
+
+class CanvasDisplay:
+    """
+    Shows images on a label through one persistent PhotoImage whose pixels are replaced in place.
+
+    Building a PIL image and a CTkImage per frame makes CustomTkinter rescale and recreate the
+    widget's image every time. Here each frame is resized once with OpenCV into a buffer of
+    the canvas size, which is then pasted into the same PhotoImage, so the widget itself never
+    changes. Unlike CTkImage the size is not scaled on HighDPI displays.
+    """
+    def __init__(self, label: CTkLabel, size: Tuple[int, int], instruments: Optional[Instrumentation] = None) -> None:
+        """
+        Initializes the CanvasDisplay object.
+
+        Arguments:
+        ----------
+            label (CTkLabel): The label the images are shown on.
+            size (Tuple[int, int]): The width and height images are shown at.
+            instruments (Optional[Instrumentation]): Times the resize, conversion and paste of every frame. Defaults to None.
+        """
+        self.label: CTkLabel = label
+        self.size: Tuple[int, int] = size
+        self.instruments: Instrumentation = instruments or Instrumentation()
+        self.image: Optional[MatLike] = None
+        self.image_format: str = RGB
+        self.frames: int = 0
+        self.__buffers: BufferPool = BufferPool()
+        # Created with the label as master since the All view runs in its own Tk interpreter
+        self.__photo: ImageTk.PhotoImage = ImageTk.PhotoImage("RGB", size, master=label)
+        self.label.configure(image=self.__photo)
+
+    def show(self, image: MatLike, image_format: str = RGB) -> None:
+        """
+        Replaces the pixels of the canvas with the image.
+
+        Arguments:
+        ----------
+            image (MatLike): The full size image.
+            image_format (str): RGB, GRAY or BGR, BGR costs one extra conversion. Defaults to RGB.
+        """
+        width, height = self.size
+        shrinking: bool = image.shape[1] > width or image.shape[0] > height
+
+        with self.instruments.measure("display resize"):
+            resized: MatLike = resize(image, self.size, self.__buffers.get("resized", (height, width, *image.shape[2:]), image.dtype), interpolation=INTER_AREA if shrinking else INTER_LINEAR)
+
+        if image_format not in (RGB, GRAY):
+            with self.instruments.measure("display conversion"):
+                resized = convert(resized, image_format, RGB, self.__buffers.get("converted", resized.shape, resized.dtype))
+
+        # frombuffer wraps the buffer without copying, paste then converts gray to RGB by itself
+        mode: str = "L" if resized.ndim == 2 else "RGB"
+
+        # Takes the place of building a CTkImage and configure(image=...), the label keeps its image
+        with self.instruments.measure("display paste"):
+            self.__photo.paste(Image.frombuffer(mode, self.size, resized, "raw", mode, 0, 1)) # type: ignore
+
+        # Kept so other displays can show it too
+        self.image, self.image_format = image, image_format
+        self.frames += 1
+
+    def copy_from(self, other: 'CanvasDisplay') -> None:
+        """
+        Shows whatever another display shows.
+
+        Arguments:
+        ----------
+            other (CanvasDisplay): The display to copy.
+        """
+        if other.image is not None:
+            self.show(other.image, other.image_format)
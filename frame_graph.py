@@ -0,0 +1,190 @@
+from Filters_functions import adjust_gray_level, sobel_gradients, gradient_magnitude, threshold_gray
+from cv2 import blur, Canny, CV_32F
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from cv2.typing import MatLike
+from kmeans_engine import KMeansEngine
+from color_spaces import BGR, RGB, GRAY, convert
+from metrics import Instrumentation
+from threading import Lock
+
+class FrameGraph:
+    """
+    A directed acyclic graph of named per-frame computations.
+
+    Every node names the nodes it depends on. Evaluating a set of outputs computes each node
+    they need exactly once, so intermediates like the grayscale frame are shared by every
+    output that uses them, even when the outputs are requested from several threads.
+    """
+    def __init__(self, input_name: str = "frame") -> None:
+        """
+        Initializes the FrameGraph object.
+
+        Arguments:
+        ----------
+            input_name (str): The name under which the evaluated frame is available to nodes. Defaults to "frame".
+        """
+        self.input_name: str = input_name
+        # Times every node as "node" and its name while enabled
+        self.instruments: Instrumentation = Instrumentation()
+        self.nodes: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+
+    def add_node(self, name: str, function: Callable[..., Any], *inputs: str) -> 'FrameGraph':
+        """
+        Adds a node computed by calling the function with the values of its inputs.
+
+        Arguments:
+        ----------
+            name (str): The name of the node.
+            function (Callable[..., Any]): Computes the node from its inputs, in the order given.
+            *inputs (str): The names of the nodes the function receives.
+
+        Returns:
+        --------
+            FrameGraph: The graph itself so nodes can be chained.
+
+        Raises:
+        -------
+            ValueError: If the name is already used or an input does not exist yet.
+        """
+        if name == self.input_name or name in self.nodes:
+            raise ValueError(f"Node {name} already exists")
+
+        for input_name in inputs:
+            if input_name != self.input_name and input_name not in self.nodes:
+                raise ValueError(f"Node {name} depends on unknown node {input_name}")
+
+        # Inputs must already exist, which also keeps the graph free of cycles
+        self.nodes[name] = (function, inputs)
+        return self
+
+    def evaluate(self, frame: MatLike, outputs: Iterable[str]) -> Dict[str, Any]:
+        """
+        Computes the requested outputs for a frame, evaluating every shared node once.
+
+        Arguments:
+        ----------
+            frame (MatLike): The input frame.
+            outputs (Iterable[str]): The names of the nodes to return.
+
+        Returns:
+        --------
+            Dict[str, Any]: The value of each requested node.
+        """
+        values: FrameValues = self.bind(frame)
+        return {output: values.get(output) for output in outputs}
+
+    def bind(self, frame: MatLike) -> 'FrameValues':
+        """
+        Creates the lazily computed node values of a frame.
+
+        Arguments:
+        ----------
+            frame (MatLike): The input frame.
+
+        Returns:
+        --------
+            FrameValues: The node values of the frame, each computed on first use.
+        """
+        return FrameValues(self, frame)
+
+    def dependencies(self, name: str) -> List[str]:
+        """
+        Lists the nodes needed to compute a node, each one after the nodes it depends on.
+
+        Arguments:
+        ----------
+            name (str): The name of the node.
+
+        Returns:
+        --------
+            List[str]: The node and all of its dependencies in evaluation order, without the input.
+        """
+        if name == self.input_name:
+            return []
+
+        order: List[str] = []
+
+        for input_name in self.nodes[name][1]:
+            for dependency in self.dependencies(input_name):
+                if dependency not in order:
+                    order.append(dependency)
+
+        order.append(name)
+        return order
+
+class FrameValues:
+    """
+    The node values of a FrameGraph for one frame, each computed the first time it is requested.
+    """
+    def __init__(self, graph: FrameGraph, frame: MatLike) -> None:
+        """
+        Initializes the FrameValues object.
+
+        Arguments:
+        ----------
+            graph (FrameGraph): The graph whose nodes are evaluated.
+            frame (MatLike): The input frame.
+        """
+        self.graph: FrameGraph = graph
+        self.__values: Dict[str, Any] = {graph.input_name: frame}
+        self.__locks: Dict[str, Lock] = {name: Lock() for name in graph.nodes}
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the value of a node, computing it and its dependencies if needed.
+
+        Safe to call from several threads, a node being computed by one thread is awaited by the others.
+
+        Arguments:
+        ----------
+            name (str): The name of the node.
+
+        Returns:
+        --------
+            Any: The value of the node.
+        """
+        if name in self.__values:
+            return self.__values[name]
+
+        # Locks are always taken from a node towards its inputs, which cannot deadlock in an acyclic graph
+        with self.__locks[name]:
+            if name not in self.__values:
+                function, inputs = self.graph.nodes[name]
+                # Inputs are computed first so the node's time does not include theirs
+                arguments: List[Any] = [self.get(input_name) for input_name in inputs]
+
+                with self.graph.instruments.measure(f"node {name}"):
+                    self.__values[name] = function(*arguments)
+
+        return self.__values[name]
+
+def joined_filters_graph(resolution_scale: float = 1.0) -> FrameGraph:
+    """
+    Builds the graph behind the "All" view from a BGR camera frame.
+
+    Every output is ready for display as either an RGB or a single channel image, so nothing
+    is expanded back to BGR only to be converted again.
+
+    Arguments:
+    ----------
+        resolution_scale (float): The size of the frames relative to the camera, which scales the blur kernel. Defaults to 1.0.
+
+    Returns:
+    --------
+        FrameGraph: The graph with rgb, grayscale, box_blur, sobel, canny, global_segmentation and kmeans outputs.
+    """
+    graph: FrameGraph = FrameGraph()
+    graph.add_node("rgb", lambda frame: convert(frame, BGR, RGB), "frame")
+    graph.add_node("gray", lambda frame: convert(frame, BGR, GRAY), "frame")
+    # 32 bit derivatives are plenty for display and half the memory of the 64 bit default
+    graph.add_node("gradients", lambda gray: sobel_gradients(gray, depth=CV_32F), "gray")
+
+    graph.add_node("grayscale", adjust_gray_level, "gray")
+    blur_size: int = max(1, round(50 * resolution_scale))
+    graph.add_node("box_blur", lambda rgb: blur(rgb, (blur_size, blur_size)), "rgb")
+    graph.add_node("sobel", lambda gradients: gradient_magnitude(*gradients), "gradients")
+    graph.add_node("canny", lambda gray: Canny(gray, 50, 150), "gray")
+    graph.add_node("global_segmentation", threshold_gray, "gray")
+    # A single tile evaluates it per frame, so the engine's warm start carries over between frames
+    graph.add_node("kmeans", KMeansEngine(2).segment, "rgb")
+    return graph
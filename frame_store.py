@@ -0,0 +1,376 @@
+from numpy import ndarray, dtype, memmap, empty, ascontiguousarray
+from cv2 import VideoCapture, CAP_PROP_FPS, CAP_PROP_POS_FRAMES, CAP_PROP_FRAME_COUNT
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+from argparse import ArgumentParser, Namespace
+from cv2.typing import MatLike
+from time import perf_counter
+from struct import Struct
+from os import path
+
+from Filters import PropertyTypeManager, FILTER_CLASSES
+from command_line import filter_from_arguments
+
+FRAME_STORE_EXTENSION: str = ".frames"
+MAGIC: bytes = b"FRAMESTR"
+VERSION: int = 1
+
+# Magic, version, numpy dtype string, height, width, channels (0 for single channel frames) and fps
+HEADER: Struct = Struct("<8sI8sIIId")
+# Frames start at a 64 byte boundary so every frame view stays aligned
+HEADER_SIZE: int = 64
+
+def is_frame_store(source: int|str) -> bool:
+    """
+    Tells whether a source names a frame store rather than something cv2.VideoCapture opens.
+
+    Arguments:
+    ----------
+        source (int|str): A camera index, video file, image sequence or frame store.
+
+    Returns:
+    --------
+        bool: True for paths ending with FRAME_STORE_EXTENSION.
+    """
+    return isinstance(source, str) and source.lower().endswith(FRAME_STORE_EXTENSION)
+
+class FrameStoreWriter:
+    """
+    Appends frames of a fixed shape and type to a raw frame store file.
+
+    The file is a fixed size header followed by the frames back to back, so a FrameStore can
+    memory-map it as one array. The frame count is not stored, it follows from the file size,
+    which keeps a recording readable even if it was cut short.
+    """
+    def __init__(self, file_path: str, shape: Tuple[int, ...], data_type: Any, fps: float = 30.0) -> None:
+        """
+        Initializes the FrameStoreWriter object and writes the header.
+
+        Arguments:
+        ----------
+            file_path (str): The file to create, replaced if it exists.
+            shape (Tuple[int, ...]): The shape of every frame, (height, width) or (height, width, channels).
+            data_type (Any): The numpy type of every frame.
+            fps (float): The frame rate the frames are played back at. Defaults to 30.0.
+
+        Raises:
+        -------
+            ValueError: If the shape is not the one of an image.
+        """
+        if len(shape) not in (2, 3):
+            raise ValueError(f"Expected a (height, width) or (height, width, channels) shape, got {shape}")
+
+        self.file_path: str = file_path
+        self.shape: Tuple[int, ...] = tuple(shape)
+        self.data_type: dtype = dtype(data_type)
+        self.frames: int = 0
+        self.__file: BinaryIO = open(file_path, "wb")
+
+        channels: int = shape[2] if len(shape) == 3 else 0
+        header: bytes = HEADER.pack(MAGIC, VERSION, self.data_type.str.encode("ascii"), shape[0], shape[1], channels, fps)
+        self.__file.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def append(self, frame: MatLike) -> None:
+        """
+        Writes a frame after the previous ones.
+
+        Arguments:
+        ----------
+            frame (MatLike): The frame, which must match the shape and type of the store.
+
+        Raises:
+        -------
+            ValueError: If the frame does not match the store.
+        """
+        if frame.shape != self.shape or frame.dtype != self.data_type:
+            raise ValueError(f"Expected a {self.shape} {self.data_type} frame, got a {frame.shape} {frame.dtype} one")
+
+        # Writes straight from the frame's memory, only non-contiguous views are copied first
+        self.__file.write(memoryview(ascontiguousarray(frame)))
+        self.frames += 1
+
+    def close(self) -> None:
+        """
+        Flushes and closes the file.
+        """
+        self.__file.close()
+
+    def __enter__(self) -> 'FrameStoreWriter':
+        """
+        Returns the writer itself, so it can be used in a with statement.
+
+        Returns:
+        --------
+            FrameStoreWriter: This writer.
+        """
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        """
+        Closes the file when the with statement ends, even on errors.
+        """
+        self.close()
+
+class FrameStore:
+    """
+    A recorded session memory-mapped as a read-only (frames, height, width[, channels]) array.
+
+    Indexing returns views of the mapping instead of copies, so re-running filters over a
+    recording reads the frames at disk bandwidth, or from the page cache once they were read.
+    """
+    def __init__(self, file_path: str) -> None:
+        """
+        Initializes the FrameStore object and maps the file.
+
+        Arguments:
+        ----------
+            file_path (str): A file written by FrameStoreWriter.
+
+        Raises:
+        -------
+            ValueError: If the file is not a frame store.
+        """
+        with open(file_path, "rb") as store_file:
+            header: bytes = store_file.read(HEADER_SIZE)
+
+        if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{file_path} is not a frame store")
+
+        _, version, data_type, height, width, channels, fps = HEADER.unpack_from(header)
+
+        if version != VERSION:
+            raise ValueError(f"{file_path} is a version {version} frame store, expected version {VERSION}")
+
+        self.file_path: str = file_path
+        self.fps: float = fps
+        self.shape: Tuple[int, ...] = (height, width, channels) if channels else (height, width)
+        self.data_type: dtype = dtype(data_type.rstrip(b"\0").decode("ascii"))
+
+        frame_bytes: int = self.data_type.itemsize * height * width * max(channels, 1)
+        # A partly written last frame is left out
+        count: int = (path.getsize(file_path) - HEADER_SIZE) // frame_bytes if frame_bytes else 0
+
+        # numpy cannot map an empty range
+        self.frames: ndarray = memmap(file_path, self.data_type, "r", HEADER_SIZE, (count, *self.shape)) if count else empty((0, *self.shape), self.data_type)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of complete frames in the store.
+
+        Returns:
+        --------
+            int: The number of frames.
+        """
+        return len(self.frames)
+
+    def __getitem__(self, index: int) -> ndarray:
+        """
+        Returns a frame as a read-only view of the mapping, without copying it.
+
+        Arguments:
+        ----------
+            index (int): The position of the frame.
+
+        Returns:
+        --------
+            numpy.ndarray: The frame.
+        """
+        return self.frames[index].view(ndarray)
+
+    def __iter__(self) -> Iterator[ndarray]:
+        """
+        Returns every frame in recording order, each as a view like __getitem__.
+
+        Returns:
+        --------
+            Iterator[numpy.ndarray]: The frames.
+        """
+        for index in range(len(self)):
+            yield self[index]
+
+class FrameStoreCapture:
+    """
+    Plays a FrameStore back through the part of the cv2.VideoCapture interface the app uses.
+    """
+    def __init__(self, file_path: str) -> None:
+        """
+        Initializes the FrameStoreCapture object.
+
+        Arguments:
+        ----------
+            file_path (str): The frame store to play.
+        """
+        self.store: Optional[FrameStore] = FrameStore(file_path)
+        self.position: int = 0
+
+    def isOpened(self) -> bool:
+        """
+        Tells whether the store can still be read, like cv2.VideoCapture.isOpened().
+
+        Returns:
+        --------
+            bool: False once release() was called.
+        """
+        return self.store is not None
+
+    def read(self) -> Tuple[bool, Optional[MatLike]]:
+        """
+        Returns the next frame as a zero-copy view, like cv2.VideoCapture.read().
+
+        Returns:
+        --------
+            Tuple[bool, Optional[MatLike]]: True and the frame, or False and None after the last one.
+        """
+        if self.store is None or self.position >= len(self.store):
+            return False, None
+
+        frame: ndarray = self.store[self.position]
+        self.position += 1
+        return True, frame
+
+    def get(self, property_id: int) -> float:
+        """
+        Reads a capture property, like cv2.VideoCapture.get().
+
+        Arguments:
+        ----------
+            property_id (int): CAP_PROP_FPS, CAP_PROP_POS_FRAMES or CAP_PROP_FRAME_COUNT.
+
+        Returns:
+        --------
+            float: The value, 0.0 for other properties or once released.
+        """
+        if self.store is None:
+            return 0.0
+
+        values: Dict[int, float] = {
+            CAP_PROP_FPS: self.store.fps,
+            CAP_PROP_POS_FRAMES: self.position,
+            CAP_PROP_FRAME_COUNT: len(self.store)
+        }
+
+        return float(values.get(property_id, 0.0))
+
+    def set(self, property_id: int, value: float) -> bool:
+        """
+        Seeks to a frame, like cv2.VideoCapture.set() with CAP_PROP_POS_FRAMES.
+
+        Arguments:
+        ----------
+            property_id (int): Only CAP_PROP_POS_FRAMES is supported.
+            value (float): The index of the next frame read, clamped to the recording.
+
+        Returns:
+        --------
+            bool: Whether the property was set.
+        """
+        if self.store is None or property_id != CAP_PROP_POS_FRAMES:
+            return False
+
+        self.position = min(max(int(value), 0), len(self.store))
+        return True
+
+    def release(self) -> None:
+        """
+        Drops the store, whose mapping is closed once no frame view refers to it anymore.
+        """
+        self.store = None
+
+def record(source: int|str, file_path: str, limit: Optional[int] = None) -> int:
+    """
+    Records the frames of a camera, video file or image sequence into a frame store.
+
+    Arguments:
+    ----------
+        source (int|str): What cv2.VideoCapture should read.
+        file_path (str): The frame store to create.
+        limit (Optional[int]): Stops after this many frames, cameras need it or Ctrl+C. Defaults to None.
+
+    Returns:
+    --------
+        int: The number of frames recorded.
+
+    Raises:
+    -------
+        ValueError: If the source cannot be opened or yields no frame.
+    """
+    capture: VideoCapture = VideoCapture(source)
+
+    if not capture.isOpened():
+        raise ValueError(f"Could not open {source}")
+
+    writer: Optional[FrameStoreWriter] = None
+
+    try:
+        while limit is None or writer is None or writer.frames < limit:
+            frame_returned, frame = capture.read()
+
+            if not frame_returned:
+                break
+
+            # The first frame decides the shape of the store
+            if writer is None:
+                writer = FrameStoreWriter(file_path, frame.shape, frame.dtype, capture.get(CAP_PROP_FPS) or 30.0)
+
+            writer.append(frame)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.release()
+
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError(f"{source} did not yield any frame")
+
+    return writer.frames
+
+def replay(store: FrameStore, image_filter: PropertyTypeManager, passes: int = 1) -> float:
+    """
+    Applies a filter to every recorded frame, the same footage every pass.
+
+    Arguments:
+    ----------
+        store (FrameStore): The recording.
+        image_filter (PropertyTypeManager): The filter to run.
+        passes (int): How many times the whole recording is filtered. Defaults to 1.
+
+    Returns:
+    --------
+        float: The frames filtered per second.
+    """
+    started: float = perf_counter()
+
+    for _ in range(passes):
+        for frame in store:
+            image_filter.apply(frame)
+
+    elapsed: float = perf_counter() - started
+    return len(store) * passes / elapsed if elapsed else 0.0
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description="Records sessions into memory-mapped frame stores and re-runs filters over them without a camera.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser: ArgumentParser = commands.add_parser("record", help="records a camera, video file or image sequence")
+    record_parser.add_argument("source", help="camera index, video file or image sequence such as frames/%%04d.png")
+    record_parser.add_argument("output", help=f"frame store to create, usually ending with {FRAME_STORE_EXTENSION}")
+    record_parser.add_argument("-n", "--frames", type=int, help="stops after this many frames")
+
+    replay_parser: ArgumentParser = commands.add_parser("replay", help="filters every frame of a frame store and reports the throughput")
+    replay_parser.add_argument("store", help="frame store to read")
+    replay_parser.add_argument("-f", "--filter", required=True, help=f"one of {', '.join(FILTER_CLASSES)}, or several joined by commas to chain them")
+    replay_parser.add_argument("-s", "--set", action="append", default=[], metavar="NAME=VALUE", help="sets a filter property, can be repeated")
+    replay_parser.add_argument("-p", "--passes", type=int, default=1, help="how many times the recording is filtered")
+    arguments: Namespace = parser.parse_args()
+
+    # Imported here since capture itself opens frame stores through this module
+    from capture import parse_source
+
+    if arguments.command == "record":
+        print(f"{record(parse_source(arguments.source), arguments.output, arguments.frames)} frames recorded to {arguments.output}")
+    else:
+        image_filter: PropertyTypeManager = filter_from_arguments(parser, arguments.filter, arguments.set)
+        frame_store: FrameStore = FrameStore(arguments.store)
+        fps: float = replay(frame_store, image_filter, arguments.passes)
+        print(f"{len(frame_store)} frames of {frame_store.shape}, {arguments.passes} passes, {fps:.1f} fps")
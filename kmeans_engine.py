@@ -0,0 +1,388 @@
+from cv2 import kmeans, split, cvtColor, TERM_CRITERIA_EPS, TERM_CRITERIA_MAX_ITER, KMEANS_PP_CENTERS, COLOR_BGRA2BGR
+from numpy import ndarray, float32, float64, uint8, uint16, uint32, intp, empty, zeros, argmin, einsum, clip, rint, random, bincount, arange, meshgrid, stack, take, sqrt, copyto, matmul, right_shift, left_shift, bitwise_or
+from typing import List, Optional, Set, Tuple
+from time import perf_counter
+from threading import Lock
+from cv2.typing import MatLike
+
+from buffers import BufferPool
+
+# Fitting stops once no center moved further than this, in color levels
+CONVERGENCE_EPSILON: float = 0.5
+
+# The lookup table is rebuilt once a center moved further than this fraction of a color cube cell
+LUT_TOLERANCE: float = 0.25
+
+class KMeansEngine:
+    """
+    K-means color segmentation tuned for live video.
+
+    Centers are fitted on a random subsample of the pixels instead of every pixel. Each frame
+    starts from the previous frame's centers and refines them with a few cheap iterations, so
+    colors stay stable from frame to frame. A full refit only happens when the scene drifted,
+    measured by how much worse the previous centers fit the new sample. Every pixel is then
+    assigned to its nearest center in vectorized chunks.
+
+    With a time budget the centers are instead updated with mini-batches until they stop moving
+    or the budget for the frame is spent, and the best centers seen so far are used. This bounds
+    the fitting time of every frame regardless of the number of clusters.
+
+    Three channel uint8 images are assigned through a lookup table from a quantized color cube
+    to the nearest center, rebuilt only when the centers change, so each pixel costs a single
+    table lookup. Colors within one cube cell share a cluster, which can only differ from the
+    exact assignment for colors right on the border between two clusters.
+
+    The full size temporaries of painting a frame, the color cube cells or the labels and
+    distances of exact assignment, come from a BufferPool and are reused across frames.
+    """
+    def __init__(self, cluster_count: int = 2, sample_size: int = 4096, refine_iterations: int = 3, drift_ratio: float = 1.5, time_budget: float = 0.0, batch_size: int = 256, lut_bits: int = 5, seed: int = 0, buffers: Optional[BufferPool] = None) -> None:
+        """
+        Initializes the KMeansEngine object.
+
+        Arguments:
+        ----------
+            cluster_count (int): The number of clusters. Defaults to 2.
+            sample_size (int): The number of pixels the centers are fitted on. Defaults to 4096.
+            refine_iterations (int): The warm-started iterations run on every frame. Defaults to 3.
+            drift_ratio (float): How many times worse the fit may get before a full refit. Defaults to 1.5.
+            time_budget (float): Seconds per frame spent on mini-batch updates, 0 uses warm-started refits instead. Defaults to 0.0.
+            batch_size (int): The pixels drawn for every mini-batch update. Defaults to 256.
+            lut_bits (int): Bits per channel of the lookup table's color cube, 5 is 32x32x32 and 0 always assigns exactly. Defaults to 5.
+            seed (int): The seed of the pixel sampling. Defaults to 0.
+            buffers (Optional[BufferPool]): Holds the temporaries of paint(), such as the filter's own pool. Defaults to a new pool.
+        """
+        self.cluster_count: int = cluster_count
+        self.sample_size: int = sample_size
+        self.refine_iterations: int = refine_iterations
+        self.drift_ratio: float = drift_ratio
+        self.time_budget: float = time_budget
+        self.batch_size: int = batch_size
+        self.lut_bits: int = lut_bits
+        self.buffers: BufferPool = buffers or BufferPool()
+        self.refits: int = 0
+        self.batches: int = 0
+        self.__generator = random.default_rng(seed)
+        self.__centers: Optional[ndarray] = None
+        self.__reference_inertia: float = 0.0
+        self.__counts: Optional[ndarray] = None
+        self.__lookup_table: Tuple[Optional[ndarray], Optional[ndarray]] = (None, None)
+        self.__lock: Lock = Lock()
+
+    @property
+    def centers(self) -> Optional[ndarray]:
+        """
+        centers (Optional[numpy.ndarray]): The float32 (cluster_count, channels) centers in use, None before the first frame.
+        """
+        return self.__centers
+
+    def reset(self) -> None:
+        """
+        Forgets the current centers so the next frame is fitted from scratch.
+        """
+        self.__centers = None
+
+    def segment(self, image: MatLike, out: Optional[ndarray] = None) -> ndarray:
+        """
+        Replaces every pixel of the image with the color of its cluster.
+
+        Arguments:
+        ----------
+            image (MatLike): The input image with any number of channels.
+            out (Optional[numpy.ndarray]): A contiguous uint8 array shaped like the image the result is written into. Defaults to None.
+
+        Returns:
+        --------
+            numpy.ndarray: The segmented image, same shape as the input.
+        """
+        centers: ndarray = self.update(image.reshape(image.shape[0] * image.shape[1], -1))
+        return self.paint(image, centers, out)
+
+    def paint(self, image: MatLike, centers: ndarray, out: Optional[ndarray] = None) -> ndarray:
+        """
+        Replaces every pixel of the image with the color of its nearest center, without updating the centers.
+
+        Arguments:
+        ----------
+            image (MatLike): The input image with any number of channels.
+            centers (numpy.ndarray): The (cluster_count, channels) centers, such as the ones returned by update().
+            out (Optional[numpy.ndarray]): A contiguous uint8 array shaped like the image the result is written into. Defaults to None.
+
+        Returns:
+        --------
+            numpy.ndarray: The segmented image, same shape as the input.
+        """
+        pixels: ndarray = image.reshape(image.shape[0] * image.shape[1], -1)
+        colors: ndarray = clip(rint(centers), 0, 255).astype(uint8)
+
+        if self.lut_bits and image.dtype == uint8 and image.ndim == 3 and image.shape[2] == 3:
+            # Maps cells straight to colors, which skips building a full size label image. Colors are
+            # padded to four bytes so each pixel is gathered as one uint32, then the padding is dropped
+            cell_colors: ndarray = colors[self.lookup_table(centers)]
+            palette: ndarray = self.buffers.get("kmeans palette", (len(cell_colors), 4), uint8)
+            palette[:, :3] = cell_colors
+            gathered: ndarray = self.buffers.get("kmeans gathered", image.shape[:2], uint32)
+            take(palette.view(uint32).ravel(), self.__cells(image), out=gathered, mode="clip")
+            return cvtColor(gathered.view(uint8).reshape(*image.shape[:2], 4), COLOR_BGRA2BGR, out)
+
+        if out is not None:
+            labels: ndarray = self.assign(pixels, centers, out=self.buffers.get("kmeans labels", (len(pixels),), intp))
+            take(colors, labels, axis=0, out=out.reshape(pixels.shape[0], -1), mode="clip")
+            return out
+
+        return colors[self.assign(pixels, centers)].reshape(image.shape)
+
+    def lookup(self, image: ndarray, centers: ndarray) -> ndarray:
+        """
+        Finds the cluster of every pixel of a three channel uint8 image through the color cube lookup table.
+
+        Arguments:
+        ----------
+            image (numpy.ndarray): The (height, width, 3) uint8 image.
+            centers (numpy.ndarray): The (cluster_count, 3) centers.
+
+        Returns:
+        --------
+            numpy.ndarray: The (height, width) cluster index of every pixel.
+        """
+        return take(self.lookup_table(centers), self.__cells(image))
+
+    def lookup_table(self, centers: ndarray) -> ndarray:
+        """
+        Maps every cell of the quantized color cube to the center nearest to the middle of the cell.
+
+        The table is cached and only rebuilt once a center moved by more than LUT_TOLERANCE of a
+        cell away from the centers it was built for. Warm-started frames return new center arrays
+        that barely move once converged, which would otherwise rebuild the table on every frame.
+
+        Arguments:
+        ----------
+            centers (numpy.ndarray): The (cluster_count, 3) centers.
+
+        Returns:
+        --------
+            numpy.ndarray: The flat uint8 cluster index of every cell, (2 ** lut_bits) ** 3 entries.
+        """
+        table_centers, lookup_table = self.__lookup_table
+        step: int = 1 << (8 - self.lut_bits)
+
+        if table_centers is not None and lookup_table is not None and len(lookup_table) == 1 << (self.lut_bits * 3) and table_centers.shape == centers.shape:
+            if table_centers is centers or float(abs(centers - table_centers).max()) <= step * LUT_TOLERANCE:
+                return lookup_table
+
+        levels: ndarray = (arange(1 << self.lut_bits) * step + (step - 1) / 2).astype(float32)
+        cells: ndarray = stack(meshgrid(levels, levels, levels, indexing="ij"), axis=-1).reshape(-1, 3)
+
+        lookup_table = self.assign(cells, centers).astype(uint8)
+        # Stored as one tuple so other threads never see a table paired with the wrong centers
+        self.__lookup_table = (centers.copy(), lookup_table)
+        return lookup_table
+
+    def update(self, pixels: ndarray) -> ndarray:
+        """
+        Updates the centers from a new frame, safe to call from several threads.
+
+        Arguments:
+        ----------
+            pixels (numpy.ndarray): The (count, channels) pixels of the frame.
+
+        Returns:
+        --------
+            numpy.ndarray: The centers fitted to the frame.
+        """
+        with self.__lock:
+            started: float = perf_counter()
+            sample: ndarray = self.__sample(pixels)
+            cluster_count: int = max(1, min(self.cluster_count, len(sample)))
+
+            if self.time_budget > 0:
+                self.__minibatch(pixels, sample, cluster_count, started + self.time_budget)
+
+            elif self.__centers is None or len(self.__centers) != cluster_count or self.__centers.shape[1] != sample.shape[1]:
+                self.__refit(sample, cluster_count)
+            else:
+                inertia: float = self.__refine(sample)
+
+                # The scene changed too much for the old centers to be a good starting point
+                if inertia > self.__reference_inertia * self.drift_ratio + 1.0:
+                    self.__refit(sample, cluster_count)
+
+            return self.__centers # type: ignore
+
+    def assign(self, pixels: ndarray, centers: ndarray, chunk_size: int = 1 << 18, out: Optional[ndarray] = None) -> ndarray:
+        """
+        Finds the nearest center of every pixel.
+
+        Arguments:
+        ----------
+            pixels (numpy.ndarray): The (count, channels) pixels.
+            centers (numpy.ndarray): The (cluster_count, channels) centers.
+            chunk_size (int): The pixels handled at once, which bounds the temporary distance matrix.
+            out (Optional[numpy.ndarray]): An intp array of len(pixels) the labels are written into, the chunk temporaries then come from buffers too. Defaults to None.
+
+        Returns:
+        --------
+            numpy.ndarray: The index of the nearest center of every pixel.
+        """
+        labels: ndarray = empty(len(pixels), intp) if out is None else out
+
+        # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, and |p|^2 is the same for every center so it is skipped
+        center_norms: ndarray = einsum("ij,ij->i", centers, centers)
+        rows: int = min(chunk_size, len(pixels))
+
+        for start in range(0, len(pixels), chunk_size):
+            if out is None:
+                chunk: ndarray = pixels[start:start + chunk_size].astype(float32)
+                labels[start:start + chunk_size] = argmin(center_norms - 2 * chunk @ centers.T, axis=1)
+                continue
+
+            count: int = min(chunk_size, len(pixels) - start)
+            chunk = self.buffers.get("kmeans chunk", (rows, pixels.shape[1]), float32)[:count]
+            distances: ndarray = self.buffers.get("kmeans distances", (rows, len(centers)), float32)[:count]
+
+            copyto(chunk, pixels[start:start + count])
+            matmul(chunk, centers.T, out=distances)
+            distances *= -2
+            distances += center_norms
+            argmin(distances, axis=1, out=labels[start:start + count])
+
+        return labels
+
+    def __cells(self, image: ndarray) -> ndarray:
+        """
+        Computes the flat color cube cell of every pixel.
+        """
+        bits: int = self.lut_bits
+        shape: Tuple[int, ...] = image.shape[:2]
+        packed_type: type = uint16 if bits * 3 <= 16 else uint32
+        channels: List[ndarray] = [self.buffers.get(f"kmeans channel {index}", shape, uint8) for index in range(3)]
+        packed: ndarray = self.buffers.get("kmeans packed", shape, packed_type)
+        shifted: ndarray = self.buffers.get("kmeans shifted", shape, packed_type)
+        # intp, the index type of take(), which would otherwise convert the cells into a new array on every call
+        cells: ndarray = self.buffers.get("kmeans cells", shape, intp)
+
+        # Contiguous channels are much faster to shift than strided views of the image
+        split(image, channels)
+
+        for channel in channels:
+            right_shift(channel, 8 - bits, out=channel)
+
+        left_shift(channels[0], bits * 2, out=packed, dtype=packed_type)
+        left_shift(channels[1], bits, out=shifted, dtype=packed_type)
+        bitwise_or(packed, shifted, out=packed)
+        bitwise_or(packed, channels[2], out=packed, dtype=packed_type)
+        copyto(cells, packed)
+        return cells
+
+    def __sample(self, pixels: ndarray) -> ndarray:
+        """
+        Picks a random subsample of the pixels as float32.
+        """
+        if len(pixels) <= self.sample_size:
+            return pixels.astype(float32)
+
+        return pixels[self.__generator.integers(0, len(pixels), self.sample_size)].astype(float32)
+
+    def __minibatch(self, pixels: ndarray, sample: ndarray, cluster_count: int, deadline: float) -> None:
+        """
+        Moves the centers towards random mini-batches of the frame until they converge or the deadline passes, keeping the best centers seen.
+        """
+        if self.__centers is None or len(self.__centers) != cluster_count or self.__centers.shape[1] != sample.shape[1]:
+            # Seeds the centers with k-means++ on the sample, a few iterations keep this cheap
+            criteria: Tuple[int, int, float] = (TERM_CRITERIA_EPS + TERM_CRITERIA_MAX_ITER, 5, 1.0)
+            _, _, centers = kmeans(sample, cluster_count, None, criteria, 1, KMEANS_PP_CENTERS) # type: ignore
+            self.__centers = centers.astype(float32)
+            self.__counts = zeros(cluster_count, float64)
+            self.refits += 1
+
+        centers: ndarray = self.__centers.copy()
+        best_centers: ndarray = self.__centers
+        best_inertia: float = self.__inertia(sample)
+
+        # Old frames count for less so the centers can follow a changing scene
+        counts: ndarray = self.__counts * 0.5 # type: ignore
+
+        # At least one batch per frame, even if the budget was already spent on sampling
+        while True:
+            previous_centers: ndarray = centers.copy()
+            batch: ndarray = pixels[self.__generator.integers(0, len(pixels), self.batch_size)].astype(float32)
+            labels: ndarray = self.assign(batch, centers)
+            batch_counts: ndarray = bincount(labels, minlength=len(centers))
+
+            for index in batch_counts.nonzero()[0]:
+                counts[index] += batch_counts[index]
+                # Per center learning rate of batch size over everything it has seen
+                centers[index] += (batch[labels == index].mean(axis=0) - centers[index]) * (batch_counts[index] / counts[index])
+
+            self.batches += 1
+            inertia: float = self.__inertia(sample, centers)
+
+            if inertia < best_inertia:
+                best_centers, best_inertia = centers.copy(), inertia
+
+            # Converged like a full fit would, the rest of the budget would only add noise
+            if sqrt(((centers - previous_centers) ** 2).sum(axis=1)).max() < CONVERGENCE_EPSILON or perf_counter() >= deadline:
+                break
+
+        self.__centers = best_centers
+        self.__counts = counts
+
+    def __refit(self, sample: ndarray, cluster_count: int) -> None:
+        """
+        Fits new centers from scratch and orders them like the previous ones to keep colors stable.
+        """
+        criteria: Tuple[int, int, float] = (TERM_CRITERIA_EPS + TERM_CRITERIA_MAX_ITER, 20, CONVERGENCE_EPSILON)
+        _, _, centers = kmeans(sample, cluster_count, None, criteria, 3, KMEANS_PP_CENTERS) # type: ignore
+
+        if self.__centers is not None and self.__centers.shape == centers.shape:
+            centers = self.__match(self.__centers, centers)
+
+        self.__centers = centers.astype(float32)
+        self.__reference_inertia = self.__inertia(sample)
+        self.refits += 1
+
+    def __refine(self, sample: ndarray) -> float:
+        """
+        Runs a few Lloyd iterations starting from the current centers and returns the resulting inertia.
+        """
+        centers: ndarray = self.__centers.copy() # type: ignore
+
+        for _ in range(self.refine_iterations):
+            labels: ndarray = self.assign(sample, centers)
+
+            for index in range(len(centers)):
+                members: ndarray = sample[labels == index]
+
+                # Empty clusters keep their previous center
+                if len(members):
+                    centers[index] = members.mean(axis=0)
+
+        # Replaced rather than modified so callers holding the previous centers are unaffected
+        self.__centers = centers
+        return self.__inertia(sample)
+
+    def __inertia(self, sample: ndarray, centers: Optional[ndarray] = None) -> float:
+        """
+        The mean squared distance of the sample to its nearest center, the current centers by default.
+        """
+        centers = self.__centers if centers is None else centers
+        distances: ndarray = ((sample[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        return float(distances.min(axis=1).mean())
+
+    @staticmethod
+    def __match(previous: ndarray, centers: ndarray) -> ndarray:
+        """
+        Reorders the new centers so each takes the slot of the closest previous center.
+        """
+        distances: ndarray = ((previous[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        order: List[int] = [-1] * len(previous)
+        taken: Set[int] = set()
+
+        # Greedy matching on the closest pairs first, good enough for a handful of clusters
+        for flat_index in distances.argsort(axis=None):
+            slot, candidate = divmod(int(flat_index), len(centers))
+
+            if order[slot] == -1 and candidate not in taken:
+                order[slot] = candidate
+                taken.add(candidate)
+
+        return centers[order]
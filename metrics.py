@@ -0,0 +1,255 @@
+from typing import Any, ContextManager, Deque, Dict, List, Optional
+from contextlib import nullcontext
+from collections import deque
+from time import perf_counter
+from threading import Lock
+from csv import DictWriter
+from json import dump
+
+class FrameRate:
+    """
+    Measures how often something happens over a sliding window of recent events.
+    """
+    def __init__(self, window: int = 30) -> None:
+        """
+        Initializes the FrameRate object.
+
+        Arguments:
+        ----------
+            window (int): The number of recent events the rate is computed from. Defaults to 30.
+        """
+        self.__timestamps: Deque[float] = deque(maxlen=window)
+
+    def tick(self, timestamp: Optional[float] = None) -> None:
+        """
+        Records an event.
+
+        Arguments:
+        ----------
+            timestamp (Optional[float]): The perf_counter() time of the event. Defaults to now.
+        """
+        self.__timestamps.append(perf_counter() if timestamp is None else timestamp)
+
+    @property
+    def fps(self) -> float:
+        """
+        fps (float): Events per second over the window, 0.0 until two events were recorded.
+        """
+        if len(self.__timestamps) < 2:
+            return 0.0
+
+        elapsed: float = self.__timestamps[-1] - self.__timestamps[0]
+        return (len(self.__timestamps) - 1) / elapsed if elapsed > 0 else 0.0
+
+class StageTimings:
+    """
+    The durations of one stage over a rolling window of its most recent runs.
+    """
+    def __init__(self, window: int = 300) -> None:
+        """
+        Initializes the StageTimings object.
+
+        Arguments:
+        ----------
+            window (int): The number of recent durations kept. Defaults to 300.
+        """
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.count: int = 0
+
+    def add(self, seconds: float) -> None:
+        """
+        Records one run of the stage.
+
+        Arguments:
+        ----------
+            seconds (float): How long the run took.
+        """
+        self.durations.append(seconds)
+        self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Summarizes the window in milliseconds.
+
+        Returns:
+        --------
+            Dict[str, float]: The count of every run so far, and the mean, p50, p95 and max of the window.
+        """
+        durations: List[float] = sorted(self.durations)
+
+        if not durations:
+            return {"count": self.count, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+
+        def percentile(fraction: float) -> float:
+            return durations[min(len(durations) - 1, int(fraction * len(durations)))] * 1000
+
+        return {
+            "count": self.count,
+            "mean_ms": sum(durations) / len(durations) * 1000,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": durations[-1] * 1000
+        }
+
+class Measurement:
+    """
+    Times the body of a with block and records it as a run of a stage.
+    """
+    __slots__ = ("instruments", "stage", "started")
+
+    def __init__(self, instruments: 'Instrumentation', stage: str) -> None:
+        """
+        Initializes the Measurement object.
+
+        Arguments:
+        ----------
+            instruments (Instrumentation): Where the duration is recorded.
+            stage (str): The name of the stage.
+        """
+        self.instruments: Instrumentation = instruments
+        self.stage: str = stage
+        self.started: float = 0.0
+
+    def __enter__(self) -> 'Measurement':
+        """
+        Starts the clock of the stage.
+
+        Returns:
+        --------
+            Measurement: This measurement.
+        """
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        """
+        Records the time since __enter__ under the stage, even if the block raised.
+        """
+        self.instruments.record(self.stage, perf_counter() - self.started)
+
+# Handed out while instrumentation is disabled, so a disabled hook costs one call and nothing is allocated
+NO_MEASUREMENT: ContextManager[None] = nullcontext()
+
+class Instrumentation:
+    """
+    Rolling per-stage timings of the frame path, such as capture, conversions, filters and display.
+
+    Stages are timed by wrapping them in `with instruments.measure("stage"):` from any thread.
+    While disabled, measure() returns a shared no-op context, so hooks can stay in hot paths.
+    """
+    def __init__(self, enabled: bool = False, window: int = 300) -> None:
+        """
+        Initializes the Instrumentation object.
+
+        Arguments:
+        ----------
+            enabled (bool): Whether stages are timed. Defaults to False.
+            window (int): The number of recent runs kept per stage. Defaults to 300.
+        """
+        self.enabled: bool = enabled
+        self.window: int = window
+        self.frame_rate: FrameRate = FrameRate()
+        self.__stages: Dict[str, StageTimings] = {}
+        self.__lock: Lock = Lock()
+
+    def measure(self, stage: str) -> ContextManager[Any]:
+        """
+        Times a with block as a run of a stage.
+
+        Arguments:
+        ----------
+            stage (str): The name of the stage.
+
+        Returns:
+        --------
+            ContextManager[Any]: The context to enter, a no-op while disabled.
+        """
+        return Measurement(self, stage) if self.enabled else NO_MEASUREMENT
+
+    def record(self, stage: str, seconds: float) -> None:
+        """
+        Records a run of a stage timed elsewhere.
+
+        Arguments:
+        ----------
+            stage (str): The name of the stage.
+            seconds (float): How long the run took.
+        """
+        with self.__lock:
+            timings: Optional[StageTimings] = self.__stages.get(stage)
+
+            if timings is None:
+                timings = self.__stages[stage] = StageTimings(self.window)
+
+            timings.add(seconds)
+
+    def tick(self) -> None:
+        """
+        Counts a displayed frame towards the frame rate, ignored while disabled.
+        """
+        if self.enabled:
+            self.frame_rate.tick()
+
+    def clear(self) -> None:
+        """
+        Forgets every timing and the frame rate.
+        """
+        with self.__lock:
+            self.__stages.clear()
+            self.frame_rate = FrameRate()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarizes every stage, see StageTimings.summary().
+
+        Returns:
+        --------
+            Dict[str, Dict[str, float]]: The summary of each stage by name, in the order the stages first ran.
+        """
+        with self.__lock:
+            return {stage: timings.summary() for stage, timings in self.__stages.items()}
+
+    def overlay_text(self) -> str:
+        """
+        Formats the frame rate and the p50 and p95 of every stage for an on-screen overlay.
+
+        Returns:
+        --------
+            str: One line per stage under a frame rate line.
+        """
+        summary: Dict[str, Dict[str, float]] = self.summary()
+        width: int = max((len(stage) for stage in summary), default=0)
+        lines: List[str] = [f"{self.frame_rate.fps:.1f} fps", f"{'stage':<{width}}   p50 ms   p95 ms"]
+        lines += [f"{stage:<{width}} {values['p50_ms']:8.2f} {values['p95_ms']:8.2f}" for stage, values in summary.items()]
+        return "\n".join(lines)
+
+    def export(self, file_path: str) -> None:
+        """
+        Writes the timings to a file, JSON for .json paths and CSV otherwise.
+
+        JSON holds the summary and the durations in the window of every stage, CSV holds one
+        summary row per stage.
+
+        Arguments:
+        ----------
+            file_path (str): The file to write.
+        """
+        summary: Dict[str, Dict[str, float]] = self.summary()
+
+        if file_path.lower().endswith(".json"):
+            with self.__lock:
+                samples: Dict[str, List[float]] = {stage: [seconds * 1000 for seconds in timings.durations] for stage, timings in self.__stages.items()}
+
+            stages: Dict[str, Dict[str, Any]] = {stage: {**values, "samples_ms": samples.get(stage, [])} for stage, values in summary.items()}
+
+            with open(file_path, "w") as export_file:
+                dump({"fps": self.frame_rate.fps, "stages": stages}, export_file, indent=2)
+
+            return
+
+        with open(file_path, "w", newline="") as export_file:
+            writer = DictWriter(export_file, ["stage", "count", "mean_ms", "p50_ms", "p95_ms", "max_ms"])
+            writer.writeheader()
+
+            for stage, values in summary.items():
+                writer.writerow({"stage": stage, **values})
@@ -0,0 +1,212 @@
+# for type checking purposes.
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from custom_types import IMAGE_FILTERS
+    from cache import FilterResultCache
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+from queue import Queue, Empty
+from cv2.typing import MatLike
+from threading import Lock, Condition
+
+from metrics import Instrumentation
+from profiling import Profiler
+
+class ProcessedFrame(NamedTuple):
+    """
+    A finished result tagged with everything that produced it.
+    """
+    sequence: int
+    image_filter: IMAGE_FILTERS
+    parameters: Tuple[Tuple[str, Any], ...]
+    image: Optional[MatLike]
+    error: Optional[BaseException] = None
+    image_format: Optional[str] = None
+
+class ProcessingEngine:
+    """
+    Runs filter.apply() on a worker pool and hands finished results back through a thread-safe queue.
+
+    Frames submitted while every worker is busy are dropped, and results whose filter or
+    parameters no longer match the ones in use are thrown away when polled.
+
+    The input format and resolution scale travel with each submission. A worker only sets them
+    on the filter once no other worker is applying the same filter with different ones, so a
+    preview never runs with the scale of the frame submitted after it.
+
+    Threads are used instead of processes since OpenCV releases the GIL inside its calls,
+    which avoids pickling every frame across a process boundary.
+    """
+    def __init__(self, workers: int = 2, result_cache: Optional[FilterResultCache] = None, on_finished: Optional[Callable[[], None]] = None, instruments: Optional[Instrumentation] = None, profiler: Optional[Profiler] = None) -> None:
+        """
+        Initializes the ProcessingEngine object.
+
+        Arguments:
+        ----------
+            workers (int): The number of frames that can be processed at the same time. Defaults to 2.
+            result_cache (Optional[FilterResultCache]): Memoizes results of unchanged inputs and properties. Defaults to None.
+            on_finished (Optional[Callable[[], None]]): Called from the worker thread whenever a frame is done, kept or not. Defaults to None.
+            instruments (Optional[Instrumentation]): Times every apply() as "apply" and the filter's class name. Defaults to None.
+            profiler (Optional[Profiler]): Profiles every apply() while it takes a pstats profile. Defaults to None.
+        """
+        self.workers: int = workers
+        self.result_cache: Optional[FilterResultCache] = result_cache
+        self.on_finished: Optional[Callable[[], None]] = on_finished
+        self.instruments: Instrumentation = instruments or Instrumentation()
+        self.profiler: Profiler = profiler or Profiler()
+        self.dropped: int = 0
+        self.__executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ProcessingEngine")
+        self.__results: Queue[ProcessedFrame] = Queue()
+        self.__lock: Lock = Lock()
+        self.__in_flight: int = 0
+        self.__sequence: int = 0
+        self.__delivered_sequence: int = 0
+        # How many workers are inside apply() of each filter, by id, guarded by the condition
+        self.__applying: Dict[int, int] = {}
+        self.__settings_released: Condition = Condition()
+
+    @property
+    def busy(self) -> bool:
+        """
+        busy (bool): Whether every worker is currently processing a frame.
+        """
+        with self.__lock:
+            return self.__in_flight >= self.workers
+
+    def submit(self, image_filter: IMAGE_FILTERS, image: MatLike, input_format: Optional[str] = None, resolution_scale: Optional[float] = None, use_cache: bool = True) -> bool:
+        """
+        Queues an image to be processed by the filter unless the engine is saturated.
+
+        Arguments:
+        ----------
+            image_filter (IMAGE_FILTERS): The filter instance to apply.
+            image (MatLike): The image to process.
+            input_format (Optional[str]): The format of the image. Defaults to the filter's input_format.
+            resolution_scale (Optional[float]): The size of the image relative to the full resolution. Defaults to the filter's resolution_scale.
+            use_cache (bool): Whether the result cache may serve or keep the result, off for frames that never repeat. Defaults to True.
+
+        Returns:
+        --------
+            bool: True if the image was accepted, False if it was dropped.
+        """
+        with self.__lock:
+            if self.__in_flight >= self.workers:
+                self.dropped += 1
+                return False
+
+            self.__in_flight += 1
+            self.__sequence += 1
+            sequence: int = self.__sequence
+
+        settings: Tuple[str, float] = (
+            input_format if input_format is not None else image_filter.input_format,
+            resolution_scale if resolution_scale is not None else image_filter.resolution_scale
+        )
+
+        self.__executor.submit(self.__process, sequence, image_filter, image, settings, use_cache)
+        return True
+
+    def poll(self, image_filter: Optional[IMAGE_FILTERS]) -> Optional[ProcessedFrame]:
+        """
+        Drains finished results and returns the newest one that is still valid for the filter.
+
+        Arguments:
+        ----------
+            image_filter (Optional[IMAGE_FILTERS]): The filter currently in use.
+
+        Returns:
+        --------
+            Optional[ProcessedFrame]: The newest valid result, or None if there is nothing new.
+
+        Raises:
+        -------
+            BaseException: Re-raises on the calling thread whatever a worker raised while processing.
+        """
+        newest: Optional[ProcessedFrame] = None
+
+        while True:
+            try:
+                result: ProcessedFrame = self.__results.get_nowait()
+            except Empty:
+                break
+
+            if result.error is not None:
+                raise result.error
+
+            # Results from a replaced filter, outdated sliders or overtaken frames are stale
+            if result.image_filter is not image_filter or result.parameters != image_filter.snapshot():
+                continue
+
+            if result.sequence <= self.__delivered_sequence:
+                continue
+
+            if newest is None or result.sequence > newest.sequence:
+                newest = result
+
+        if newest is not None:
+            self.__delivered_sequence = newest.sequence
+
+        return newest
+
+    def shutdown(self) -> None:
+        """
+        Stops accepting frames and lets the workers finish.
+        """
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+
+    def __process(self, sequence: int, image_filter: IMAGE_FILTERS, image: MatLike, settings: Tuple[str, float], use_cache: bool) -> None:
+        """
+        The body of a worker.
+        """
+        self.__acquire_settings(image_filter, settings)
+
+        try:
+            parameters: Tuple[Tuple[str, Any], ...] = image_filter.snapshot()
+            image_format: str = image_filter.output_format
+
+            with self.instruments.measure(f"apply {type(image_filter).__name__}"), self.profiler.profile():
+                if self.result_cache is not None and use_cache:
+                    processed_image: MatLike = self.result_cache.apply(image_filter, image)
+                else:
+                    processed_image: MatLike = image_filter.apply(image)
+
+            # A slider moved while apply() was running, so the result may mix old and new values
+            if image_filter.snapshot() != parameters:
+                return
+
+            self.__results.put(ProcessedFrame(sequence, image_filter, parameters, processed_image, image_format=image_format))
+        except BaseException as error:
+            self.__results.put(ProcessedFrame(sequence, image_filter, (), None, error))
+        finally:
+            self.__release_settings(image_filter)
+
+            with self.__lock:
+                self.__in_flight -= 1
+
+            if self.on_finished is not None:
+                self.on_finished()
+
+    def __acquire_settings(self, image_filter: IMAGE_FILTERS, settings: Tuple[str, float]) -> None:
+        """
+        Sets the input format and resolution scale of a submission, waiting while other workers apply the filter with different ones.
+        """
+        with self.__settings_released:
+            self.__settings_released.wait_for(lambda: not self.__applying.get(id(image_filter)) or (image_filter.input_format, image_filter.resolution_scale) == settings)
+            image_filter.input_format, image_filter.resolution_scale = settings
+            self.__applying[id(image_filter)] = self.__applying.get(id(image_filter), 0) + 1
+
+    def __release_settings(self, image_filter: IMAGE_FILTERS) -> None:
+        """
+        Lets waiting workers change the settings of the filter once no worker applies it anymore.
+        """
+        with self.__settings_released:
+            self.__applying[id(image_filter)] -= 1
+
+            if not self.__applying[id(image_filter)]:
+                del self.__applying[id(image_filter)]
+                self.__settings_released.notify_all()
@@ -0,0 +1,248 @@
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+from threading import Thread, Event, Condition, get_ident, enumerate as enumerate_threads
+from contextlib import contextmanager, nullcontext
+from sys import _current_frames, version, version_info
+from datetime import datetime
+from time import perf_counter
+from cProfile import Profile
+from pstats import Stats
+from os import path, makedirs
+from collections import Counter
+from json import dump
+
+# Outputs with these extensions are sampled into collapsed stacks for flame graph tools, anything else is a cProfile pstats file
+COLLAPSED_EXTENSIONS: Tuple[str, ...] = (".collapsed", ".folded", ".txt")
+PSTATS_EXTENSIONS: Tuple[str, ...] = (".pstats", ".prof")
+
+# Handed out while nothing is profiled, so the hooks cost one call
+NO_PROFILE: ContextManager[None] = nullcontext()
+
+# From Python 3.12 cProfile sees every thread but only one profile can be enabled per interpreter,
+# before that a profile only sees the thread that enabled it
+SINGLE_PROFILE: bool = version_info >= (3, 12)
+
+def default_profile_path(directory: str, filter_name: Optional[str], extension: str = ".pstats") -> str:
+    """
+    Names a profile after the filter it was taken with and the time it started.
+
+    Arguments:
+    ----------
+        directory (str): The directory profiles are kept in.
+        filter_name (Optional[str]): The class name of the active filter, None without a filter.
+        extension (str): Picks the kind of profile, see PSTATS_EXTENSIONS and COLLAPSED_EXTENSIONS. Defaults to ".pstats".
+
+    Returns:
+    --------
+        str: A path such as profiles/KMeansSegmentation-20240131-142501.pstats.
+    """
+    return path.join(directory, f"{filter_name or 'NoFilter'}-{datetime.now():%Y%m%d-%H%M%S}{extension}")
+
+class Profiler:
+    """
+    Profiles a running app for a while and saves the result, tagged with what was running.
+
+    Two kinds of profiles are written, picked by the extension of the output:
+    - pstats files from cProfile. Before Python 3.12 they only cover the with blocks entered
+      through profile(), such as the frame loop and every apply(), with one profile per thread
+      merged at the end. From 3.12 one profile covers every thread from start() to stop().
+    - collapsed stacks for flame graph tools, sampled from every thread every sample_interval
+      seconds. Samples are wall clock, so threads waiting on a queue show up as waiting.
+
+    Next to the profile a .json file holds the tags, like the filter and its property values,
+    so a slow case can be reproduced from the artifact alone.
+    """
+    def __init__(self, sample_interval: float = 0.005) -> None:
+        """
+        Initializes the Profiler object.
+
+        Arguments:
+        ----------
+            sample_interval (float): Seconds between two samples of collapsed stack profiles. Defaults to 0.005.
+        """
+        self.sample_interval: float = sample_interval
+        self.output_path: Optional[str] = None
+        self.tags: Dict[str, Any] = {}
+        self.__sampling: bool = False
+        self.__started: float = 0.0
+        self.__profiles: Dict[int, Profile] = {}
+        self.__profile: Optional[Profile] = None
+        self.__enabled_threads: Dict[int, int] = {}
+        self.__stacks: Counter[str] = Counter()
+        self.__samples: int = 0
+        self.__stop_event: Event = Event()
+        self.__sampler: Optional[Thread] = None
+        self.__condition: Condition = Condition()
+
+    @property
+    def active(self) -> bool:
+        """
+        active (bool): Whether a profile is being taken.
+        """
+        return self.output_path is not None
+
+    def start(self, output_path: str, tags: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Starts taking a profile.
+
+        Arguments:
+        ----------
+            output_path (str): Where stop() writes the profile, its extension picks the kind of profile.
+            tags (Optional[Dict[str, Any]]): Describes what is profiled, written next to the profile. Defaults to None.
+
+        Raises:
+        -------
+            RuntimeError: If a profile is already being taken.
+            ValueError: If the extension is neither a pstats nor a collapsed one, or another profiler is enabled on Python 3.12 and later.
+        """
+        if self.active:
+            raise RuntimeError(f"Already profiling into {self.output_path}")
+
+        if not output_path.lower().endswith(PSTATS_EXTENSIONS + COLLAPSED_EXTENSIONS):
+            raise ValueError(f"Cannot profile into {output_path}, expected one of {', '.join(PSTATS_EXTENSIONS + COLLAPSED_EXTENSIONS)}")
+
+        self.tags = dict(tags or {})
+        self.__sampling = output_path.lower().endswith(COLLAPSED_EXTENSIONS)
+        self.__profiles, self.__stacks, self.__samples = {}, Counter(), 0
+
+        if SINGLE_PROFILE and not self.__sampling:
+            # Raises ValueError while another profiler is enabled, before anything is marked active
+            profile: Profile = Profile()
+            profile.enable()
+            self.__profile = profile
+
+        self.__started = perf_counter()
+        self.output_path = output_path
+
+        if self.__sampling:
+            self.__stop_event.clear()
+            self.__sampler = Thread(target=self.__sample, name="Profiler", daemon=True)
+            self.__sampler.start()
+
+    def profile(self) -> ContextManager[Any]:
+        """
+        Profiles a with block with cProfile while a pstats profile is taken, before Python 3.12.
+
+        Returns:
+        --------
+            ContextManager[Any]: The context to enter, a no-op otherwise.
+        """
+        if not self.active or self.__sampling or SINGLE_PROFILE:
+            return NO_PROFILE
+
+        return self.__profiled()
+
+    def stop(self) -> str:
+        """
+        Stops the profile and writes it together with its tags.
+
+        Returns:
+        --------
+            str: The path of the profile, the tags are in the same path with .json appended.
+
+        Raises:
+        -------
+            ValueError: If nothing ran while profiling.
+        """
+        output_path: str = self.output_path # type: ignore
+        seconds: float = perf_counter() - self.__started
+
+        with self.__condition:
+            self.output_path = None
+            # Blocks still running on worker threads are let finish before their profiles are read
+            self.__condition.wait_for(lambda: not self.__enabled_threads, timeout=2.0)
+
+        if self.__sampler is not None:
+            self.__stop_event.set()
+            self.__sampler.join()
+            self.__sampler = None
+
+        if self.__profile is not None:
+            self.__profile.disable()
+            self.__profiles[get_ident()], self.__profile = self.__profile, None
+
+        makedirs(path.dirname(output_path) or ".", exist_ok=True)
+
+        if self.__sampling:
+            if not self.__stacks:
+                raise ValueError("No samples were taken while profiling")
+
+            with open(output_path, "w") as profile_file:
+                profile_file.writelines(f"{stack} {count}\n" for stack, count in self.__stacks.most_common())
+
+            details: Dict[str, Any] = {"kind": "collapsed", "samples": self.__samples, "sample_interval": self.sample_interval}
+        else:
+            # Stats cannot load a profile without any call in it
+            profiles: List[Profile] = [profile for profile in self.__profiles.values() if profile.getstats()]
+
+            if not profiles:
+                raise ValueError("Nothing was profiled, no frame was processed")
+
+            stats: Stats = Stats(profiles[0])
+
+            for profile in profiles[1:]:
+                stats.add(profile)
+
+            stats.dump_stats(output_path)
+            details = {"kind": "pstats", "profiles": len(profiles)}
+
+        with open(output_path + ".json", "w") as tags_file:
+            dump({**self.tags, **details, "seconds": seconds, "python": version}, tags_file, indent=2, default=str)
+
+        return output_path
+
+    @contextmanager
+    def __profiled(self) -> Iterator[None]:
+        """
+        Enables the profile of the calling thread for a with block, nested blocks keep the outer one.
+        """
+        thread_id: int = get_ident()
+
+        with self.__condition:
+            depth: int = self.__enabled_threads.get(thread_id, 0)
+            profile: Optional[Profile] = self.__profiles.get(thread_id)
+
+            if profile is None:
+                profile = self.__profiles[thread_id] = Profile()
+
+        if depth == 0:
+            profile.enable()
+
+        with self.__condition:
+            self.__enabled_threads[thread_id] = depth + 1
+
+        try:
+            yield
+        finally:
+            if depth == 0:
+                profile.disable()
+
+            with self.__condition:
+                if depth == 0:
+                    del self.__enabled_threads[thread_id]
+                else:
+                    self.__enabled_threads[thread_id] = depth
+
+                self.__condition.notify_all()
+
+    def __sample(self) -> None:
+        """
+        The body of the sampling thread, counts the stack of every other thread until stopped.
+        """
+        own_id: int = get_ident()
+
+        while not self.__stop_event.wait(self.sample_interval):
+            thread_names: Dict[int, str] = {thread.ident: thread.name for thread in enumerate_threads() if thread.ident is not None}
+            self.__samples += 1
+
+            for thread_id, frame in _current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                functions: List[str] = []
+
+                while frame is not None:
+                    code = frame.f_code
+                    functions.append(f"{code.co_name} ({path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+
+                self.__stacks[";".join([thread_names.get(thread_id, str(thread_id)), *reversed(functions)])] += 1
@@ -0,0 +1,104 @@
+from threading import Event, current_thread, main_thread
+from typing import Callable, Optional
+from tkinter import Misc
+
+from constants import DISPLAY_REFRESH_INTERVAL, IDLE_REFRESH_INTERVAL
+
+class RedrawScheduler:
+    """
+    Runs a redraw callback only after something marked the view dirty.
+
+    Any number of mark_dirty() calls between two display refreshes are coalesced into one
+    redraw. While changes keep arriving the view is checked once per refresh interval, and
+    once nothing changed for a whole idle interval it falls back to a slow idle check so
+    nothing is processed on timer ticks.
+    """
+    def __init__(self, widget: Misc, redraw: Callable[[], None], refresh_interval: int = DISPLAY_REFRESH_INTERVAL, idle_interval: int = IDLE_REFRESH_INTERVAL) -> None:
+        """
+        Initializes the RedrawScheduler object.
+
+        Arguments:
+        ----------
+            widget (Misc): The Tk widget whose event loop runs the redraws.
+            redraw (Callable[[], None]): The callback that renders the view.
+            refresh_interval (int): Milliseconds between redraws while the view keeps changing.
+            idle_interval (int): Milliseconds between checks once the view stopped changing.
+        """
+        self.widget: Misc = widget
+        self.redraw: Callable[[], None] = redraw
+        self.refresh_interval: int = refresh_interval
+        self.idle_interval: int = idle_interval
+        self.redraws: int = 0
+        self.__dirty: Event = Event()
+        self.__after_id: Optional[str] = None
+        self.__idle: bool = False
+        self.__quiet_time: int = 0
+        self.__stopped: bool = False
+
+    def start(self) -> 'RedrawScheduler':
+        """
+        Starts checking the dirty flag, the first redraw happens on the next refresh.
+
+        Returns:
+        --------
+            RedrawScheduler: The scheduler itself so it can be chained on construction.
+        """
+        self.__stopped = False
+        self.mark_dirty()
+        self.__schedule(self.refresh_interval)
+        return self
+
+    def stop(self) -> None:
+        """
+        Cancels any pending check.
+        """
+        self.__stopped = True
+
+        if self.__after_id is not None:
+            self.widget.after_cancel(self.__after_id)
+            self.__after_id = None
+
+    def mark_dirty(self, *_) -> None:
+        """
+        Requests a redraw, safe to call from any thread and with any arguments so it can be used as a listener.
+        """
+        self.__dirty.set()
+
+        # Tk may only be touched from its own thread, other threads wait for the next check
+        if self.__idle and not self.__stopped and current_thread() is main_thread():
+            self.__schedule(self.refresh_interval)
+
+    def __schedule(self, interval: int) -> None:
+        """
+        Replaces the pending check with one that runs after the interval.
+        """
+        if self.__after_id is not None:
+            self.widget.after_cancel(self.__after_id)
+
+        self.__idle = interval >= self.idle_interval
+        self.__after_id = self.widget.after(interval, self.__check)
+
+    def __check(self) -> None:
+        """
+        Redraws if the view is dirty and schedules the next check.
+        """
+        self.__after_id = None
+
+        if self.__stopped:
+            return
+
+        if not self.__dirty.is_set():
+            # Sources like a 30 fps camera leave some refreshes quiet, so idling waits for a longer gap
+            self.__quiet_time += self.refresh_interval
+            self.__schedule(self.idle_interval if self.__quiet_time >= self.idle_interval else self.refresh_interval)
+            return
+
+        self.__quiet_time = 0
+        self.__dirty.clear()
+        self.redraws += 1
+
+        try:
+            self.redraw()
+        finally:
+            if not self.__stopped:
+                self.__schedule(self.refresh_interval)
@@ -0,0 +1,69 @@
+from threading import Thread, Barrier
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import List
+from pstats import Stats
+from os import path
+import unittest
+
+from profiling import Profiler
+
+def work() -> int:
+    return sum(range(1000))
+
+class ProfilerTest(unittest.TestCase):
+    def test_pstats_counts_calls_of_every_thread(self) -> None:
+        profiler: Profiler = Profiler()
+        # Keeps the threads overlapping, which is when the profiles of several threads interfere
+        barrier: Barrier = Barrier(3)
+
+        def worker() -> None:
+            barrier.wait()
+
+            for _ in range(20):
+                with profiler.profile():
+                    work()
+
+        with TemporaryDirectory() as directory:
+            output_path: str = path.join(directory, "threads.pstats")
+            profiler.start(output_path)
+            threads: List[Thread] = [Thread(target=worker) for _ in range(3)]
+
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+            profiler.stop()
+            stats: Stats = Stats(output_path)
+
+        calls: int = sum(call_count for (_, _, function), (_, call_count, *_) in stats.stats.items() if function == work.__name__) # type: ignore
+        self.assertEqual(calls, 60)
+
+    def test_collapsed_samples_every_thread(self) -> None:
+        profiler: Profiler = Profiler(sample_interval=0.001)
+
+        def worker() -> None:
+            started: float = perf_counter()
+
+            while perf_counter() - started < 0.2:
+                work()
+
+        with TemporaryDirectory() as directory:
+            output_path: str = path.join(directory, "threads.collapsed")
+            profiler.start(output_path)
+            thread: Thread = Thread(target=worker, name="Worker")
+            thread.start()
+            thread.join()
+            profiler.stop()
+
+            with open(output_path) as profile_file:
+                lines: List[str] = profile_file.read().splitlines()
+
+        worker_lines: List[str] = [line for line in lines if line.startswith("Worker;")]
+        self.assertTrue(worker_lines)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in worker_lines))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+# for type checking purposes.
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from Filters import PropertyTypeManager
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, NamedTuple, Optional, Tuple
+from numpy import ndarray, empty, ascontiguousarray
+from cv2.typing import MatLike
+from os import cpu_count
+from math import isqrt
+
+from color_spaces import convert
+
+# A generous estimate of the bytes a filter needs per tile pixel, covering the tile, its gray
+# version, two float64 derivatives and the result
+WORKING_BYTES_PER_PIXEL: int = 32
+
+class Tile(NamedTuple):
+    """
+    A part of the image, read together with its halo.
+    """
+    region: Tuple[slice, slice]
+    core: Tuple[slice, slice]
+    target: Tuple[slice, slice]
+
+class TiledEngine:
+    """
+    Applies a filter to an image tile by tile, so memory stays bounded no matter how big the image is.
+
+    Every tile is read with a halo as wide as the filter's kernel reaches, so the pixels that are
+    kept match the untiled result. Filters whose result depends on the whole image, such as the
+    normalization of Sobel or the centers of K-Means, run twice: the first pass collects the
+    statistics of every tile and the second applies the filter with the merged statistics.
+
+    Tiles are processed in parallel. Only the tiles in flight are in memory besides the input and
+    the output, which can both be memory-mapped arrays to keep them off the heap as well.
+    """
+    def __init__(self, image_filter: PropertyTypeManager, memory_limit: int = 256 * 1024 * 1024, workers: Optional[int] = None, tile_size: Optional[int] = None) -> None:
+        """
+        Initializes the TiledEngine object.
+
+        Arguments:
+        ----------
+            image_filter (PropertyTypeManager): The filter to apply, its statistics are set during apply().
+            memory_limit (int): The bytes the tiles in flight may use together. Defaults to 256 MB.
+            workers (Optional[int]): The number of tiles processed at once. Defaults to the CPU count.
+            tile_size (Optional[int]): The side of a tile without its halo, derived from memory_limit by default.
+        """
+        self.image_filter: PropertyTypeManager = image_filter
+        self.memory_limit: int = memory_limit
+        self.workers: int = workers or cpu_count() or 1
+        self.tile_size: Optional[int] = tile_size
+
+    def tiles(self, shape: Tuple[int, ...]) -> List[Tile]:
+        """
+        Splits an image into tiles that fit the memory limit.
+
+        Arguments:
+        ----------
+            shape (Tuple[int, ...]): The shape of the image.
+
+        Returns:
+        --------
+            List[Tile]: Every tile in row order.
+        """
+        height, width = shape[:2]
+        halo: int = self.image_filter.halo()
+        tile_size: int = self.tile_size or self.__fitting_tile_size(halo)
+        tiles: List[Tile] = []
+
+        for top in range(0, height, tile_size):
+            for left in range(0, width, tile_size):
+                bottom, right = min(top + tile_size, height), min(left + tile_size, width)
+                # The halo is cut off at the image border, where the filter's own border handling applies as it would untiled
+                region_top, region_left = max(top - halo, 0), max(left - halo, 0)
+                region_bottom, region_right = min(bottom + halo, height), min(right + halo, width)
+
+                tiles.append(Tile(
+                    (slice(region_top, region_bottom), slice(region_left, region_right)),
+                    (slice(top - region_top, bottom - region_top), slice(left - region_left, right - region_left)),
+                    (slice(top, bottom), slice(left, right))
+                ))
+
+        return tiles
+
+    def apply(self, image: MatLike, out: Optional[ndarray] = None, source_format: Optional[str] = None, target_format: Optional[str] = None) -> ndarray:
+        """
+        Applies the filter to the whole image.
+
+        Color conversions before and after the filter are done tile by tile as well, so they never
+        need a full size copy of the image.
+
+        Arguments:
+        ----------
+            image (MatLike): The input image, a numpy.memmap works too.
+            out (Optional[numpy.ndarray]): The array the result is written into, such as a numpy.memmap. Defaults to a new array.
+            source_format (Optional[str]): The format of the image. Defaults to the filter's input_format.
+            target_format (Optional[str]): The format the result is written in. Defaults to the filter's output_format.
+
+        Returns:
+        --------
+            numpy.ndarray: The filtered image.
+        """
+        tiles: List[Tile] = self.tiles(image.shape)
+        source_format = source_format or self.image_filter.input_format
+        target_format = target_format or self.image_filter.output_format
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="TiledEngine") as executor:
+            if self.image_filter.global_statistics:
+                partials: List[Any] = list(executor.map(lambda tile: self.image_filter.collect_statistics(self.__read(image, tile, source_format), tile.core), tiles))
+                self.image_filter.statistics = self.image_filter.merge_statistics(partials)
+
+            try:
+                # The first tile tells the shape and type of the result
+                first_result: MatLike = self.__filter(image, tiles[0], source_format, target_format)
+
+                if out is None:
+                    out = empty((*image.shape[:2], *first_result.shape[2:]), first_result.dtype)
+
+                out[tiles[0].target] = first_result
+
+                # Tiles are read inside the workers, so only the ones being processed are in memory
+                for _ in executor.map(lambda tile: self.__process(image, tile, out, source_format, target_format), tiles[1:]):
+                    pass
+            finally:
+                if self.image_filter.global_statistics:
+                    self.image_filter.statistics = None
+
+        return out # type: ignore
+
+    def __process(self, image: MatLike, tile: Tile, out: ndarray, source_format: str, target_format: str) -> None:
+        """
+        Filters one tile and writes the part that is not halo.
+        """
+        out[tile.target] = self.__filter(image, tile, source_format, target_format)
+
+    def __filter(self, image: MatLike, tile: Tile, source_format: str, target_format: str) -> MatLike:
+        """
+        Filters one tile and returns the part that is not halo, in the target format.
+        """
+        result: MatLike = self.image_filter.apply(self.__read(image, tile, source_format))
+        return convert(result[tile.core], self.image_filter.output_format, target_format)
+
+    def __read(self, image: MatLike, tile: Tile, source_format: str) -> ndarray:
+        """
+        Copies a tile with its halo out of the image in the filter's input format, which pages it in for memory-mapped images.
+        """
+        return convert(ascontiguousarray(image[tile.region]), source_format, self.image_filter.input_format)
+
+    def __fitting_tile_size(self, halo: int) -> int:
+        """
+        The biggest tile side whose tiles in flight stay within the memory limit.
+        """
+        pixels_per_tile: int = self.memory_limit // (self.workers * WORKING_BYTES_PER_PIXEL)
+        return max(isqrt(pixels_per_tile) - 2 * halo, 64)
@@ -0,0 +1,230 @@
+from cv2 import VideoCapture, VideoWriter, VideoWriter_fourcc, CAP_PROP_FPS, cvtColor, COLOR_GRAY2BGR
+from typing import Any, Callable, Dict, List, Optional
+from argparse import ArgumentParser, Namespace
+from threading import Thread, Event
+from queue import Queue, Full, Empty
+from cv2.typing import MatLike
+from time import perf_counter
+from os import path
+
+from Filters import PropertyTypeManager, FILTER_CLASSES
+from capture import parse_source, open_capture
+from frame_store import FrameStoreCapture
+from command_line import filter_from_arguments
+from metrics import FrameRate
+
+FOURCC_BY_EXTENSION: Dict[str, str] = {
+    ".avi": "MJPG",
+    ".mp4": "mp4v",
+    ".mkv": "mp4v",
+    ".mov": "mp4v"
+}
+
+class VideoPipeline:
+    """
+    Streams a video through a filter, overlapping the decode, filter and encode stages on separate threads.
+
+    Stages hand frames to each other through bounded queues, so memory stays at a few frames
+    no matter how long the video is and a slow stage simply makes the others wait.
+    """
+    def __init__(self, source: int|str, output_path: str, image_filter: PropertyTypeManager, queue_size: int = 8, fourcc: Optional[str] = None) -> None:
+        """
+        Initializes the VideoPipeline object.
+
+        Arguments:
+        ----------
+            source (int|str): The camera index, video file or image sequence to read.
+            output_path (str): The video file the filtered frames are encoded into.
+            image_filter (PropertyTypeManager): The filter applied to every frame.
+            queue_size (int): The number of frames each queue between two stages holds at most. Defaults to 8.
+            fourcc (Optional[str]): The four character codec code, guessed from the output extension by default.
+        """
+        self.source: int|str = source
+        self.output_path: str = output_path
+        self.image_filter: PropertyTypeManager = image_filter
+        self.fourcc: str = fourcc or FOURCC_BY_EXTENSION.get(path.splitext(output_path)[1].lower(), "mp4v")
+        self.frames: int = 0
+        self.frame_rate: FrameRate = FrameRate()
+        self.__decoded: Queue[Optional[MatLike]] = Queue(queue_size)
+        self.__filtered: Queue[Optional[MatLike]] = Queue(queue_size)
+        self.__stop_event: Event = Event()
+        self.__errors: List[BaseException] = []
+
+    def stop(self) -> None:
+        """
+        Asks every stage to finish early, the frames encoded so far are kept.
+        """
+        self.__stop_event.set()
+
+    def run(self, on_progress: Optional[Callable[['VideoPipeline'], None]] = None, progress_interval: float = 1.0) -> int:
+        """
+        Processes the whole source and blocks until the output is written.
+
+        Arguments:
+        ----------
+            on_progress (Optional[Callable[[VideoPipeline], None]]): Called periodically while the pipeline runs. Defaults to None.
+            progress_interval (float): Seconds between progress calls. Defaults to 1.0.
+
+        Returns:
+        --------
+            int: The number of frames written, stopping early on Ctrl+C keeps the frames written so far.
+
+        Raises:
+        -------
+            BaseException: Whatever a stage raised, once every stage stopped.
+        """
+        capture: VideoCapture|FrameStoreCapture = open_capture(self.source)
+
+        if not capture.isOpened():
+            raise ValueError(f"Could not open {self.source}")
+
+        fps: float = capture.get(CAP_PROP_FPS) or 30.0
+
+        stages: List[Thread] = [
+            Thread(target=self.__guard, args=(self.__decode, capture), name="VideoPipeline decode", daemon=True),
+            Thread(target=self.__guard, args=(self.__filter,), name="VideoPipeline filter", daemon=True),
+            Thread(target=self.__guard, args=(self.__encode, fps), name="VideoPipeline encode", daemon=True)
+        ]
+
+        for stage in stages:
+            stage.start()
+
+        try:
+            while stages[-1].is_alive():
+                stages[-1].join(progress_interval)
+
+                if on_progress is not None:
+                    on_progress(self)
+        except KeyboardInterrupt:
+            # Lets the encoder close the file properly with the frames written so far
+            self.stop()
+
+        for stage in stages:
+            stage.join()
+
+        if self.__errors:
+            raise self.__errors[0]
+
+        return self.frames
+
+    def __guard(self, stage: Callable[..., None], *arguments: Any) -> None:
+        """
+        Runs a stage, stopping the others if it fails.
+        """
+        try:
+            stage(*arguments)
+        except BaseException as error:
+            self.__errors.append(error)
+            self.__stop_event.set()
+
+    def __put(self, queue: Queue, item: Optional[MatLike]) -> bool:
+        """
+        Waits for room in the queue, giving up if the pipeline was stopped.
+        """
+        while not self.__stop_event.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+
+        return False
+
+    def __get(self, queue: Queue) -> Optional[MatLike]:
+        """
+        Waits for the next frame, None marks the end of the stream or a stopped pipeline.
+        """
+        while not self.__stop_event.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                continue
+
+        return None
+
+    def __decode(self, capture: VideoCapture|FrameStoreCapture) -> None:
+        """
+        The decode stage.
+        """
+        try:
+            while not self.__stop_event.is_set():
+                frame_returned, frame = capture.read()
+
+                if not frame_returned or not self.__put(self.__decoded, frame):
+                    break
+        finally:
+            capture.release()
+            self.__put(self.__decoded, None)
+
+    def __filter(self) -> None:
+        """
+        The filter stage.
+        """
+        try:
+            while (frame := self.__get(self.__decoded)) is not None:
+                processed_frame: MatLike = self.image_filter.apply(frame) # type: ignore
+
+                # VideoWriter expects three channels, single channel filters like Canny are expanded
+                if processed_frame.ndim == 2:
+                    processed_frame = cvtColor(processed_frame, COLOR_GRAY2BGR)
+
+                if not self.__put(self.__filtered, processed_frame):
+                    break
+        finally:
+            self.__put(self.__filtered, None)
+
+    def __encode(self, fps: float) -> None:
+        """
+        The encode stage, the writer is opened once the size of the first filtered frame is known.
+        """
+        writer: Optional[VideoWriter] = None
+
+        try:
+            while (frame := self.__get(self.__filtered)) is not None:
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = VideoWriter(self.output_path, VideoWriter_fourcc(*self.fourcc), fps, (width, height))
+
+                    if not writer.isOpened():
+                        raise ValueError(f"Could not open {self.output_path} for writing with codec {self.fourcc}")
+
+                writer.write(frame)
+                self.frames += 1
+                self.frame_rate.tick()
+        finally:
+            if writer is not None:
+                writer.release()
+
+def report_progress(pipeline: VideoPipeline) -> None:
+    """
+    Prints the frames written so far and the current throughput.
+
+    Arguments:
+    ----------
+        pipeline (VideoPipeline): The running pipeline.
+    """
+    print(f"{pipeline.frames} frames, {pipeline.frame_rate.fps:.1f} fps", flush=True)
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description="Filters a video, camera or image sequence into a video file without a display.")
+    parser.add_argument("source", help="camera index, video file, image sequence such as frames/%%04d.png or .frames recording")
+    parser.add_argument("output", help="video file the filtered frames are written to")
+    parser.add_argument("-f", "--filter", required=True, help=f"one of {', '.join(FILTER_CLASSES)}, or several joined by commas to chain them")
+    parser.add_argument("-s", "--set", action="append", default=[], metavar="NAME=VALUE", help="sets a filter property, can be repeated")
+    parser.add_argument("--fourcc", help="codec of the output, guessed from its extension by default")
+    parser.add_argument("--queue-size", type=int, default=8, help="frames buffered between two stages at most")
+    arguments: Namespace = parser.parse_args()
+
+    pipeline: VideoPipeline = VideoPipeline(
+        parse_source(arguments.source),
+        arguments.output,
+        filter_from_arguments(parser, arguments.filter, arguments.set),
+        arguments.queue_size,
+        arguments.fourcc
+    )
+
+    started: float = perf_counter()
+
+    frames: int = pipeline.run(report_progress)
+    elapsed: float = perf_counter() - started
+    print(f"{frames} frames written to {arguments.output} in {elapsed:.1f} s, {frames / elapsed if elapsed else 0:.1f} fps")